@@ -32,7 +32,7 @@ setup(
         "benedict>=0.3",
         "nanolog",
     ],
-    python_requires='>=3.5',
+    python_requires='>=3.7',
     include_package_data=True,
     zip_safe=False
 )
@@ -1,28 +1,55 @@
+"""
+Backends, addons and the commandline are imported on first access, so that
+`import symphony` does not pay for kubectl, libtmux and docker clients that
+are never used. Use Cluster.new(backend) to load a backend by name.
+"""
+import importlib
 from .engine import Cluster, SymphonyConfig, AddressBook
-from .kube import (
-    KubeCluster,
-    GKEDispatcher,
-    KubeProcessSpec,
-    KubeProcessGroupSpec,
-    KubeExperimentSpec
-    )
-from .tmux import (
-    TmuxCluster,
-    TmuxProcessSpec,
-    TmuxProcessGroupSpec,
-    TmuxExperimentSpec,
-    )
-from .subproc import (
-    SubprocCluster,
-    SubprocManager,
-    SubprocProcessSpec,
-    SubprocProcessGroupSpec,
-)
 from .spec import (
     ProcessSpec,
     ProcessGroupSpec,
-    ExperimentSpec
+    ExperimentSpec,
+    Shards
     )
-from .docker import DockerCluster
-from .addons import DockerBuilder, clean_images
-from .commandline import SymphonyParser
\ No newline at end of file
+
+# {attribute: module that defines it}
+_LAZY_ATTRS = {
+    'AsyncCluster': '.engine',
+    'KubeCluster': '.kube',
+    'GKEDispatcher': '.kube',
+    'KubeProcessSpec': '.kube',
+    'KubeProcessGroupSpec': '.kube',
+    'KubeExperimentSpec': '.kube',
+    'TmuxCluster': '.tmux',
+    'TmuxProcessSpec': '.tmux',
+    'TmuxProcessGroupSpec': '.tmux',
+    'TmuxExperimentSpec': '.tmux',
+    'SubprocCluster': '.subproc',
+    'SubprocManager': '.subproc',
+    'SubprocProcessSpec': '.subproc',
+    'SubprocProcessGroupSpec': '.subproc',
+    'DockerCluster': '.docker',
+    'FederatedCluster': '.federated',
+    'SimCluster': '.sim',
+    'DockerBuilder': '.addons',
+    'clean_images': '.addons',
+    'SymphonyParser': '.commandline',
+}
+_LAZY_SUBMODULES = ['kube', 'tmux', 'docker', 'subproc', 'federated', 'sim',
+                    'addons', 'commandline', 'errors', 'utils', 'nameservice']
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        module = importlib.import_module(_LAZY_ATTRS[name], __name__)
+        value = getattr(module, name)
+    elif name in _LAZY_SUBMODULES:
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS) | set(_LAZY_SUBMODULES))
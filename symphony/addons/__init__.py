@@ -1,3 +1,20 @@
+import importlib
 from .local_file_manager import LocalFileManager
-from .docker_builder import DockerBuilder
-from .docker_cleaner import clean_images
+
+# the docker SDK and nanolog are only imported when these are first accessed
+_LAZY_ATTRS = {
+    'DockerBuilder': '.docker_builder',
+    'clean_images': '.docker_cleaner',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
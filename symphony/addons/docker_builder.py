@@ -8,6 +8,7 @@ from os.path import expanduser
 from pathlib import Path
 import docker
 import nanolog as nl
+from symphony.utils.throttle import get_throttle, TransientError
 
 
 _log = nl.Logger.create_logger(
@@ -44,6 +45,7 @@ class DockerBuilder:
         if not verbose:
             _log.set_level(nl.WARN)
         self.client = docker.APIClient()
+        self.throttle = get_throttle('docker')
 
     @classmethod
     def from_dict(cls, di):
@@ -145,11 +147,16 @@ class DockerBuilder:
         # Docker api is bad
         # res = self.client.push(repository, tag=tag, stream=True, decode=True)
         tag_name = self.tag_name(repository, tag)
-        os.system(' '.join(['docker', 'push', tag_name]))
+        self.throttle.call(self._push_once, tag_name)
 
         # for line in res:
         #     self.output_docker_res(line)
 
+    def _push_once(self, tag_name):
+        if os.system(' '.join(['docker', 'push', tag_name])) != 0:
+            # mostly registry or network hiccups, worth retrying
+            raise TransientError('[Error] docker push {} failed'.format(tag_name))
+
     def tag(self, repository, tag=None, force=False):
         """
         docker tag
@@ -157,7 +164,8 @@ class DockerBuilder:
         if self.img is None:
             raise RuntimeError("[Error] Image not built, cannot tag")
 
-        success = self.client.tag(self.img, repository, tag, force)
+        success = self.throttle.call(
+            self.client.tag, self.img, repository, tag, force)
         tag_name = self.tag_name(repository, tag)
 
         if success:
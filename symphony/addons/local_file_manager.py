@@ -1,13 +1,74 @@
+import json
+import hashlib
+import os
 from pathlib import Path
 from os.path import expanduser
 from symphony.engine import SymphonyConfig
 from symphony.spec import ExperimentSpec
+from symphony.spec import binary
 from benedict.data_format import dump_yaml_str, load_yaml_file
 
 
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def plan_digest(components):
+    """
+    Hash of a compiled launch plan, that does not depend on the order of its
+    components nor on line endings
+
+    Args:
+        components: {component name: compiled text}
+
+    Returns:
+        (plan hash, {component name: component hash})
+    """
+    hashes = {name: _digest(text.replace('\r\n', '\n'))
+              for name, text in components.items()}
+    plan_hash = _digest(''.join('{}\0{}\n'.format(name, hashes[name])
+                                for name in sorted(hashes)))
+    return plan_hash, hashes
+
+
+def _write_atomic(path, text):
+    # experiments of a sweep may be launched concurrently
+    tmp_path = path.with_name('{}.{}.tmp'.format(path.name, os.getpid()))
+    with tmp_path.open('w') as f:
+        f.write(text)
+    os.replace(str(tmp_path), str(path))
+
+
 class LocalFileManager:
-    def __init__(self):
-        pass
+    # {format: file name}
+    EXPERIMENT_FILES = {
+        'yaml': 'experiment.yaml',
+        'symph': 'experiment' + binary.EXTENSION,
+    }
+    # launch plans stored by content, shared by all the experiments, the
+    # name is not a valid experiment name
+    PLAN_FOLDER = '.plans'
+    # records the hash of the plan an experiment was launched with
+    PLAN_FILE = 'plan'
+
+    def __init__(self, experiment_format=None):
+        """
+        Args:
+            experiment_format: 'yaml' or 'symph' (binary), defaults to
+                SymphonyConfig().experiment_format or 'yaml'
+        """
+        if experiment_format is not None:
+            assert experiment_format in self.EXPERIMENT_FILES, \
+                'Unknown experiment format {}'.format(experiment_format)
+        self._experiment_format = experiment_format
+
+    @property
+    def experiment_format(self):
+        experiment_format = self._experiment_format \
+            or SymphonyConfig().experiment_format or 'yaml'
+        assert experiment_format in self.EXPERIMENT_FILES, \
+            'Unknown experiment format {}'.format(experiment_format)
+        return experiment_format
 
     @property
     def data_root(self):
@@ -26,25 +87,138 @@ class LocalFileManager:
         return experiment_path
 
     def experiment_exists(self, experiment_name):
-        return Path(self.experiment_file(experiment_name)).exists()
+        return self._find_experiment_file(experiment_name) is not None
 
-    def experiment_file(self, experiment_name):
-        experiment_file = self.experiment_path(experiment_name) / 'experiment.yaml'
+    def experiment_file(self, experiment_name, experiment_format=None):
+        file_name = self.EXPERIMENT_FILES[experiment_format or self.experiment_format]
+        experiment_file = self.experiment_path(experiment_name) / file_name
         return str(experiment_file)
 
-    def load_experiment(self, experiment_name):
-        experiment_file = Path(self.experiment_file(experiment_name))
-        if experiment_file.exists():
-            experiment = ExperimentSpec.load_dict(load_yaml_file(str(experiment_file)))
-        else:
+    def _find_experiment_file(self, experiment_name):
+        """
+        Returns:
+            (format, Path) of the saved experiment, the configured format
+            first, None if it was never saved
+        """
+        formats = [self.experiment_format] + [f for f in self.EXPERIMENT_FILES
+                                              if f != self.experiment_format]
+        for experiment_format in formats:
+            experiment_file = Path(self.experiment_file(experiment_name,
+                                                        experiment_format))
+            if experiment_file.exists():
+                return experiment_format, experiment_file
+        return None
+
+    def load_experiment(self, experiment_name, spec_class=ExperimentSpec):
+        """
+        Args:
+            spec_class: ExperimentSpec subclass of the backend, binary files
+                record their own
+        """
+        found = self._find_experiment_file(experiment_name)
+        if found is None:
             raise ValueError('[Error] Cannot find experiment {}'.format(experiment_name))
-        return experiment
+        experiment_format, experiment_file = found
+        if experiment_format == 'symph':
+            return binary.load_file(str(experiment_file))
+        return spec_class.load_dict(load_yaml_file(str(experiment_file)))
+
+    def open_experiment(self, experiment_name):
+        """
+        Returns:
+            SpecArchive of an experiment saved in the binary format, to
+            load some of its processes without loading all of them
+        """
+        found = self._find_experiment_file(experiment_name)
+        if found is None or found[0] != 'symph':
+            raise ValueError('[Error] Cannot find experiment {} in binary format'
+                             .format(experiment_name))
+        return binary.SpecArchive.open(str(found[1]))
 
     def save_experiment(self, experiment):
         assert isinstance(experiment, ExperimentSpec)
         experiment_name = experiment.name
         experiment_file = Path(self.experiment_file(experiment_name))
-        di = experiment.dump_dict()
+        if self.experiment_format == 'symph':
+            binary.dump_file(experiment, str(experiment_file))
+            return str(experiment_file)
+        # plain dicts, BeneDicts are dumped with python tags that
+        # load_yaml_file rejects
+        di = json.loads(json.dumps(experiment.dump_dict()))
         with experiment_file.open('w') as f:
             f.write(dump_yaml_str(di))
         return str(experiment_file)
+
+    ### Launch plans
+
+    @property
+    def plan_root(self):
+        return self.data_root / self.PLAN_FOLDER
+
+    def save_plan(self, experiment_name, components):
+        """
+        Stores a compiled launch plan by content and records that
+        experiment_name was launched with it. A component already stored,
+        e.g. by another experiment of a sweep, is not written again.
+
+        Args:
+            components: {component name: compiled text}, in launch order
+
+        Returns:
+            plan hash
+        """
+        plan_hash, hashes = plan_digest(components)
+        objects = self.plan_root / 'objects'
+        objects.mkdir(exist_ok=True, parents=True)
+        for name, text in components.items():
+            object_file = objects / (hashes[name] + '.yml')
+            if not object_file.exists():
+                _write_atomic(object_file, text)
+        manifest = self.plan_root / (plan_hash + '.json')
+        if not manifest.exists():
+            _write_atomic(manifest, json.dumps(
+                {'components': [[name, hashes[name]] for name in components]}))
+        _write_atomic(self.experiment_path(experiment_name) / self.PLAN_FILE,
+                      plan_hash + '\n')
+        return plan_hash
+
+    def load_plan(self, plan_hash):
+        """
+        Returns:
+            {component name: compiled text} of a stored plan, in launch order
+        """
+        manifest = self.plan_root / (plan_hash + '.json')
+        if not manifest.exists():
+            raise ValueError('[Error] Cannot find launch plan {}'.format(plan_hash))
+        with manifest.open() as f:
+            names = json.load(f)['components']
+        components = {}
+        for name, component_hash in names:
+            with (self.plan_root / 'objects' / (component_hash + '.yml')).open() as f:
+                components[name] = f.read()
+        return components
+
+    def experiment_plan(self, experiment_name):
+        """
+        Returns:
+            hash of the plan experiment_name was last launched with, None if
+            it has none
+        """
+        plan_file = self.data_root / experiment_name / self.PLAN_FILE
+        if not plan_file.exists():
+            return None
+        return plan_file.read_text().strip()
+
+    def plan_experiments(self):
+        """
+        Returns:
+            {plan hash: [experiment names]} of all the experiments saved
+            with a plan, sorted
+        """
+        plans = {}
+        if self.data_root is None or not self.data_root.exists():
+            return plans
+        for plan_file in sorted(self.data_root.glob('*/' + self.PLAN_FILE)):
+            plan_hash = plan_file.read_text().strip()
+            plans.setdefault(plan_hash, []).append(plan_file.parent.name)
+        return plans
@@ -2,7 +2,8 @@ import webbrowser
 import argparse
 import re
 import sys
-from symphony.utils.common import print_err
+from symphony.utils.common import print_err, deduplicate_with_order
+from symphony.engine.batch import print_batch_summary
 
 
 class SymphonyParser(object):
@@ -22,6 +23,8 @@ class SymphonyParser(object):
         self._parsers_cache = {}
 
         self.cluster = self.create_cluster()
+        # one command queries the same experiment several times
+        self.cluster.enable_query_cache()
 
         self.setup()
 
@@ -51,6 +54,7 @@ class SymphonyParser(object):
         self._setup_list_experiments()
         self._setup_switch_experiment()
         self._setup_list_processes()
+        self._setup_list_plans()
         self._setup_log()
         self._setup_visit()
 
@@ -103,6 +107,12 @@ class SymphonyParser(object):
             action='store_true',
             help='force delete, do not show confirmation message.'
         )
+        parser.add_argument(
+            '-j', '--jobs',
+            type=int,
+            default=8,
+            help='maximum number of experiments deleted concurrently.'
+        )
         self.add_dry_run(parser)
 
     def _setup_scp(self):
@@ -185,6 +195,15 @@ class SymphonyParser(object):
         )
         self._add_experiment_name(parser, required=False, positional=True)
 
+    def _setup_list_plans(self):
+        parser = self.add_subparser('list-plans', aliases=['plans'])
+        parser.add_argument(
+            'experiment_name',
+            nargs='?',
+            default=None,
+            help='only show the experiments that share the plan of this one.'
+        )
+
     def _setup_visit(self):
         parser = self.add_subparser('visit', aliases=['vi'])
         parser.add_argument('service_name', help='the name of the service to visit')
@@ -347,15 +366,34 @@ class SymphonyParser(object):
 
     def action_delete_batch(self, args):
         """
-        Stop an experiment, delete corresponding pods, services, and namespace.
-        If experiment_name is omitted, default to deleting the current namespace.
-        Matches all possible experiments
+        Delete every experiment that matches one of the given regexes.
+        Deletions run concurrently (see --jobs), a failure does not stop the rest.
         """
+        experiments = self.cluster.list_experiments()
+        to_delete = []
         for experiment_name in args.experiment_names:
-            experiments = self.cluster.list_experiments()
             for experiment in experiments:
                 if re.match(experiment_name, experiment):
-                    self._delete(experiment, args.force, args.dry_run)
+                    to_delete.append(experiment)
+        to_delete = deduplicate_with_order(to_delete)
+        if not to_delete:
+            print_err('[Error] No experiment matches {}'.format(args.experiment_names))
+            sys.exit(1)
+
+        if args.dry_run:
+            print('\n'.join(to_delete))
+            return
+        if not args.force:
+            print('\n'.join(to_delete))
+            ans = input('Confirm delete the {} experiments above? <enter>=yes,<n>=no: '
+                        .format(len(to_delete)))
+            if ans not in ['', 'y', 'yes', 'Y']:
+                print('aborted')
+                return
+
+        results = self.cluster.delete_batch(to_delete, max_workers=args.jobs)
+        if not print_batch_summary(results):
+            sys.exit(1)
 
     def action_list_experiments(self, _):
         """
@@ -403,6 +441,27 @@ class SymphonyParser(object):
         output = self._print_experiment(data)
         print(output)
 
+    def action_list_plans(self, args):
+        """
+        `symphony plans`: list the launch plans saved in the experiment
+        folder and the experiments that were launched with each of them
+        """
+        from symphony.addons import LocalFileManager
+        fs = LocalFileManager()
+        if not fs.has_experiment_folder():
+            print_err('[Error] No experiment folder, see SymphonyConfig().set_experiment_folder()')
+            sys.exit(1)
+        plans = fs.plan_experiments()
+        if args.experiment_name:
+            plan_hash = fs.experiment_plan(args.experiment_name)
+            if plan_hash is None:
+                print_err('[Error] Experiment {} has no saved plan'.format(args.experiment_name))
+                sys.exit(1)
+            plans = {plan_hash: plans[plan_hash]}
+        for plan_hash, experiments in sorted(plans.items(),
+                                             key=lambda item: (-len(item[1]), item[1])):
+            print('{}  {}'.format(plan_hash[:12], ' '.join(experiments)))
+
     def _print_experiment(self, data, min_width=5, max_width=1000, pad=2):
         if len(data) == 0:
             return ''
@@ -474,7 +533,7 @@ class SymphonyParser(object):
             process_name=process_name,
             process_group_name=process_group_name,
             command=commands,
-            experiment_name=self._get_experiment(args)
+            experiment_name=experiment_name
         )
 
     def action_scp(self, args):
@@ -1,19 +1,40 @@
+import math
+import re
+import time
 import docker
 from benedict import BeneDict
 from symphony.engine import Cluster
+from symphony.engine.events import EventTracker
+from symphony.errors import ReadinessTimeoutError
 from symphony.utils import runner
+from symphony.utils.throttle import get_throttle
 from symphony.utils.common import check_valid_project_name
 from symphony.utils.common import split_docker_process_name
 from .experiment import DockerExperimentSpec
 
 
 _LABEL_PROJECT = 'com.docker.compose.project'
+# docker container status -> EventTracker state
+_CONTAINER_STATES = {
+    'created': 'waiting',
+    'restarting': 'waiting',
+    'running': 'running',
+    'paused': 'running',
+    'exited': 'exited',
+    'dead': 'exited',
+}
+# first docker-compose release with `up --wait`
+_COMPOSE_WAIT_VERSION = (2, 1, 1)
 
 
 class DockerCluster(Cluster):
     def __init__(self):
         super().__init__()
         self.client = docker.from_env()
+        # shared with DockerBuilder, daemon calls are rate limited and
+        # retried on transient errors
+        self.throttle = get_throttle('docker')
+        self._compose_wait = None  # see _compose_supports_wait()
 
     # ========================================================
     # =================== Private Helpers ====================
@@ -34,40 +55,88 @@ class DockerCluster(Cluster):
 
         """
         containers = []
-        for c in self.client.containers.list():
-            if (_LABEL_PROJECT in c.labels and
-                c.labels[_LABEL_PROJECT] == exp_name):
-                 _gn, _pn = split_docker_process_name(c.name[len(exp_name)+1:])
-                 if group_name is None or group_name == _gn:
-                     if process_name is None or process_name == _pn:
-                         containers.append(c)
+        # the daemon filters by label, instead of listing every container
+        project_filter = {'label': '{}={}'.format(_LABEL_PROJECT, exp_name)}
+        for c in self.throttle.call(self.client.containers.list,
+                                    filters=project_filter):
+            _gn, _pn = split_docker_process_name(c.name[len(exp_name)+1:])
+            if group_name is None or group_name == _gn:
+                if process_name is None or process_name == _pn:
+                    containers.append(c)
         if process_name:
             assert len(containers) in (0, 1), (
                     'Found two containers with the same exact name!')
         return containers
 
-    def _container_info(self, c):
+    def _container_info(self, c, images=None):
         """
         Extracts information from a container
 
         Args:
             c: a docker.models.containers.Container object
+            images: dict shared by calls on several containers, so that each
+                image is fetched from the daemon only once
 
         Returns:
             a python dictionary with information about the specified container
 
         """
+        if images is None:
+            images = {}
+        image_id = c.attrs.get('Image')
+        if image_id not in images:
+            images[image_id] = c.image
+        image = images[image_id]
         return {
                 'status': c.status,
                 'id': c.id,
                 'short_id': c.short_id,
                 'image': {
-                    'id': c.image.id,
-                    'short_id': c.image.short_id,
-                    'tags': c.image.tags,
+                    'id': image.id,
+                    'short_id': image.short_id,
+                    'tags': image.tags,
                 }
         }
 
+    def _compose_supports_wait(self):
+        """
+        Returns:
+            whether the installed docker-compose has `up --wait`, Compose v1
+            and early v2 releases do not
+        """
+        if self._compose_wait is None:
+            out, err, retcode = runner.run('docker-compose version --short')
+            version = tuple(int(x) for x in re.findall(r'\d+', out)[:3])
+            self._compose_wait = retcode == 0 and version >= _COMPOSE_WAIT_VERSION
+        return self._compose_wait
+
+    def _wait_containers(self, experiment_spec, timeout):
+        """
+        Polls the containers of the experiment until all of them are
+        running, and healthy if their image has a healthcheck, for
+        docker-compose without `up --wait`
+        """
+        expected = len(experiment_spec.list_all_processes())
+        deadline = time.time() + timeout
+        while True:
+            containers = self._get_containers(experiment_spec.name)
+            not_ready = []
+            for c in containers:
+                self.throttle.call(c.reload)  # full state, with the health
+                state = c.attrs['State']
+                health = state.get('Health')
+                if state['Status'] != 'running' or \
+                        (health is not None and health['Status'] != 'healthy'):
+                    not_ready.append(c.name)
+            if len(containers) >= expected and not not_ready:
+                return
+            if time.time() > deadline:
+                raise ReadinessTimeoutError(
+                    'Containers {} of experiment {} are not ready after {} seconds'
+                    .format(', '.join(not_ready) or '(not created)',
+                            experiment_spec.name, timeout))
+            time.sleep(1)
+
     # ========================================================
     # ===================== Action API =======================
     # ========================================================
@@ -75,7 +144,8 @@ class DockerCluster(Cluster):
     def new_experiment(self, *args, **kwargs):
         return DockerExperimentSpec(*args, **kwargs)
 
-    def launch(self, experiment_spec, dry_run=False):
+    def launch(self, experiment_spec, dry_run=False, wait_ready=False,
+               ready_timeout=60):
         """
         Launches a Docker experiment specified by the given spec.
 
@@ -83,6 +153,10 @@ class DockerCluster(Cluster):
             experiment_spec: a DockerExperimentSpec object
             dry_run: print out the generated YAML config instead of actually
                 launching Docker containers.
+            wait_ready: returns when all containers are running, or healthy
+                if their image has a healthcheck (docker-compose --wait, or
+                polled when docker-compose does not have it)
+            ready_timeout: seconds to wait, raises ReadinessTimeoutError
         """
         print('Launching a Docker experiment', experiment_spec.name)
         launch_plan = experiment_spec.yml()
@@ -90,12 +164,32 @@ class DockerCluster(Cluster):
         if dry_run:
             print(launch_plan)
         else:
+            compose_wait = wait_ready and self._compose_supports_wait()
             compose_cmd = 'docker-compose -p {} -f - up -d'.format(
-                    experiment_spec.name),
+                    experiment_spec.name)
+            if compose_wait:
+                compose_cmd += ' --wait --wait-timeout {}'.format(int(ready_timeout))
             out, err, retcode = runner.run_verbose(
-                    compose_cmd, stdin=launch_plan)
+                    compose_cmd, stdin=launch_plan, throttle=self.throttle)
             if retcode != 0:
-                print('Error while starting Docker experiment')
+                raise RuntimeError('Error while starting Docker experiment {}'
+                                   .format(experiment_spec.name))
+            self._save_running_spec(experiment_spec)
+            if wait_ready and not compose_wait:
+                self._wait_containers(experiment_spec, ready_timeout)
+
+    def _apply_changes(self, experiment_spec, changes):
+        """
+        docker-compose only recreates the services whose configuration
+        changed, and removes the ones that are gone
+        """
+        compose_cmd = 'docker-compose -p {} -f - up -d --remove-orphans'.format(
+                experiment_spec.name)
+        out, err, retcode = runner.run_verbose(
+                compose_cmd, stdin=experiment_spec.yml(), throttle=self.throttle)
+        if retcode != 0:
+            raise RuntimeError('Error while updating Docker experiment {}'
+                               .format(experiment_spec.name))
 
     # ========================================================
     # ===================== Action API =======================
@@ -113,11 +207,7 @@ class DockerCluster(Cluster):
         print('Deleting a Docker experiment', exp_name)
         containers = self._get_containers(exp_name)
         for c in containers:
-            c.stop(timeout=timeout)
-
-    def delete_batch(self, experiments):
-        for exp in experiments:
-            self.delete(exp)
+            self.throttle.call(c.stop, timeout=timeout)
 
     def transfer_file(self, experiment_name, src_path, dest_path,
                       src_process=None, src_process_group=None,
@@ -160,7 +250,7 @@ class DockerCluster(Cluster):
         Returns:
             The list of names of experiments that are currently running.
         """
-        containers = self.client.containers.list()
+        containers = self.throttle.call(self.client.containers.list)
         exp_names = set()
         for c in containers:
             if _LABEL_PROJECT in c.labels:
@@ -185,12 +275,13 @@ class DockerCluster(Cluster):
         """
         containers = self._get_containers(exp_name)
         result = dict()
+        images = {}
         for c in containers:
             grouped_name = c.name[len(exp_name)+1:]
             group_name, proc_name = split_docker_process_name(grouped_name)
             if group_name not in result:
                 result[group_name] = dict()
-            result[group_name][proc_name] = self._container_info(c)
+            result[group_name][proc_name] = self._container_info(c, images)
         return result
 
     def describe_process_group(self,
@@ -210,10 +301,11 @@ class DockerCluster(Cluster):
         containers = self._get_containers(exp_name,
                                           group_name=process_group_name)
         result = dict()
+        images = {}
         for c in containers:
             grouped_name = c.name[len(exp_name)+1:]
             group_name, proc_name = split_docker_process_name(grouped_name)
-            result[proc_name] = self._container_info(c)
+            result[proc_name] = self._container_info(c, images)
         return result
 
     def describe_process(self,
@@ -238,6 +330,69 @@ class DockerCluster(Cluster):
             group_name, proc_name = split_docker_process_name(grouped_name)
             return self._container_info(container)
 
+    def watch_experiment(self, experiment_name, timeout=None):
+        """
+        Follows the docker event stream of the experiment's containers.
+        See Cluster.watch_experiment
+        """
+        tracker = EventTracker()
+        start = int(time.time())
+        for c in self._get_containers(experiment_name):
+            group_name, proc_name = split_docker_process_name(
+                c.name[len(experiment_name)+1:])
+            for event in tracker.update(group_name, proc_name,
+                                        state=_CONTAINER_STATES.get(c.status)):
+                yield event
+
+        until = None if timeout is None else start + int(math.ceil(timeout))
+        # replays from `start` so that nothing is missed while listing
+        stream = self.client.events(
+            since=start, until=until, decode=True,
+            filters={
+                'type': 'container',
+                'label': '{}={}'.format(_LABEL_PROJECT, experiment_name)
+            })
+        try:
+            for docker_event in stream:
+                for event in self._parse_docker_event(
+                        tracker, experiment_name, docker_event):
+                    yield event
+        finally:
+            stream.close()
+
+    def _parse_docker_event(self, tracker, exp_name, docker_event):
+        """
+        Turns one decoded docker event into ProcessEvents
+        """
+        action = docker_event.get('Action') or docker_event.get('status', '')
+        attributes = docker_event.get('Actor', {}).get('Attributes', {})
+        if 'name' not in attributes:
+            return []
+        group_name, proc_name = split_docker_process_name(
+            attributes['name'][len(exp_name)+1:])
+
+        if action == 'destroy':
+            return tracker.remove(group_name, proc_name, info=docker_event)
+        last = tracker.last(group_name, proc_name)
+        state, ready, restarts = last if last else (None, False, 0)
+        exit_code = None
+        if action == 'create':
+            state = 'waiting'
+        elif action == 'start':
+            if state == 'exited':  # restart policy or `docker restart`
+                restarts += 1
+            state, ready = 'running', False
+        elif action == 'die':
+            state, ready = 'exited', False
+            exit_code = int(attributes.get('exitCode', -1))
+        elif action.startswith('health_status'):
+            ready = action.endswith(': healthy')
+        else:
+            return []
+        return tracker.update(group_name, proc_name, state=state, ready=ready,
+                              restarts=restarts, exit_code=exit_code,
+                              info=docker_event)
+
     def get_log(self, experiment_name, process_name, process_group=None,
                 follow=False, since=None, tail=None, print_logs=False):
         containers = self._get_containers(experiment_name,
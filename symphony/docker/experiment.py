@@ -26,10 +26,9 @@ class DockerExperimentSpec(ExperimentSpec):
     def yml(self):
         di = BeneDict({
             'version': '3',
+            'services': {},
         })
         for pg in self.list_process_groups():
-            if 'services' not in di:
-                di['services'] = {}
             di['services'].update(pg.yml_dict())
         for p in self.list_processes():
             di['services'][p.name] = p.yml_dict()
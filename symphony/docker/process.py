@@ -4,12 +4,29 @@ from .builder import DockerServiceYML
 
 
 class DockerProcessSpec(ProcessSpec):
+    __slots__ = ('container_image', 'service_yml')
+
     def __init__(self, name, container_image):
         check_valid_hostname(name)
         super().__init__(name)
         self.container_image = container_image
         self.service_yml = DockerServiceYML(self.name, self.container_image)
 
+    def _replicate(self, name, shared=()):
+        check_valid_hostname(name)
+        process = super()._replicate(name, shared=shared)
+        process.service_yml.name = name
+        return process
+
+    def _diff_parts(self):
+        di = self.dump_dict()
+        service_yml = dict(di['service_yml'])
+        data = dict(service_yml['data'])
+        env = dict(data.pop('environment', {}))
+        service_yml['data'] = data
+        di['service_yml'] = service_yml
+        return di, env
+
     def _load_dict(self, di):
         super()._load_dict(di)
         self.container_image = di['container_image']
@@ -1,3 +1,24 @@
-from .cluster import Cluster
+import importlib
+from .cluster import Cluster, available_backends
+from .batch import BatchResult
+from .query_cache import QueryCache
+from .events import ProcessEvent
 from .application_config import SymphonyConfig
-from .address_book import AddressBook
\ No newline at end of file
+from .address_book import AddressBook
+
+# asyncio is only imported when AsyncCluster is first accessed
+_LAZY_ATTRS = {
+    'AsyncCluster': '.async_cluster',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
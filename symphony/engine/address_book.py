@@ -1,5 +1,18 @@
 
 
+LOCALHOST = '127.0.0.1'
+# suffixes of the variables set by dump() and dump_shard()
+ADDRESS_ENV_SUFFIXES = ('_HOST', '_PORT', '_ADDR', '_IPC', '_ADDRS', '_SHARD')
+
+
+def is_address_env(name):
+    """
+    Returns:
+        True if name is an environment variable of an address book
+    """
+    return name.startswith('SYMPH_') and name.endswith(ADDRESS_ENV_SUFFIXES)
+
+
 class AddressBook(object):
     def __init__(self, di=None):
         self.entries = {}
@@ -12,17 +25,76 @@ class AddressBook(object):
         entry['port'] = port
         self.entries[name] = entry
 
-    def dump(self):
+    def add_ipc_entry(self, name, path):
+        """
+        A service bound to the unix domain socket at path
+        """
+        self.entries[name] = {'ipc': path}
+
+    def add_shards(self, name, shard_names):
+        """
+        A sharded service, whose shards are the entries shard_names
+        """
+        self.entries[name] = {'shards': list(shard_names)}
+
+    def _address(self, name, local):
+        entry = self.entries[name]
+        host = LOCALHOST if name in local else entry['host']
+        return host, entry['port']
+
+    def dump(self, names=None, local=()):
+        """
+        Args:
+            names: services to dump, all of them by default
+            local: services reached on the loopback interface, because the
+                process that binds them shares the network of the reader
+
+        Returns:
+            {env var: value}, SYMPH_<NAME>_HOST, _PORT and _ADDR per service,
+            SYMPH_<NAME>_IPC for services bound to a unix domain socket,
+            SYMPH_<NAME>_ADDRS (comma separated) for sharded services,
+            whose shards are not listed one by one
+        """
         output = {}
-        for name in self.entries:
+        shards = set()
+        if names is None:
+            names = self.entries
+            for entry in self.entries.values():
+                shards.update(entry.get('shards', ()))
+        for name in names:
+            if name in shards:
+                continue
             entry = self.entries[name]
+            if 'shards' in entry:
+                output['SYMPH_{}_ADDRS'.format(self.format_name(name))] = ','.join(
+                    '{}:{}'.format(*self._address(shard, local))
+                    for shard in entry['shards'])
+                continue
+            if 'ipc' in entry:
+                output['SYMPH_{}_IPC'.format(self.format_name(name))] = entry['ipc']
+                continue
+            host, port = self._address(name, local)
             formatted_name = self.format_name(name)
-            output['SYMPH_{}_HOST'.format(formatted_name)] = entry['host']
-            output['SYMPH_{}_PORT'.format(formatted_name)] = entry['port']
-            output['SYMPH_{}_ADDR'.format(formatted_name)] = \
-                '{}:{}'.format(entry['host'], entry['port'])
+            output['SYMPH_{}_HOST'.format(formatted_name)] = host
+            output['SYMPH_{}_PORT'.format(formatted_name)] = port
+            output['SYMPH_{}_ADDR'.format(formatted_name)] = '{}:{}'.format(host, port)
         return output
 
+    def dump_shard(self, name, index, local=()):
+        """
+        Returns:
+            {env var: value}, SYMPH_<NAME>_SHARD, _HOST, _PORT and _ADDR of
+            shard index of the sharded service name
+        """
+        host, port = self._address(self.entries[name]['shards'][index], local)
+        formatted_name = self.format_name(name)
+        return {
+            'SYMPH_{}_SHARD'.format(formatted_name): index,
+            'SYMPH_{}_HOST'.format(formatted_name): host,
+            'SYMPH_{}_PORT'.format(formatted_name): port,
+            'SYMPH_{}_ADDR'.format(formatted_name): '{}:{}'.format(host, port),
+        }
+
     def format_name(self, name):
         formatted_name = name.upper()
         formatted_name = formatted_name.replace('-', '_')
@@ -10,6 +10,9 @@ class _SymphonyConfigLoader:
         self.username = None # not necessary, suppresses linter error
         self.register_handler('experiment_folder', str)
         self.register_handler('username', str)
+        self.register_handler('throttle', dict)
+        self.register_handler('experiment_format', str)
+        self.register_handler('port_lease_file', str)
 
     def register_handler(self, field, handler):
         """
@@ -40,6 +43,36 @@ class _SymphonyConfigLoader:
         """
         self.update({'experiment_folder': folder})
 
+    def set_experiment_format(self, experiment_format):
+        """
+        Set the format experiments are saved in under the experiment folder
+        Args:
+            experiment_format: 'yaml' (default) or 'symph', a compact binary
+                format that is faster to save and load
+        """
+        self.update({'experiment_format': experiment_format})
+
+    def set_port_lease_file(self, lease_file):
+        """
+        Set the file where tmux and subproc experiments lease their ports,
+        experiments that share it never get the same port
+        Args:
+            lease_file: path, defaults to a per-user file in the temp folder
+        """
+        self.update({'port_lease_file': lease_file})
+
+    def set_throttle(self, backend, **settings):
+        """
+        Configure rate limiting and retries of a backend's control-plane calls
+        Args:
+            backend: e.g. 'kube', 'docker'
+            settings: rate, burst, max_attempts, base_delay, max_delay, jitter,
+                see symphony.utils.throttle.get_throttle
+        """
+        throttle = dict(self.throttle or {})
+        throttle[backend] = dict(throttle.get(backend, {}), **settings)
+        self.update({'throttle': throttle})
+
     def load_config_file(self, file):
         if file.find('.json'):
             self.update(load_json_file(file))
@@ -0,0 +1,257 @@
+"""
+Asyncio counterpart of Cluster. Use Cluster.new(backend, async_=True)
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from symphony.engine.batch import run_batch_async
+
+
+_ASYNC_BACKEND_REGISTRY = {}
+
+
+class _AsyncBackendRegistry(type):
+    def __new__(cls, name, bases, class_dict):
+        cls = type.__new__(cls, name, bases, class_dict)
+        cls_name = cls.__name__
+        assert cls_name.endswith('AsyncCluster'), \
+            'async cluster backend subclass names must end with "AsyncCluster"'
+        cls_name = cls_name[:-len('AsyncCluster')].lower()
+        if cls_name:  # the generic AsyncCluster itself is not a backend
+            _ASYNC_BACKEND_REGISTRY[cls_name] = cls
+        return cls
+
+
+class AsyncCluster(metaclass=_AsyncBackendRegistry):
+    """
+    Awaitable version of the Cluster Launch/Action/Query API.
+
+    Wraps a blocking Cluster. Backends that can talk to their control plane
+    without blocking (e.g. KubeAsyncCluster through asyncio subprocesses)
+    override the coroutines below. Every method that is not overridden runs
+    the blocking implementation on a small shared executor, so it never
+    stalls the event loop.
+    """
+    def __init__(self, cluster, max_blocking_workers=8):
+        """
+        Args:
+            cluster: the blocking Cluster instance to wrap
+            max_blocking_workers: size of the executor used for methods that
+                do not have a native asyncio implementation
+        """
+        self.cluster = cluster
+        self._max_blocking_workers = max_blocking_workers
+        self._executor = None
+
+    @classmethod
+    def new(cls, backend, **kwargs):
+        from symphony.engine.cluster import Cluster
+        return Cluster.new(backend, async_=True, **kwargs)
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """
+        Runs a blocking call on the executor and awaits its result
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_blocking_workers)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        """
+        Shuts down the fallback executor, if it was ever started
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def __getattr__(self, name):
+        """
+        Backend specific extensions of the blocking cluster (e.g.
+        KubeCluster.query_resources) are exposed as coroutines
+        """
+        attr = getattr(self.cluster, name)
+        if not callable(attr):
+            return attr
+
+        async def _call(*args, **kwargs):
+            return await self._run_blocking(attr, *args, **kwargs)
+        return _call
+
+    # ========================================================
+    # ===================== Launch API =======================
+    # ========================================================
+    def new_experiment(self, *args, **kwargs):
+        """
+        Spec construction does not do any I/O, so this is not a coroutine
+
+        Returns:
+            new ExperimentSpec
+        """
+        return self.cluster.new_experiment(*args, **kwargs)
+
+    async def launch(self, experiment_config, *args, **kwargs):
+        return await self._run_blocking(
+            self.cluster.launch, experiment_config, *args, **kwargs)
+
+    async def launch_batch(self, experiment_configs, max_workers=8, verbose=True):
+        """
+        See Cluster.launch_batch
+        """
+        return await run_batch_async(self.launch, experiment_configs,
+                                     name=lambda exp: exp.name,
+                                     max_workers=max_workers,
+                                     verbose=verbose,
+                                     action='launched')
+
+    async def update(self, experiment_spec, *args, **kwargs):
+        """
+        See Cluster.update
+        """
+        return await self._run_blocking(
+            self.cluster.update, experiment_spec, *args, **kwargs)
+
+    # ========================================================
+    # ===================== Action API =======================
+    # ========================================================
+    async def delete(self, experiment_name):
+        return await self._run_blocking(self.cluster.delete, experiment_name)
+
+    async def delete_batch(self, experiment_names, max_workers=8, verbose=True):
+        """
+        See Cluster.delete_batch
+        """
+        return await run_batch_async(self.delete, experiment_names,
+                                     max_workers=max_workers,
+                                     verbose=verbose,
+                                     action='deleted')
+
+    async def transfer_file(self, experiment_name, *args, **kwargs):
+        return await self._run_blocking(
+            self.cluster.transfer_file, experiment_name, *args, **kwargs)
+
+    async def login(self, experiment_name, *args, **kwargs):
+        return await self._run_blocking(
+            self.cluster.login, experiment_name, *args, **kwargs)
+
+    async def exec_command(self, experiment_name, *args, **kwargs):
+        return await self._run_blocking(
+            self.cluster.exec_command, experiment_name, *args, **kwargs)
+
+    # ========================================================
+    # ===================== Query API ========================
+    # ========================================================
+    async def list_experiments(self):
+        return await self._run_blocking(self.cluster.list_experiments)
+
+    async def describe_experiment(self, experiment_name):
+        return await self._run_blocking(
+            self.cluster.describe_experiment, experiment_name)
+
+    async def describe_process_group(self,
+                                     experiment_name,
+                                     process_group_name):
+        return await self._run_blocking(
+            self.cluster.describe_process_group,
+            experiment_name, process_group_name)
+
+    async def describe_process(self,
+                               experiment_name,
+                               process_name,
+                               process_group_name=None):
+        return await self._run_blocking(
+            self.cluster.describe_process,
+            experiment_name, process_name, process_group_name)
+
+    async def describe_processes(self, experiment_name, processes):
+        """
+        See Cluster.describe_processes
+        """
+        exp_dict = await self.describe_experiment(experiment_name)
+        return self.cluster._slice_processes(exp_dict, processes)
+
+    async def get_log(self, experiment_name, process_name, *args, **kwargs):
+        return await self._run_blocking(
+            self.cluster.get_log, experiment_name, process_name,
+            *args, **kwargs)
+
+    async def external_url(self, experiment_name, service_name):
+        return await self._run_blocking(
+            self.cluster.external_url, experiment_name, service_name)
+
+    async def watch_experiment(self, experiment_name, **kwargs):
+        """
+        Async iterator over the ProcessEvents of Cluster.watch_experiment.
+        The blocking watch runs on its own daemon thread, a watch can last
+        forever and must not hold on to an executor worker.
+        """
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        stopped = threading.Event()
+        done = object()
+
+        def _watch():
+            events = self.cluster.watch_experiment(experiment_name, **kwargs)
+            try:
+                for event in events:
+                    if stopped.is_set() or loop.is_closed():
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
+                result = done
+            except Exception as e:
+                result = e
+            finally:
+                events.close()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(queue.put_nowait, result)
+
+        threading.Thread(target=_watch, daemon=True).start()
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+
+    async def find_process(self, experiment_name, process_name):
+        """
+        See Cluster.find_process
+        """
+        found = []
+        exp = await self.describe_experiment(experiment_name)
+        for process_group_name, process_group in exp.items():
+            for process in process_group:
+                if process == process_name:
+                    found.append(process_group_name)
+        return found
+
+    async def set_experiment(self, experiment_name):
+        return await self._run_blocking(
+            self.cluster.set_experiment, experiment_name)
+
+    async def current_experiment(self):
+        return await self._run_blocking(self.cluster.current_experiment)
+
+    # ========================================================
+    # ================= Helper functions =====================
+    # ========================================================
+    async def fuzzy_match_experiment(self, name):
+        """
+        See Cluster.fuzzy_match_experiment
+        """
+        all_names = await self.list_experiments()
+        return self.cluster._match_experiment_name(name, all_names)
+
+    async def fuzzy_match_process(self, proc_name, exp_name):
+        """
+        See Cluster.fuzzy_match_process
+        """
+        exp_dict = await self.describe_experiment(exp_name)
+        return self.cluster._match_process_name(proc_name, exp_dict, exp_name)
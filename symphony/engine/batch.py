@@ -0,0 +1,141 @@
+"""
+Runs bulk cluster operations (launch_batch, delete_batch) concurrently
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from symphony.utils.common import print_err
+
+
+class BatchResult(object):
+    """
+    Outcome of one item of a batch operation
+    """
+    def __init__(self, name, ok, error=None, duration=0.0, value=None):
+        """
+        Args:
+            name: experiment name
+            ok(bool): True if the operation succeeded
+            error: the exception raised by the operation, None if ok
+            duration(float): seconds spent on this item
+            value: return value of the operation
+        """
+        self.name = name
+        self.ok = ok
+        self.error = error
+        self.duration = duration
+        self.value = value
+
+    def __repr__(self):
+        if self.ok:
+            return 'BatchResult({}, ok, {:.1f}s)'.format(self.name, self.duration)
+        return 'BatchResult({}, failed: {}, {:.1f}s)'.format(
+            self.name, self.error, self.duration)
+
+
+def run_batch(func, items, name=str, max_workers=8, verbose=True,
+              action='processed'):
+    """
+    Calls func(item) for every item with at most max_workers calls in
+    flight. An exception in one item is recorded and does not stop the rest.
+
+    Args:
+        func: the operation, e.g. cluster.delete
+        items: list of arguments to func
+        name: maps an item to the name shown in progress and results
+        max_workers: concurrency limit, 1 to run serially
+        verbose: print one progress line as each item finishes
+        action: past-tense verb used in progress lines
+
+    Returns:
+        list of BatchResult, in the same order as items
+    """
+    items = list(items)
+    total = len(items)
+    results = [None] * total
+    finished = [0]
+    lock = threading.Lock()
+
+    def _run(index):
+        item = items[index]
+        item_name = name(item)
+        start = time.time()
+        try:
+            value = func(item)
+            result = BatchResult(item_name, True, duration=time.time() - start,
+                                 value=value)
+        except Exception as e:
+            result = BatchResult(item_name, False, error=e,
+                                 duration=time.time() - start)
+        results[index] = result
+        with lock:
+            finished[0] += 1
+            if verbose:
+                if result.ok:
+                    print('[{}/{}] {} {} ({:.1f}s)'.format(
+                        finished[0], total, action, item_name, result.duration))
+                else:
+                    print_err('[{}/{}] FAILED {}: {} ({:.1f}s)'.format(
+                        finished[0], total, item_name, result.error,
+                        result.duration))
+        return result
+
+    if total == 0:
+        return results
+    max_workers = max(1, min(max_workers, total))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(_run, range(total)))
+    return results
+
+
+def print_batch_summary(results):
+    """
+    Prints number of successes and the error of every failure
+
+    Returns:
+        True if every item succeeded
+    """
+    failed = [r for r in results if not r.ok]
+    print('{} succeeded, {} failed'.format(len(results) - len(failed), len(failed)))
+    for r in failed:
+        print_err('  {}: {}'.format(r.name, r.error))
+    return not failed
+
+
+async def run_batch_async(coro_func, items, name=str, max_workers=8,
+                          verbose=True, action='processed'):
+    """
+    asyncio version of run_batch, coro_func(item) must return an awaitable
+
+    Returns:
+        list of BatchResult, in the same order as items
+    """
+    items = list(items)
+    total = len(items)
+    import asyncio  # keeps asyncio out of `import symphony`
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+    finished = [0]
+
+    async def _run(item):
+        item_name = name(item)
+        async with semaphore:
+            start = time.time()
+            try:
+                value = await coro_func(item)
+                result = BatchResult(item_name, True,
+                                     duration=time.time() - start, value=value)
+            except Exception as e:
+                result = BatchResult(item_name, False, error=e,
+                                     duration=time.time() - start)
+        finished[0] += 1
+        if verbose:
+            if result.ok:
+                print('[{}/{}] {} {} ({:.1f}s)'.format(
+                    finished[0], total, action, item_name, result.duration))
+            else:
+                print_err('[{}/{}] FAILED {}: {} ({:.1f}s)'.format(
+                    finished[0], total, item_name, result.error,
+                    result.duration))
+        return result
+
+    return list(await asyncio.gather(*[_run(item) for item in items]))
@@ -1,11 +1,31 @@
 """
 Cluster subclasses are the actual execution engines
 """
+import importlib
+import time
+from collections import OrderedDict
 from symphony.engine.application_config import SymphonyConfig
-from symphony.utils.common import deduplicate_with_order
+from symphony.utils.name_index import NameIndex
+from symphony.engine.batch import run_batch
+from symphony.engine.query_cache import QueryCache
+from symphony.engine.events import EventTracker
+from symphony.errors import ReadinessTimeoutError
+from symphony.utils.common import print_err
 
 
 _BACKEND_REGISTRY = {}
+# backends shipped with symphony, imported on first use by Cluster.new
+_BUILTIN_BACKENDS = {
+    'kube': 'symphony.kube',
+    'tmux': 'symphony.tmux',
+    'docker': 'symphony.docker',
+    'subproc': 'symphony.subproc',
+    'federated': 'symphony.federated',
+    'sim': 'symphony.sim',
+}
+# third-party backends register without being imported, in their setup.py:
+# entry_points={'symphony.backends': ['mybackend = mypackage:MyCluster']}
+_ENTRY_POINT_GROUP = 'symphony.backends'
 
 
 class _BackendRegistry(type):
@@ -19,28 +39,120 @@ class _BackendRegistry(type):
         return cls
 
 
+def _backend_entry_points():
+    """
+    Returns:
+        {backend name: entry point} declared in the "symphony.backends" group
+    """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # python < 3.8
+        try:
+            import pkg_resources
+        except ImportError:
+            return {}
+        return {ep.name: ep for ep in
+                pkg_resources.iter_entry_points(_ENTRY_POINT_GROUP)}
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        eps = eps.select(group=_ENTRY_POINT_GROUP)
+    else:
+        eps = eps.get(_ENTRY_POINT_GROUP, [])
+    return {ep.name: ep for ep in eps}
+
+
+def _load_backend(backend):
+    """
+    Imports the module of a backend that is not registered yet, the
+    _BackendRegistry metaclass registers its Cluster subclass
+
+    Returns:
+        Cluster subclass or None if no such backend
+    """
+    if backend not in _BACKEND_REGISTRY:
+        if backend in _BUILTIN_BACKENDS:
+            importlib.import_module(_BUILTIN_BACKENDS[backend])
+        else:
+            entry_point = _backend_entry_points().get(backend)
+            if entry_point is not None:
+                obj = entry_point.load()
+                # the entry point name may differ from the class name
+                if isinstance(obj, _BackendRegistry):
+                    _BACKEND_REGISTRY.setdefault(backend, obj)
+    return _BACKEND_REGISTRY.get(backend)
+
+
+def available_backends():
+    """
+    Returns:
+        sorted names of all backends, whether imported yet or not
+    """
+    names = set(_BACKEND_REGISTRY) | set(_BUILTIN_BACKENDS) \
+        | set(_backend_entry_points())
+    names.discard('')  # Cluster itself
+    return sorted(names)
+
+
 class Cluster(metaclass=_BackendRegistry):
     def __init__(self, **kwargs):
         pass
 
     @classmethod
-    def new(cls, backend, **kwargs):
+    def new(cls, backend, async_=False, **kwargs):
         """
         To write generic cluster spec code, please use this factory method
-        instead of subclass constructors
+        instead of subclass constructors. The backend module is only
+        imported here.
 
         Args:
             backend:
+            async_: returns an AsyncCluster whose API methods are coroutines
         """
         backend = backend.lower()
-        assert backend in _BACKEND_REGISTRY, \
+        cluster_cls = _load_backend(backend)
+        assert cluster_cls is not None, \
             '"{}" is not a valid cluster backend. Available backends: {}'.format(
-                backend, list(_BACKEND_REGISTRY.keys())
+                backend, available_backends()
             )
-        cluster_cls = _BACKEND_REGISTRY[backend]
         assert issubclass(cluster_cls, Cluster), \
             'internal error: not subclass of Cluster'
-        return cluster_cls(**kwargs)
+        cluster = cluster_cls(**kwargs)
+        if async_:
+            from symphony.engine.async_cluster import (
+                AsyncCluster, _ASYNC_BACKEND_REGISTRY)
+            async_cls = _ASYNC_BACKEND_REGISTRY.get(backend, AsyncCluster)
+            return async_cls(cluster)
+        return cluster
+
+    # ========================================================
+    # ===================== Query cache ======================
+    # ========================================================
+    def enable_query_cache(self, cache=None, **kwargs):
+        """
+        Caches results of the Query API so that repeated lookups within a
+        command or a script only hit the backend once. Launch and delete
+        invalidate the cached results of the affected experiment.
+
+        Args:
+            cache: a QueryCache (or compatible) instance, if None a new
+                QueryCache(**kwargs) is created
+            kwargs: see QueryCache, e.g. ttl=5, ttls={'list_experiments': 30}
+
+        Returns:
+            the installed cache, call cache.stats() for hit/miss counters
+        """
+        self.disable_query_cache()
+        if cache is None:
+            cache = QueryCache(**kwargs)
+        cache.install(self)
+        self.query_cache = cache
+        return cache
+
+    def disable_query_cache(self):
+        cache = getattr(self, 'query_cache', None)
+        if cache is not None:
+            cache.uninstall(self)
+            self.query_cache = None
 
     # ========================================================
     # ===================== Launch API =======================
@@ -52,19 +164,164 @@ class Cluster(metaclass=_BackendRegistry):
         """
         raise NotImplementedError
 
-    def launch(self, experiment_config, force=False, dry_run=False):
+    def launch(self, experiment_config, force=False, dry_run=False,
+               wait_ready=False, ready_timeout=60):
         """
         Launches an experiment specified by eperiment_config.
         Raises error if an experiment with the same name already exists
         Args:
             force: overwrites the experiment if it exists
             dry_run: only prints how processes are going to be run, do not actually run them
+            wait_ready: launches the processes in waves (see
+                spec.dependencies.launch_waves), a wave starts when the
+                services bound by the previous ones are ready. Returns when
+                all of them are ready
+            ready_timeout: seconds to wait for each wave, raises
+                ReadinessTimeoutError
         """
         raise NotImplementedError
 
-    def launch_batch(self, experiment_configs):
-        for exp in experiment_configs:
-            self.launch(exp)
+    def _port_allocator(self, port_range=None):
+        """
+        Returns:
+            PortAllocator leasing ports host-wide, for local backends
+            (see SymphonyConfig.set_port_lease_file)
+        """
+        from symphony.utils.ports import (
+            PortAllocator, DEFAULT_PORT_RANGE, default_lease_file)
+        return PortAllocator(port_range or DEFAULT_PORT_RANGE,
+                             lease_file=SymphonyConfig().port_lease_file
+                             or default_lease_file())
+
+    def _create_runtime_dir(self, experiment_spec, fresh=False):
+        """
+        Creates the folder of the unix domain sockets of the experiment if
+        it binds any, for local backends (see symphony.utils.ipc)
+
+        Args:
+            fresh: removes the sockets left by a previous run
+        """
+        from symphony.spec.process import IPC
+        from symphony.utils.ipc import create_runtime_dir, remove_runtime_dir
+        if fresh:
+            remove_runtime_dir(experiment_spec.name)
+        if IPC in experiment_spec.binded_services.values():
+            create_runtime_dir(experiment_spec.name)
+
+    def _wait_ready(self, experiment_spec, keys, timeout):
+        """
+        Blocks until the services bound by the processes of keys accept TCP
+        connections, for backends whose address book holds reachable hosts
+        """
+        from symphony.spec.dependencies import bound_addresses
+        from symphony.utils.ports import wait_for_ports
+        not_ready = wait_for_ports(bound_addresses(experiment_spec, keys),
+                                   timeout=timeout)
+        if not_ready:
+            raise ReadinessTimeoutError(
+                'Services {} of experiment {} are not ready after {} seconds'
+                .format(', '.join(not_ready), experiment_spec.name, timeout))
+
+    def launch_batch(self, experiment_configs, max_workers=8, verbose=True):
+        """
+        Launches experiments concurrently. A failed launch does not abort
+        the others.
+
+        Args:
+            max_workers: maximum number of launches in flight
+            verbose: print progress as each launch finishes
+
+        Returns:
+            list of BatchResult, one per experiment
+        """
+        return run_batch(self.launch, experiment_configs,
+                         name=lambda exp: exp.name,
+                         max_workers=max_workers,
+                         verbose=verbose,
+                         action='launched')
+
+    def update(self, experiment_spec, old_spec=None, dry_run=False):
+        """
+        Updates a running experiment to experiment_spec in place. Only the
+        processes that are added, removed or changed (see spec.diff) are
+        created, deleted or restarted, the others keep running. Services
+        keep their ports.
+
+        Args:
+            experiment_spec: new version of a running experiment
+            old_spec: spec the experiment runs, defaults to the one saved
+                when it was launched or last updated
+                (see SymphonyConfig.set_experiment_folder)
+            dry_run: only prints the changes
+
+        Returns:
+            ChangeSet
+        """
+        from symphony.spec.diff import diff_specs
+        if old_spec is None:
+            old_spec = self._running_spec(experiment_spec)
+        experiment_spec.pin_addresses(old_spec.address_book)
+        if hasattr(experiment_spec, 'compile'):  # docker specs do not compile
+            experiment_spec.compile()
+        changes = diff_specs(old_spec, experiment_spec)
+        print('updating', experiment_spec.name)
+        print(changes)
+        if dry_run:
+            return changes
+        if changes:
+            self._apply_changes(experiment_spec, changes)
+            if experiment_spec.name_service:
+                self._publish_addresses(experiment_spec, changes)
+        self._save_running_spec(experiment_spec)
+        return changes
+
+    def _running_spec(self, experiment_spec):
+        """
+        Returns:
+            the spec the experiment of the same name was launched with
+        """
+        from symphony.addons import LocalFileManager
+        fs = LocalFileManager()
+        if fs.has_experiment_folder() and fs.experiment_exists(experiment_spec.name):
+            return fs.load_experiment(experiment_spec.name, type(experiment_spec))
+        raise ValueError('[Error] Cannot find the spec experiment {} runs, pass '
+                         'old_spec or set an experiment folder in SymphonyConfig'
+                         .format(experiment_spec.name))
+
+    def _save_running_spec(self, experiment_spec):
+        """
+        Remembers the spec an experiment runs for the next update()
+        """
+        from symphony.addons import LocalFileManager
+        fs = LocalFileManager()
+        if fs.has_experiment_folder():
+            fs.save_experiment(experiment_spec)
+
+    def _apply_changes(self, experiment_spec, changes):
+        """
+        Applies a ChangeSet to the running experiment, experiment_spec is
+        compiled
+        """
+        raise NotImplementedError
+
+    def _publish_addresses(self, experiment_spec, changes):
+        """
+        Sends the new address book to the name service of the experiment
+        (see ExperimentSpec.use_name_service), which notifies its clients.
+        A name service that was just (re)started already has it.
+        """
+        from symphony.nameservice import NAME_SERVICE, NameServiceClient
+        if (None, NAME_SERVICE) in changes.added + changes.restarted():
+            return
+        entry = experiment_spec.address_book.entries[NAME_SERVICE]
+        try:
+            client = NameServiceClient((entry['host'], entry['port']))
+            client.publish(experiment_spec.address_book.entries,
+                           removed=changes.removed_services)
+            client.close()
+        except OSError as e:
+            print_err('[Warning] Cannot reach the name service of {}: {}'
+                      .format(experiment_spec.name, e))
 
     # ========================================================
     # ===================== Action API =======================
@@ -76,9 +333,22 @@ class Cluster(metaclass=_BackendRegistry):
         """
         raise NotImplementedError
 
-    def delete_batch(self, experiment_names):
-        for exp in experiment_names:
-            self.delete(exp)
+    def delete_batch(self, experiment_names, max_workers=8, verbose=True):
+        """
+        Deletes experiments concurrently. A failed deletion does not abort
+        the others.
+
+        Args:
+            max_workers: maximum number of deletions in flight
+            verbose: print progress as each deletion finishes
+
+        Returns:
+            list of BatchResult, one per experiment
+        """
+        return run_batch(self.delete, experiment_names,
+                         max_workers=max_workers,
+                         verbose=verbose,
+                         action='deleted')
 
     def transfer_file(self, experiment_name, src, dest):
         """
@@ -147,6 +417,30 @@ class Cluster(metaclass=_BackendRegistry):
         """
         raise NotImplementedError
 
+    def describe_processes(self, experiment_name, processes):
+        """
+        Describes many processes of an experiment with a single
+        describe_experiment query, sliced client-side
+
+        Args:
+            processes: list of (process_group_name, process_name), group is
+                None for lone processes
+
+        Returns:
+            OrderedDict {(process_group_name, process_name): status}, status
+            is the same as describe_process() or None if the process does not
+            exist
+        """
+        return self._slice_processes(
+            self.describe_experiment(experiment_name), processes)
+
+    def _slice_processes(self, exp_dict, processes):
+        out = OrderedDict()
+        for process_group_name, process_name in processes:
+            out[(process_group_name, process_name)] = \
+                exp_dict.get(process_group_name, {}).get(process_name)
+        return out
+
     def get_log(self, experiment_name, process_name, process_group=None,
                 follow=False, since=0, tail=100, print_logs=False):
         """
@@ -184,6 +478,39 @@ class Cluster(metaclass=_BackendRegistry):
                     found.append(process_group_name)
         return found
 
+    def watch_experiment(self, experiment_name, timeout=None, poll_interval=1.0):
+        """
+        Yields ProcessEvent whenever a process of the experiment changes state.
+        Backends override this with their native change feed. The default
+        polls describe_experiment and only reports CREATED and DELETED.
+
+        Args:
+            timeout: stop watching after this many seconds, None for forever
+            poll_interval: seconds between two polls
+        """
+        tracker = EventTracker()
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            # bypass the query cache, its ttl may exceed poll_interval
+            exp = type(self).describe_experiment(self, experiment_name)
+            seen = set()
+            for process_group_name, process_group in exp.items():
+                for process_name in process_group:
+                    seen.add((process_group_name, process_name))
+                    for event in tracker.update(process_group_name, process_name):
+                        yield event
+            for key in tracker.keys():
+                if key not in seen:
+                    for event in tracker.remove(*key):
+                        yield event
+            if deadline is None:
+                time.sleep(poll_interval)
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return
+                time.sleep(min(poll_interval, remaining))
+
     def set_experiment(self, experiment_name):
         """
         Args:
@@ -214,19 +541,23 @@ class Cluster(metaclass=_BackendRegistry):
             tuple (list_of_matches, is_exact)
         """
         all_names = self.list_experiments()
+        return self._match_experiment_name(name, all_names)
+
+    def _match_experiment_name(self, name, all_names):
+        """
+        Matching logic of fuzzy_match_experiment, independent of the query.
+        The name index is updated incrementally from @all_names.
+        """
+        index = self._experiment_index()
+        index.sync(all_names)
+        self._prune_process_indexes(index)
         prefixed_name = self.prefix_username(name)
-        if prefixed_name in all_names:
+        if prefixed_name in index:
             return [prefixed_name], True
-        if name in all_names:
+        if name in index:
             return [name], True
         # fuzzy matching
-        matches = []
-        matches += sorted([n for n in all_names if n.startswith(prefixed_name)])
-        matches += sorted([n for n in all_names if n.startswith(name)])
-        matches += sorted([n for n in all_names if n.endswith(name)])
-        matches += sorted([n for n in all_names if name in n])
-        matches = deduplicate_with_order(matches)
-        return matches, False
+        return index.fuzzy_match(prefixed_name, name), False
 
     def fuzzy_match_process(self, proc_name, exp_name):
         """
@@ -246,33 +577,52 @@ class Cluster(metaclass=_BackendRegistry):
             ([('pg1', 'proc1'), ('pg2', 'proc2'), (None, 'proc_lone')], False)
         """
         exp_dict = self.describe_experiment(exp_name)
-        all_pairs = []
-        exact_matches = []
-        for pgroup_name, pgroup_dict in exp_dict.items():
-            for pname in pgroup_dict:
-                all_pairs.append((pgroup_name, pname))
-                if pname == proc_name:
-                    exact_matches.append((pgroup_name, pname))
+        return self._match_process_name(proc_name, exp_dict, exp_name)
+
+    def _match_process_name(self, proc_name, exp_dict, exp_name=None):
+        """
+        Matching logic of fuzzy_match_process, independent of the query.
+        Indexes are kept per experiment and updated incrementally.
+        """
+        exact_matches = [(pgroup_name, proc_name)
+                         for pgroup_name, pgroup_dict in exp_dict.items()
+                         if proc_name in pgroup_dict]
         if exact_matches:
             return exact_matches, True
 
         # fuzzy matching
-        matches = []
-        # sort by proc_name (pair[1]), and then by pgroup_name (pair[0]
-        # pgroup_name can be None, so we need to stringify
-        comparator = lambda pair: (str(pair[1]), str(pair[0]))
-        matches += sorted([
-            (pg, p) for pg, p in all_pairs if p.startswith(proc_name)
-        ], key=comparator)
-        matches += sorted([
-            (pg, p) for pg, p in all_pairs if p.endswith(proc_name)
-        ], key=comparator)
-        matches += sorted([
-            (pg, p) for pg, p in all_pairs if proc_name in p
-        ], key=comparator)
-        matches = deduplicate_with_order(matches)
+        index = self._process_index(exp_name)
+        index.sync((pname, pgroup_name)
+                   for pgroup_name, pgroup_dict in exp_dict.items()
+                   for pname in pgroup_dict)
+        # sorted by proc_name, and then by pgroup_name
+        # pgroup_name can be None, index.tags() sorts them stringified
+        matches = [(pgroup_name, pname)
+                   for pname in index.fuzzy_match(proc_name)
+                   for pgroup_name in index.tags(pname)]
         return matches, False
 
+    def _experiment_index(self):
+        if getattr(self, '_experiment_name_index', None) is None:
+            self._experiment_name_index = NameIndex()
+        return self._experiment_name_index
+
+    def _process_index(self, exp_name):
+        if getattr(self, '_process_name_indexes', None) is None:
+            self._process_name_indexes = {}
+        if exp_name not in self._process_name_indexes:
+            self._process_name_indexes[exp_name] = NameIndex()
+        return self._process_name_indexes[exp_name]
+
+    def _prune_process_indexes(self, experiment_index):
+        """
+        Forgets process indexes of experiments that no longer exist
+        """
+        indexes = getattr(self, '_process_name_indexes', None) or {}
+        for exp_name in list(indexes.keys()):
+            if exp_name is not None and exp_name not in experiment_index:
+                del indexes[exp_name]
+
     def prefix_username(self, name):
         username = SymphonyConfig().username
         if username is None:
@@ -0,0 +1,118 @@
+"""
+Process status change events yielded by Cluster.watch_experiment
+"""
+import time
+
+
+class ProcessEvent(object):
+    CREATED = 'created'
+    RUNNING = 'running'
+    READY = 'ready'
+    EXITED = 'exited'
+    RESTARTED = 'restarted'
+    DELETED = 'deleted'
+
+    def __init__(self, type, process_name, process_group_name=None,
+                 exit_code=None, timestamp=None, info=None):
+        """
+        Args:
+            type: one of ProcessEvent.CREATED, RUNNING, READY, EXITED,
+                RESTARTED, DELETED
+            process_name: name of the process
+            process_group_name: None for lone processes
+            exit_code: exit code for EXITED events, None if unknown
+            timestamp: time.time() when the event was observed
+            info: backend specific details
+        """
+        self.type = type
+        self.process_name = process_name
+        self.process_group_name = process_group_name
+        self.exit_code = exit_code
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.info = info
+
+    def __eq__(self, other):
+        return isinstance(other, ProcessEvent) and \
+            (self.type, self.process_name, self.process_group_name,
+             self.exit_code) == \
+            (other.type, other.process_name, other.process_group_name,
+             other.exit_code)
+
+    def __repr__(self):
+        if self.process_group_name is None:
+            name = self.process_name
+        else:
+            name = '{}/{}'.format(self.process_group_name, self.process_name)
+        if self.type == self.EXITED:
+            return 'ProcessEvent({} {} ({}))'.format(name, self.type, self.exit_code)
+        return 'ProcessEvent({} {})'.format(name, self.type)
+
+
+class EventTracker(object):
+    """
+    Turns successive status observations of processes into ProcessEvents.
+    Backends feed it whatever their change feed reports.
+    """
+    def __init__(self):
+        self._last = {}  # {(group, process): (state, ready, restarts)}
+
+    def __contains__(self, key):
+        return key in self._last
+
+    def keys(self):
+        return list(self._last.keys())
+
+    def last(self, process_group_name, process_name):
+        """
+        Returns:
+            (state, ready, restarts) of the last update, None if unknown
+        """
+        return self._last.get((process_group_name, process_name))
+
+    def update(self, process_group_name, process_name, state=None,
+               ready=False, restarts=0, exit_code=None, info=None):
+        """
+        Args:
+            state: None if unknown, else 'waiting', 'running' or 'exited'
+            ready(bool): the process is ready to serve
+            restarts(int): number of restarts so far
+            exit_code: exit code if state is 'exited'
+
+        Returns:
+            list of ProcessEvent implied by the change since last update
+        """
+        key = (process_group_name, process_name)
+        events = []
+
+        def _event(type, **kwargs):
+            events.append(ProcessEvent(type, process_name, process_group_name,
+                                       info=info, **kwargs))
+
+        if key not in self._last:
+            _event(ProcessEvent.CREATED)
+            last_state, last_ready, last_restarts = None, False, restarts
+        else:
+            last_state, last_ready, last_restarts = self._last[key]
+        if restarts > last_restarts:
+            _event(ProcessEvent.RESTARTED)
+        if state != last_state or restarts > last_restarts:
+            if state == 'running':
+                _event(ProcessEvent.RUNNING)
+            elif state == 'exited':
+                _event(ProcessEvent.EXITED, exit_code=exit_code)
+        if ready and not last_ready:
+            _event(ProcessEvent.READY)
+        self._last[key] = (state, ready, restarts)
+        return events
+
+    def remove(self, process_group_name, process_name, info=None):
+        """
+        Returns:
+            [DELETED event] if the process was known, else []
+        """
+        key = (process_group_name, process_name)
+        if key not in self._last:
+            return []
+        del self._last[key]
+        return [ProcessEvent(ProcessEvent.DELETED, process_name,
+                             process_group_name, info=info)]
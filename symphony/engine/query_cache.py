@@ -0,0 +1,156 @@
+"""
+TTL cache for the Cluster Query API.
+Install with cluster.enable_query_cache()
+"""
+import time
+import functools
+import inspect
+import threading
+
+
+class QueryCache(object):
+    """
+    Caches results of the Cluster Query API for a per-method TTL.
+    Launch / delete through the cluster invalidate the affected entries.
+
+    Cached values are shared between callers and must not be mutated.
+    A different cache can be plugged in by subclassing and overriding
+    get() / invalidate().
+    """
+    # methods whose results are cached, their first parameter is the experiment
+    QUERY_METHODS = (
+        'list_experiments',
+        'describe_experiment',
+        'describe_process_group',
+        'describe_process',
+    )
+    # methods after which cached results of the experiment are dropped
+    MUTATING_METHODS = {
+        'launch': lambda spec, *args, **kwargs: spec.name,
+        'update': lambda spec, *args, **kwargs: spec.name,
+        'delete': lambda experiment_name=None, *args, **kwargs: experiment_name,
+    }
+
+    def __init__(self, ttl=5.0, ttls=None, clock=time.monotonic):
+        """
+        Args:
+            ttl: seconds a query result stays valid
+            ttls(dict): per-method override of ttl,
+                e.g. {'list_experiments': 30, 'describe_experiment': 2}.
+                A ttl of 0 disables caching for that method.
+            clock: time source, returns seconds
+        """
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = {}  # {(method, args, kwargs): (expiry_time, value)}
+        self._lock = threading.Lock()
+
+    def ttl_for(self, method_name):
+        return self.ttls.get(method_name, self.ttl)
+
+    def get(self, method_name, args, kwargs, compute):
+        """
+        Returns the cached result of method_name(*args, **kwargs), calls
+        compute() and caches its result on a miss or after expiry
+        """
+        ttl = self.ttl_for(method_name)
+        if ttl <= 0:
+            return compute()
+        key = (method_name, args, tuple(sorted(kwargs.items())))
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+        return value
+
+    def invalidate(self, experiment_name=None):
+        """
+        Drops cached results about experiment_name and the experiment list.
+        Drops everything if experiment_name is None.
+        """
+        with self._lock:
+            self.invalidations += 1
+            if experiment_name is None:
+                self._entries = {}
+                return
+            for key in list(self._entries.keys()):
+                # args are bound to the signature, see _cached()
+                method_name, args, _ = key
+                if method_name == 'list_experiments' or \
+                        (args and args[0] == experiment_name):
+                    del self._entries[key]
+
+    def stats(self):
+        """
+        Returns:
+            {'hits': int, 'misses': int, 'invalidations': int, 'size': int}
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+            }
+
+    # ========================================================
+    # ================= Cluster integration ==================
+    # ========================================================
+    def install(self, cluster):
+        """
+        Shadows the query and mutating methods of this cluster instance.
+        Internal calls (e.g. fuzzy_match_experiment -> list_experiments)
+        go through the cache as well.
+        """
+        for method_name in self.QUERY_METHODS:
+            method = getattr(type(cluster), method_name)
+            setattr(cluster, method_name,
+                    self._cached(method_name, method.__get__(cluster)))
+        for method_name, experiment_of in self.MUTATING_METHODS.items():
+            method = getattr(type(cluster), method_name)
+            setattr(cluster, method_name,
+                    self._invalidating(method.__get__(cluster), experiment_of))
+
+    def uninstall(self, cluster):
+        for method_name in self.QUERY_METHODS + tuple(self.MUTATING_METHODS):
+            cluster.__dict__.pop(method_name, None)
+
+    def _cached(self, method_name, method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def _query(*args, **kwargs):
+            # describe_experiment(experiment_name='exp') and
+            # describe_experiment('exp') share a key, with the experiment
+            # first, so invalidate() finds both
+            try:
+                bound = signature.bind(*args, **kwargs)
+            except TypeError:
+                return method(*args, **kwargs)
+            bound.apply_defaults()
+            return self.get(method_name, bound.args, bound.kwargs,
+                            lambda: method(*args, **kwargs))
+        return _query
+
+    def _invalidating(self, method, experiment_of):
+        @functools.wraps(method)
+        def _mutate(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            finally:
+                try:
+                    experiment_name = experiment_of(*args, **kwargs)
+                except (TypeError, AttributeError):
+                    experiment_name = None
+                self.invalidate(experiment_name)
+        return _mutate
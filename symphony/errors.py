@@ -2,3 +2,9 @@
 
 class ResourceExistsError(Exception):
   pass
+
+class ReadinessTimeoutError(TimeoutError):
+  """
+  Raised when services of a launched experiment do not become ready in time
+  """
+  pass
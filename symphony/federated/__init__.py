@@ -0,0 +1,2 @@
+from .cluster import FederatedCluster
+from .placement import PlacementPolicy, LeastLoadedPlacement, RoundRobinPlacement
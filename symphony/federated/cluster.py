@@ -0,0 +1,269 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from symphony.engine import Cluster
+from symphony.utils.common import print_err
+from .placement import get_placement
+
+
+class FederatedCluster(Cluster):
+    """
+    Spreads experiments over several member clusters, e.g. a few kubernetes
+    clusters and tmux hosts. Each new experiment is placed on a member by
+    a PlacementPolicy, every later call is routed to the member that owns
+    the experiment. Queries that span all members run in parallel.
+    """
+    def __init__(self, members, placement='least_loaded', verbose=True,
+                 pending_timeout=600):
+        """
+        Args:
+            members: list of Cluster instances or backend names, or dict
+                {member name: Cluster}. Members of a list are named after
+                their backend and position, e.g. "kube0", "tmux1"
+            placement: PlacementPolicy, or 'least_loaded', 'round_robin'
+            verbose: warn when a member cannot be reached
+            pending_timeout: seconds an experiment placed by new_experiment
+                counts as load of its member before it is launched
+        """
+        super().__init__()
+        if not isinstance(members, dict):
+            named = OrderedDict()
+            for i, member in enumerate(members):
+                if isinstance(member, str):
+                    member = Cluster.new(member)
+                backend = type(member).__name__[:-len('Cluster')].lower()
+                named['{}{}'.format(backend, i)] = member
+            members = named
+        assert members, 'FederatedCluster needs at least one member'
+        self.members = OrderedDict(members)
+        self.placement = get_placement(placement)
+        self.verbose = verbose
+        self._owners = {}  # {experiment name: member name}
+        # {experiment name: time placed}, placed but not launched yet
+        self._pending = {}
+        self.pending_timeout = pending_timeout
+        self._lock = threading.Lock()
+        self._current = None
+
+    # =================== Private helpers ====================
+    def _fan_out(self, func, member_names=None):
+        """
+        Calls func(member) on every member in parallel
+
+        Returns:
+            OrderedDict {member name: result}, unreachable members are left out
+        """
+        if member_names is None:
+            member_names = list(self.members)
+        with ThreadPoolExecutor(max_workers=max(1, len(member_names))) as pool:
+            futures = [(name, pool.submit(func, self.members[name]))
+                       for name in member_names]
+        results = OrderedDict()
+        for name, future in futures:
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                if self.verbose:
+                    print_err('[Warning] member "{}" failed: {}'.format(name, e))
+        return results
+
+    def _refresh_owners(self):
+        """
+        Lists experiments of all members and rebuilds the ownership table.
+        An experiment that exists on several members is owned by the first.
+        Members that fail to list keep their previous entries, pending
+        experiments are forgotten after pending_timeout.
+
+        Returns:
+            OrderedDict {member name: list of experiment names}
+        """
+        listed = self._fan_out(lambda member: member.list_experiments())
+        with self._lock:
+            expired = time.monotonic() - self.pending_timeout
+            self._pending = {name: placed for name, placed in self._pending.items()
+                             if placed > expired}
+            owners = {name: member for name, member in self._owners.items()
+                      if name in self._pending or member not in listed}
+            for member_name, experiment_names in listed.items():
+                for experiment_name in experiment_names:
+                    owners.setdefault(experiment_name, member_name)
+            self._owners = owners
+        return listed
+
+    def _accepts(self, member_name, experiment_spec):
+        """
+        A member can launch specs of its own backend, by naming convention
+        KubeCluster launches KubeExperimentSpec
+        """
+        prefix = type(self.members[member_name]).__name__[:-len('Cluster')]
+        return any(cls.__name__ == prefix + 'ExperimentSpec'
+                   for cls in type(experiment_spec).__mro__)
+
+    def _place(self, experiment_name, member_names=None):
+        """
+        Records the member chosen by the placement policy as the owner
+        """
+        self._refresh_owners()
+        if member_names is None:
+            member_names = list(self.members)
+        with self._lock:
+            loads = OrderedDict((name, 0) for name in member_names)
+            for owner in self._owners.values():
+                if owner in loads:
+                    loads[owner] += 1
+            member_name = self.placement.place(experiment_name, loads)
+            assert member_name in loads, \
+                'placement chose unknown member "{}"'.format(member_name)
+            self._owners[experiment_name] = member_name
+            self._pending[experiment_name] = time.monotonic()
+        return member_name
+
+    def locate(self, experiment_name):
+        """
+        Returns:
+            name of the member that owns the experiment
+        """
+        if experiment_name not in self._owners:
+            self._refresh_owners()
+        if experiment_name not in self._owners:
+            raise ValueError('Experiment "{}" does not exist'.format(experiment_name))
+        return self._owners[experiment_name]
+
+    def _owner(self, experiment_name):
+        return self.members[self.locate(experiment_name)]
+
+    # ===================== Launch API =======================
+    def new_experiment(self, name, *args, **kwargs):
+        """
+        Places the experiment, the spec is created by the chosen member
+        because specs are backend specific
+        """
+        member_name = self._place(name)
+        spec = self.members[member_name].new_experiment(name, *args, **kwargs)
+        if spec.name != name:  # prefixed with the username
+            with self._lock:
+                del self._owners[name]
+                self._owners[spec.name] = member_name
+                self._pending.pop(name, None)
+                self._pending[spec.name] = time.monotonic()
+        return spec
+
+    def launch(self, experiment_spec, *args, **kwargs):
+        """
+        Launches on the member chosen by new_experiment, or on the member
+        that already has an experiment of that name (e.g. force=True).
+        Other specs are placed among the members of their backend.
+        """
+        if experiment_spec.name not in self._pending \
+                and experiment_spec.name not in self.list_experiments():
+            candidates = [name for name in self.members
+                          if self._accepts(name, experiment_spec)]
+            if not candidates:
+                raise ValueError('No member can launch {}'.format(
+                    type(experiment_spec).__name__))
+            self._place(experiment_spec.name, candidates)
+        member = self._owner(experiment_spec.name)
+        try:
+            return member.launch(experiment_spec, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._pending.pop(experiment_spec.name, None)
+
+    def update(self, experiment_spec, *args, **kwargs):
+        return self._owner(experiment_spec.name).update(
+            experiment_spec, *args, **kwargs)
+
+    # ===================== Action API =======================
+    def delete(self, experiment_name, *args, **kwargs):
+        result = self._owner(experiment_name).delete(experiment_name, *args, **kwargs)
+        with self._lock:
+            self._owners.pop(experiment_name, None)
+        return result
+
+    def transfer_file(self, experiment_name, *args, **kwargs):
+        return self._owner(experiment_name).transfer_file(
+            experiment_name, *args, **kwargs)
+
+    def login(self, experiment_name, *args, **kwargs):
+        return self._owner(experiment_name).login(
+            experiment_name, *args, **kwargs)
+
+    def exec_command(self, experiment_name, *args, **kwargs):
+        return self._owner(experiment_name).exec_command(
+            experiment_name, *args, **kwargs)
+
+    # ===================== Query API ========================
+    def list_experiments(self):
+        """
+        Returns:
+            experiment names of all members, queried in parallel
+        """
+        listed = self._refresh_owners()
+        names = []
+        seen = set()
+        for experiment_names in listed.values():
+            for name in experiment_names:
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+        return names
+
+    def list_members(self):
+        """
+        Returns:
+            OrderedDict {member name: list of experiment names}
+        """
+        return self._refresh_owners()
+
+    def describe_experiment(self, experiment_name):
+        """
+        Routed to the owner if known, otherwise every member is asked in
+        parallel and the first one that has the experiment answers
+        """
+        if experiment_name in self._owners:
+            return self._owner(experiment_name).describe_experiment(experiment_name)
+        results = self._fan_out(
+            lambda member: member.describe_experiment(experiment_name))
+        for member_name, result in results.items():
+            if result:
+                with self._lock:
+                    self._owners.setdefault(experiment_name, member_name)
+                return result
+        raise ValueError('Experiment "{}" does not exist'.format(experiment_name))
+
+    def describe_process_group(self, experiment_name, *args, **kwargs):
+        return self._owner(experiment_name).describe_process_group(
+            experiment_name, *args, **kwargs)
+
+    def describe_process(self, experiment_name, *args, **kwargs):
+        return self._owner(experiment_name).describe_process(
+            experiment_name, *args, **kwargs)
+
+    def describe_processes(self, experiment_name, processes):
+        return self._owner(experiment_name).describe_processes(
+            experiment_name, processes)
+
+    def get_log(self, experiment_name, *args, **kwargs):
+        return self._owner(experiment_name).get_log(
+            experiment_name, *args, **kwargs)
+
+    def external_service(self, experiment_name, *args, **kwargs):
+        return self._owner(experiment_name).external_service(
+            experiment_name, *args, **kwargs)
+
+    def external_url(self, experiment_name, *args, **kwargs):
+        return self._owner(experiment_name).external_url(
+            experiment_name, *args, **kwargs)
+
+    def watch_experiment(self, experiment_name, *args, **kwargs):
+        return self._owner(experiment_name).watch_experiment(
+            experiment_name, *args, **kwargs)
+
+    def set_experiment(self, experiment_name):
+        member_name = self.locate(experiment_name)
+        self.members[member_name].set_experiment(experiment_name)
+        self._current = experiment_name
+
+    def current_experiment(self):
+        return self._current
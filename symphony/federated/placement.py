@@ -0,0 +1,64 @@
+"""
+Placement policies decide which member of a FederatedCluster hosts a new
+experiment
+"""
+import itertools
+
+
+class PlacementPolicy(object):
+    def place(self, experiment_name, loads):
+        """
+        Args:
+            experiment_name: name of the experiment to place
+            loads: OrderedDict {member name: number of experiments on it}
+                of the members that can host the experiment
+
+        Returns:
+            name of the chosen member
+        """
+        raise NotImplementedError
+
+
+class LeastLoadedPlacement(PlacementPolicy):
+    """
+    Picks the member with the fewest experiments, the first one on ties.
+    Members can be weighted by capacity, e.g. {'big': 4, 'small': 1}
+    """
+    def __init__(self, capacities=None):
+        self.capacities = capacities or {}
+
+    def place(self, experiment_name, loads):
+        return min(loads, key=lambda member:
+                   loads[member] / self.capacities.get(member, 1))
+
+
+class RoundRobinPlacement(PlacementPolicy):
+    """
+    Cycles through the members regardless of their load
+    """
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def place(self, experiment_name, loads):
+        members = list(loads)
+        return members[next(self._counter) % len(members)]
+
+
+_PLACEMENTS = {
+    'least_loaded': LeastLoadedPlacement,
+    'round_robin': RoundRobinPlacement,
+}
+
+
+def get_placement(placement):
+    """
+    Args:
+        placement: PlacementPolicy instance or one of 'least_loaded',
+            'round_robin'
+    """
+    if isinstance(placement, PlacementPolicy):
+        return placement
+    assert placement in _PLACEMENTS, \
+        '"{}" is not a valid placement. Available placements: {}'.format(
+            placement, list(_PLACEMENTS.keys()))
+    return _PLACEMENTS[placement]()
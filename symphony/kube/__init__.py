@@ -1,5 +1,6 @@
 from .cluster import KubeCluster
+from .async_cluster import KubeAsyncCluster
 from .process import KubeProcessSpec
 from .process_group import KubeProcessGroupSpec
 from .experiment import KubeExperimentSpec
-from .machine_dispatcher import GKEDispatcher
\ No newline at end of file
+from .machine_dispatcher import GKEDispatcher
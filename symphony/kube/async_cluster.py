@@ -0,0 +1,177 @@
+import asyncio
+import codecs
+from benedict import BeneDict
+from symphony.engine import AsyncCluster
+from symphony.engine.events import EventTracker
+import symphony.utils.runner as runner
+from symphony.errors import ReadinessTimeoutError
+
+
+class KubeAsyncCluster(AsyncCluster):
+    """
+    Talks to kubectl through asyncio subprocesses, so hundreds of
+    describe / log queries can be in flight on a single event loop.
+    Command construction and output parsing are shared with KubeCluster.
+    """
+    # ===================== Launch API =======================
+    async def launch(self, experiment_spec, force=False, dry_run=False,
+                     wait_ready=False, ready_timeout=60):
+        kube = self.cluster
+        print('launching', experiment_spec.name)
+        launch_plan = experiment_spec.compile()
+
+        if dry_run:
+            print(launch_plan)
+        else:
+            cmds = kube._launch_cmds(experiment_spec, launch_plan, force)
+            if wait_ready:
+                cmds = cmds[:1] + kube._wave_cmds(experiment_spec, ready_timeout)
+            for cmd, stdin in cmds:
+                out, err, retcode = await runner.run_verbose_async(
+                    cmd, stdin=stdin, throttle=kube._throttle_for(cmd))
+                if retcode != 0 and cmd.startswith('kubectl wait'):
+                    raise ReadinessTimeoutError(
+                        'Pods of experiment {} are not ready after {} seconds: {}'
+                        .format(experiment_spec.name, ready_timeout, err.strip()))
+                if retcode != 0:
+                    raise RuntimeError('[Error] Cannot launch experiment {}: {}'
+                                       .format(experiment_spec.name, err.strip()))
+            await self.set_experiment(experiment_spec.name)
+
+    # ===================== Action API =======================
+    async def delete(self, experiment_name):
+        cmd = self.cluster._delete_cmd(experiment_name)
+        await runner.run_verbose_async(
+            cmd, print_out=True, raise_on_error=False,
+            throttle=self.cluster._throttle_for(cmd))
+
+    # ===================== Query API ========================
+    async def query_resources(self, resource,
+                              output_format,
+                              names=None,
+                              labels='',
+                              fields='',
+                              namespace=None):
+        """
+        See KubeCluster.query_resources
+        """
+        kube = self.cluster
+        cmd, output_format = kube._query_resources_cmd(
+            resource, output_format, names, labels, fields, namespace)
+        out, _, _ = await runner.run_verbose_async(
+            cmd, print_out=False, raise_on_error=True, throttle=kube.throttle)
+        return kube._parse_query_output(out, output_format)
+
+    async def list_experiments(self):
+        all_names = await self.query_resources('namespace', output_format='name')
+        return self.cluster._parse_namespaces(all_names)
+
+    async def describe_experiment(self, experiment_name):
+        all_processes = await self.query_resources(
+            'pod', output_format='json', namespace=experiment_name)
+        return self.cluster._parse_pods(all_processes)
+
+    async def describe_process_group(self,
+                                     experiment_name,
+                                     process_group_name):
+        res = await self.query_resources('pod', names=[process_group_name],
+                                         output_format='json',
+                                         namespace=experiment_name)
+        return self.cluster._parse_pod(res, experiment_name, process_group_name)
+
+    async def describe_process(self,
+                               experiment_name,
+                               process_name,
+                               process_group_name=None):
+        if process_group_name is None:
+            # standalone process is in a pod with name same as its process group
+            process_group_name = process_name
+        pg = await self.describe_process_group(experiment_name, process_group_name)
+        return pg[process_name]
+
+    async def get_log(self, experiment_name, process_name, process_group=None,
+                      follow=False, since=0, tail=500, print_logs=False):
+        if follow:  # streams to stdout until the user interrupts
+            return await super().get_log(
+                experiment_name, process_name, process_group=process_group,
+                follow=follow, since=since, tail=tail, print_logs=print_logs)
+        if process_group is None:
+            pod_name = process_name
+        else:
+            pod_name = process_group
+        cmd = self.cluster._get_logs_cmd(
+            pod_name, process_name, follow=False,
+            since=since, tail=tail, namespace=experiment_name
+        )
+        out, err, retcode = await runner.run_verbose_async(
+            cmd, print_out=print_logs, raise_on_error=False,
+            throttle=self.cluster.throttle)
+        if retcode != 0:
+            return ''
+        else:
+            return out
+
+    async def watch_experiment(self, experiment_name, timeout=None):
+        """
+        Async iterator over ProcessEvents, see KubeCluster.watch_experiment
+        """
+        kube = self.cluster
+        tracker = EventTracker()
+        decoder = runner.JSONStreamDecoder()
+        # chunks may split multi-byte characters
+        utf8 = codecs.getincrementaldecoder('utf-8')()
+        proc = await asyncio.create_subprocess_exec(
+            *kube._watch_cmd(experiment_name),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        try:
+            while True:
+                if deadline is None:
+                    chunk = await proc.stdout.read(65536)
+                else:
+                    try:
+                        chunk = await asyncio.wait_for(
+                            proc.stdout.read(65536), deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        return
+                if not chunk:
+                    return
+                for doc in decoder.feed(utf8.decode(chunk)):
+                    for event in kube._parse_watch_event(tracker, doc):
+                        yield event
+        finally:
+            if proc.returncode is None:
+                proc.terminate()
+                await proc.wait()
+
+    async def external_url(self, experiment_name, service_name):
+        res = await self.query_resources('svc', 'yaml',
+                                         names=[service_name],
+                                         namespace=experiment_name)
+        return self.cluster._parse_external_url(res, experiment_name, service_name)
+
+    async def current_context(self):
+        out, err, retcode = await runner.run_verbose_async(
+            'kubectl config current-context', print_out=False,
+            raise_on_error=True, throttle=self.cluster.throttle)
+        return out
+
+    async def config_view(self):
+        out, err, retcode = await runner.run_verbose_async(
+            'kubectl config view', print_out=False, raise_on_error=True)
+        return BeneDict(self.cluster._parse_query_output(out, 'yaml'))
+
+    async def current_experiment(self):
+        config, current_context = await asyncio.gather(
+            self.config_view(), self.current_context())
+        return self.cluster._context_namespace(config, current_context)
+
+    async def set_experiment(self, namespace):
+        _, _, retcode = await runner.run_verbose_async(
+            self.cluster._set_experiment_cmd(namespace),
+            print_out=True, raise_on_error=False, throttle=self.cluster.throttle)
+        if retcode == 0:
+            print('successfully switched to namespace `{}`'.format(namespace))
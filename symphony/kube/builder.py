@@ -2,8 +2,29 @@ import copy
 import base64
 from os import path
 from pathlib import Path
+import yaml
 from benedict import BeneDict
+from symphony.spec.base import marks_dirty
 from symphony.utils.common import merge_dict, strip_repository_name
+try:
+    from yaml import CSafeDumper as _SafeDumper
+except ImportError:  # PyYAML without libyaml
+    from yaml import SafeDumper as _SafeDumper
+
+
+class _YMLDumper(_SafeDumper):
+    pass
+
+
+_YMLDumper.add_representer(BeneDict, yaml.representer.SafeRepresenter.represent_dict)
+
+
+def dump_yml_str(data):
+    """
+    Same YAML as BeneDict.dump_yaml_str(), without converting data to dicts
+    first and emitted by libyaml when it is installed
+    """
+    return yaml.dump(data, Dumper=_YMLDumper, default_flow_style=False, indent=2)
 
 
 class KubeConfigYML(object):
@@ -20,7 +41,99 @@ class KubeConfigYML(object):
         """
         Dump yml string for kubernetes launch yml
         """
-        return self.data.dump_yaml_str()
+        return dump_yml_str(self.data)
+
+
+class KubeTemplate(object):
+    """
+    Immutable snapshot of a container or a pod, shared by the ones derived
+    from it, see KubeTemplateYML.derive()
+    """
+    __slots__ = ('data', 'mounted_volumes')
+
+    def __init__(self, yml):
+        self.data = BeneDict(yml.merged())  # a copy
+        self.mounted_volumes = tuple(yml.mounted_volumes)
+
+    def matches(self, yml):
+        return self.mounted_volumes == tuple(yml.mounted_volumes) \
+            and self.data == yml.merged()
+
+
+class KubeTemplateYML(KubeConfigYML):
+    """
+    Copy-on-write definition: a container or pod derived from a template
+    stores only what it overrides, merged with the template when it is
+    emitted. Reading or changing data gives it a full copy of its own.
+    """
+    def __init__(self, template=None):
+        self.template = template
+        self._data = None if template is not None else BeneDict({})
+        self._snapshot = None  # KubeTemplate of this one, see derive()
+        self.mounted_volumes = [] if template is None else template.mounted_volumes
+        self.owner = None  # process or process group compiled from this one
+
+    def _mark_dirty(self):
+        """
+        Records that the owner must be compiled again, changes made to the
+        yml directly do not go through the methods of the owner
+        """
+        if self.owner is not None:
+            self.owner._mark_dirty()
+
+    @property
+    def data(self):
+        # may be changed in place by the caller
+        self._mark_dirty()
+        if self._data is None:
+            self._data = BeneDict(self.merged())
+            self.mounted_volumes = list(self.mounted_volumes)
+            self.template = None
+            self._clear_overrides()
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._mark_dirty()
+        self._data = data
+        self.template = None
+        self._clear_overrides()
+
+    def merged(self):
+        """
+        Returns:
+            the whole definition, it shares the subtrees of the template
+            and must not be changed
+        """
+        if self._data is not None:
+            return self._data
+        return self._merge(self.template.data)
+
+    def get(self, key, default=None):
+        """
+        Returns:
+            top level field of the definition, without copying the template
+        """
+        return self.merged().get(key, default)
+
+    def _merge(self, base):
+        raise NotImplementedError
+
+    def _clear_overrides(self):
+        raise NotImplementedError
+
+    def _template(self):
+        """
+        Returns:
+            KubeTemplate of the current definition, reused while it does
+            not change
+        """
+        if self._snapshot is None or not self._snapshot.matches(self):
+            self._snapshot = KubeTemplate(self)
+        return self._snapshot
+
+    def yml(self):
+        return dump_yml_str(self.merged())
 
 
 """apiVersion: v1
@@ -307,17 +420,57 @@ class KubeEmptyDirVolume(KubeVolume):
         }
 
 
-class KubeContainerYML(KubeConfigYML):
-    def __init__(self, name, image):
-        super().__init__()
-        self.data = BeneDict({
-            'name': name,
-            'image': image,
-            'env': [{'name': 'SYMPHONY_ROLE', 'value': name}]
-        })
-        self.mounted_volumes = []
+class KubeContainerYML(KubeTemplateYML):
+    def __init__(self, name, image, template=None):
+        """
+        Args:
+            template: KubeTemplate the container is derived from, see derive()
+        """
+        self._overrides = {}  # {top level field: value} replacing the template's
+        self._env = {}  # {name: value} replacing or added to the template's env
+        super().__init__(template)
+        if template is None:
+            self.data = BeneDict({
+                'name': name,
+                'image': image,
+                'env': [{'name': 'SYMPHONY_ROLE', 'value': name}]
+            })
         self.pod_yml = None
 
+    def derive(self, name):
+        """
+        Returns:
+            new container named name, that shares the definition of this
+            one, e.g. a replica
+        """
+        container = KubeContainerYML(name, None, template=self._template())
+        container.set_name(name)
+        container.set_env('SYMPHONY_ROLE', name)
+        return container
+
+    def _merge(self, base):
+        data = dict(base)
+        data.update(self._overrides)
+        if self._env:
+            env = []
+            for entry in base.get('env', ()):
+                if entry['name'] in self._env:
+                    entry = {'name': entry['name'], 'value': self._env[entry['name']]}
+                env.append(entry)
+            known = {entry['name'] for entry in env}
+            env.extend({'name': name, 'value': value}
+                       for name, value in self._env.items() if name not in known)
+            data['env'] = env
+        return data
+
+    def _clear_overrides(self):
+        self._overrides = {}
+        self._env = {}
+
+    @property
+    def name(self):
+        return self.get('name')
+
     @classmethod
     def load(cls, di):
         instance = cls('', '')
@@ -327,19 +480,33 @@ class KubeContainerYML(KubeConfigYML):
 
     def save(self):
         di = {}
-        di['data'] = self.data
+        di['data'] = self.merged()
         di['mounted_volumes'] = [x.save() for x in self.mounted_volumes]
         return di
 
+    @marks_dirty
+    def _set(self, key, value):
+        if self._data is None:
+            self._overrides[key] = value
+        else:
+            self._data[key] = value
+
+    def set_name(self, name):
+        self._set('name', name)
+
     def set_command(self, command):
-        self.data.command = command
+        self._set('command', command)
 
     def set_args(self, args):
-        self.data.args = args
+        self._set('args', args)
 
+    @marks_dirty
     def set_env(self, name, value):
         name = str(name)
         value = str(value)
+        if self._data is None:
+            self._env[name] = value
+            return
         for entry in self.data['env']:
             if entry.name == name:
                 entry.value = value
@@ -350,6 +517,18 @@ class KubeContainerYML(KubeConfigYML):
         for k, v in di.items():
             self.set_env(k, v)
 
+    @marks_dirty
+    def unset_envs(self, names):
+        names = set(names)
+        if self._data is None and not any(entry['name'] in names for entry
+                                          in self.template.data.get('env', ())):
+            for name in names:
+                self._env.pop(name, None)
+            return
+        self.data['env'] = [entry for entry in self.data['env']
+                            if entry['name'] not in names]
+
+    @marks_dirty
     def mount_volume(self, volume, mount_path):
         assert isinstance(volume, KubeVolume)
         volume_mounts = self.data.get('volumeMounts', [])
@@ -401,12 +580,14 @@ class KubeContainerYML(KubeConfigYML):
         v = KubeEmptyDirVolume(name=name, use_memory=True)
         self.mount_volume(v, '/dev/shm')
 
+    @marks_dirty
     def resource_request(self, cpu=None, memory=None):
         if cpu is not None:
             merge_dict(self.data, {'resources': {'requests': {'cpu': cpu}}})
         if memory is not None:
             merge_dict(self.data, {'resources': {'requests': {'memory': memory}}})
 
+    @marks_dirty
     def resource_limit(self, cpu=None, memory=None, gpu=None):
         if cpu is not None:
             merge_dict(self.data, {'resources': {'limits': {'cpu': cpu}}})
@@ -415,48 +596,101 @@ class KubeContainerYML(KubeConfigYML):
         if gpu is not None:
             merge_dict(self.data, {'resources': {'limits': {'nvidia.com/gpu': gpu}}})
 
+    @marks_dirty
     def image_pull_policy(self, policy):
         assert policy in ['Always', 'Never', 'IfNotPresent']
         self.data['imagePullPolicy'] = policy
 
+    @marks_dirty
+    def readiness_probe(self, port, initial_delay_seconds=0, period_seconds=2):
+        """
+        The container is ready when it accepts TCP connections on port
+        """
+        self.data['readinessProbe'] = BeneDict({
+            'tcpSocket': {'port': port},
+            'initialDelaySeconds': initial_delay_seconds,
+            'periodSeconds': period_seconds,
+        })
 
-class KubePodYML(KubeConfigYML):
-    def __init__(self, name):
-        super().__init__()
-        self.data = BeneDict({
-            'apiVersion': 'v1',
-            'kind': 'Pod',
-            'metadata': {
-                'name': name,
-                'labels': {
-                    'symphony_pg': name
+
+class KubePodYML(KubeTemplateYML):
+    def __init__(self, name, template=None):
+        """
+        Args:
+            template: KubeTemplate the pod is derived from, see derive()
+        """
+        self._name = name
+        self._labels = {}  # added to the labels of the template
+        super().__init__(template)
+        if template is None:
+            self.data = BeneDict({
+                'apiVersion': 'v1',
+                'kind': 'Pod',
+                'metadata': {
+                    'name': name,
+                    'labels': {
+                        'symphony_pg': name
+                    }
+                },
+                'spec': {
+                    'containers': []
                 }
-            },
-            'spec': {
-                'containers': []
-            }
-        })
+            })
         self.container_ymls = []
         self.container_names = set()
 
+    def derive(self, name):
+        """
+        Returns:
+            new pod named name without containers, that shares the
+            definition of this one, e.g. the pod of a replica
+        """
+        pod = KubePodYML(name, template=self._template())
+        pod.add_label('symphony_pg', name)
+        return pod
+
+    def _merge(self, base):
+        metadata = dict(base['metadata'], name=self._name)
+        metadata['labels'] = dict(base['metadata']['labels'], **self._labels)
+        return dict(base, metadata=metadata)
+
+    def _clear_overrides(self):
+        self._labels = {}
+
+    def merged(self):
+        # containers are emitted from their own definitions
+        data = super().merged()
+        return dict(data, spec=dict(data['spec'], containers=[]))
+
     @classmethod
     def load(cls, di):
         instance = cls('')
-        instance.data = di['data']
+        instance.data = BeneDict(di['data'])
         return instance
 
     def save(self):
-        data = copy.deepcopy(self.data)
-        data.spec.containers = []
-        return {'data': data}
+        # containers are saved by their processes. Shallow copies only,
+        # deep copying BeneDicts dominates the time of saving an experiment
+        return {'data': self.merged()}
 
+    def yml(self):
+        data = self.merged()
+        data['spec']['containers'] = [container_yml.merged()
+                                      for container_yml in self.container_ymls]
+        return dump_yml_str(data)
+
+    @marks_dirty
     def add_label(self, key, val):
-        self.data.metadata.labels[key] = val
+        if self._data is None:
+            self._labels[key] = val
+        else:
+            self.data.metadata.labels[key] = val
 
     def add_labels(self, **kwargs):
         for k, v in kwargs.items():
-            self.data['metadata']['labels'][k] = v
+            self.add_label(k, v)
 
+    @marks_dirty
     def restart_policy(self, policy):
         assert policy in ['Always', 'OnFailure', 'Never']
         self.data['spec']['restartPolicy'] = policy
@@ -469,22 +703,23 @@ class KubePodYML(KubeConfigYML):
         for container_yml in self.container_ymls:
             container_yml.mount_volume(volume, path)
 
+    @marks_dirty
     def add_volume(self, *volumes):
         """
             Adds a volume to the list of declared volume of a pod, ignores duplicate name
         """
-        declared_volumes = self.data['spec'].get('volumes', [])
+        # checked on the merged definition, a derived pod usually declares
+        # the volumes of its template already
+        names = {volume['name'] for volume in self.merged()['spec'].get('volumes', ())}
+        new_volumes = []
         for volume in volumes:
-            duplicate = False
-            for existing_volume in declared_volumes:
-                if volume.name == existing_volume['name']:
-                    duplicate = True
-                    break
-            if duplicate:
-                continue
-            declared_volumes.append(volume.pod_spec())
-        self.data['spec']['volumes'] = declared_volumes
+            if volume.name not in names:
+                names.add(volume.name)
+                new_volumes.append(volume.pod_spec())
+        if new_volumes:
+            self.data['spec']['volumes'] = self.data['spec'].get('volumes', []) + new_volumes
 
+    @marks_dirty
     def add_toleration(self, **kwargs):
         """
             Add taint toleration to a pod
@@ -496,6 +731,7 @@ class KubePodYML(KubeConfigYML):
         tolerations.append(kwargs)
         self.data['spec']['tolerations'] = tolerations
 
+    @marks_dirty
     def node_selector(self, key, value):
         """
             Updates node_selector field by the provided selectors
@@ -511,13 +747,12 @@ class KubePodYML(KubeConfigYML):
             Add the configs from all the continaers
         """
         for container_yml in container_ymls:
-            if container_yml.data['name'] in self.container_names:
+            if container_yml.name in self.container_names:
                 continue
             if container_yml.pod_yml is not None and container_yml.pod_yml is not self:
                 raise ValueError('[Error] Adding a container to different pods')
-            for volume in container_yml.mounted_volumes:
-                self.add_volume(volume)
-            self.data['spec']['containers'].append(container_yml.data)
+            if container_yml.mounted_volumes:
+                self.add_volume(*container_yml.mounted_volumes)
             container_yml.pod_yml = self
             self.container_ymls.append(container_yml)
-            self.container_names.add(container_yml.data['name'])
+            self.container_names.add(container_yml.name)
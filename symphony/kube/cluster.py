@@ -1,66 +1,239 @@
+import json
 import shlex
 import time
 from datetime import datetime
-from pathlib import Path
 from collections import OrderedDict
 from benedict import BeneDict
 from benedict.data_format import load_yaml_str, load_json_str
 from symphony.engine import Cluster
+from symphony.engine.events import EventTracker, ProcessEvent
 from symphony.addons import LocalFileManager
+from symphony.addons.local_file_manager import plan_digest
 from symphony.utils.common import check_valid_dns, is_sequence
 import symphony.utils.runner as runner
+from symphony.utils.throttle import Throttle, get_throttle
+from symphony.spec.dependencies import launch_waves
+from symphony.errors import ReadinessTimeoutError
+from symphony.nameservice import NAME_SERVICE, server_command
 from .experiment import KubeExperimentSpec
 
 
 _RESERVED_NS = ['default', 'kube-public', 'kube-system']
+# kubectl calls that are safe to repeat, see KubeCluster._throttle_for()
+_REPEATABLE_CMDS = ('kubectl get ', 'kubectl logs ', 'kubectl config ')
 
 
 class KubeCluster(Cluster):
     def __init__(self):
         super().__init__()
         self.fs = LocalFileManager()
+        # shared by all KubeClusters, kubectl calls are rate limited and
+        # retried on transient API server errors
+        self.throttle = get_throttle('kube')
+        # same rate limit without retries, see _throttle_for()
+        self._once_throttle = Throttle(bucket=self.throttle.bucket)
 
     def new_experiment(self, *args, **kwargs):
         return KubeExperimentSpec(*args, **kwargs)
 
-    def launch(self, experiment_spec, force=False, dry_run=False):
+    def launch(self, experiment_spec, force=False, dry_run=False,
+               wait_ready=False, ready_timeout=60):
+        """
+        See Cluster.launch, pods are ready when their readiness probes
+        succeed (see KubeExperimentSpec.add_readiness_probes)
+        """
         print('launching', experiment_spec.name)
         launch_plan = experiment_spec.compile()
 
         if dry_run:
             print(launch_plan)
         else:
-            # TODO: some of them should be shared
-            if self.fs.has_experiment_folder():
-                if not force and self.fs.experiment_exists(experiment_spec.name):
-                    raise ValueError('[Error] Experiment {} already exists'.format(experiment_spec.name))
-                experiment_file = Path(self.fs.save_experiment(experiment_spec))
-                experiment_folder = experiment_file.parent
-                launch_plan_file = experiment_folder / 'kube.yml'
-                with launch_plan_file.open('w') as f:
-                    f.write(launch_plan)
-                #TODO: persist yaml file
-                runner.run_verbose('kubectl create namespace ' + experiment_spec.name)
-                runner.run_verbose('kubectl create -f "{}" --namespace {}'.format(launch_plan_file, experiment_spec.name))
-                self.set_experiment(experiment_spec.name)
-            else:
-                runner.run_verbose('kubectl create namespace ' + experiment_spec.name)
-                runner.run_verbose('kubectl create -f - --namespace {}'.format(experiment_spec.name), stdin=launch_plan)
-                self.set_experiment(experiment_spec.name)
+            cmds = self._launch_cmds(experiment_spec, launch_plan, force)
+            if cmds and wait_ready:
+                # the namespace, then services and pods wave by wave
+                cmds = cmds[:1] + self._wave_cmds(experiment_spec, ready_timeout)
+            for cmd, stdin in cmds:
+                out, err, retcode = runner.run_verbose(
+                    cmd, stdin=stdin, throttle=self._throttle_for(cmd))
+                if retcode != 0 and cmd.startswith('kubectl wait'):
+                    raise ReadinessTimeoutError(
+                        'Pods of experiment {} are not ready after {} seconds: {}'
+                        .format(experiment_spec.name, ready_timeout, err.strip()))
+                if retcode != 0:
+                    # e.g. the next waves would wait for pods that do not
+                    # exist, and launch_batch would report it ok
+                    raise RuntimeError('[Error] Cannot launch experiment {}: {}'
+                                       .format(experiment_spec.name, err.strip()))
+            self.set_experiment(experiment_spec.name)
+
+    def _throttle_for(self, cmd):
+        """
+        Returns:
+            the throttle of a kubectl command: self.throttle, which retries
+            transient failures, for the ones that are safe to repeat. A
+            create that timed out may have been applied, its retry would
+            fail with AlreadyExists, and a retry of `kubectl wait` would
+            wait ready_timeout again
+        """
+        if cmd.startswith(_REPEATABLE_CMDS) or \
+                (cmd.startswith('kubectl delete ') and '--ignore-not-found' in cmd):
+            return self.throttle
+        return self._once_throttle
+
+    def _wave_cmds(self, experiment_spec, ready_timeout):
+        """
+        Returns:
+            list of (kubectl command, stdin) that create the secrets and
+            services, then the pods of every wave of launch_waves() and
+            wait for them to be ready
+        """
+        ns = experiment_spec.name
+        components = experiment_spec._components
+        shared = [yml for name, yml in components.items()
+                  if not name.startswith('process-')]
+        cmds = []
+        if shared:
+            cmds.append(('kubectl create -f - --namespace {}'.format(ns),
+                         ''.join('---\n' + yml for yml in shared)))
+        for wave in launch_waves(experiment_spec, by_process_group=True):
+            plan = ''
+            pods = []
+            for group_name, process_name in wave:
+                if process_name is None:
+                    plan += '---\n' + components['process-group-' + group_name]
+                    pods.append('pod/' + group_name)
+                else:
+                    plan += '---\n' + components['process-' + process_name]
+                    pods.append('pod/' + process_name)
+            cmds.append(('kubectl create -f - --namespace {}'.format(ns), plan))
+            cmds.append(('kubectl wait --for=condition=Ready {} --namespace {} '
+                         '--timeout={}s'.format(' '.join(pods), ns,
+                                                int(ready_timeout)), ''))
+        return cmds
+
+    def _launch_cmds(self, experiment_spec, launch_plan, force=False):
+        """
+        Persists the experiment and stores its plan (see
+        LocalFileManager.save_plan) if an experiment folder is configured
+
+        Returns:
+            list of (kubectl command, stdin) that create the experiment,
+            empty if it already runs the same plan
+        """
+        name = experiment_spec.name
+        cmds = [
+            ('kubectl create namespace ' + name, ''),
+            ('kubectl create -f - --namespace {}'.format(name), launch_plan),
+        ]
+        if not self.fs.has_experiment_folder():
+            return cmds
+        plan_hash, _ = plan_digest(experiment_spec._components)
+        if not force and self.fs.experiment_exists(name):
+            if (self.fs.experiment_plan(name) == plan_hash
+                    and name in self.list_experiments()):
+                print('experiment {} already runs plan {}'.format(name, plan_hash[:12]))
+                return []
+            raise ValueError('[Error] Experiment {} already exists'.format(name))
+        self.fs.save_experiment(experiment_spec)
+        self.fs.save_plan(name, experiment_spec._components)
+        return cmds
+
+    def _save_running_spec(self, experiment_spec):
+        super()._save_running_spec(experiment_spec)
+        if self.fs.has_experiment_folder():
+            # the experiment now runs the updated plan
+            self.fs.save_plan(experiment_spec.name, experiment_spec._components)
+
+    def _apply_changes(self, experiment_spec, changes):
+        for cmd, stdin in self._update_cmds(experiment_spec, changes):
+            out, err, retcode = runner.run_verbose(
+                cmd, stdin=stdin, throttle=self._throttle_for(cmd))
+            if retcode != 0:
+                # the experiment does not run experiment_spec, it must not be
+                # saved as the running spec
+                raise RuntimeError('[Error] Cannot update experiment {}: {}'
+                                   .format(experiment_spec.name, err.strip()))
+
+    def _publish_addresses(self, experiment_spec, changes):
+        publish = self._publish_cmd(experiment_spec, changes)
+        if publish is not None:
+            cmd, stdin = publish
+            runner.run_verbose(cmd, stdin=stdin, throttle=self._throttle_for(cmd))
+
+    def _publish_cmd(self, experiment_spec, changes):
+        """
+        The name service is only reachable inside the cluster, the address
+        book is sent by its own pod
+
+        Returns:
+            (kubectl command, stdin), None if the name service was just
+            (re)started with the new address book
+        """
+        if (None, NAME_SERVICE) in changes.added + changes.restarted():
+            return None
+        stdin = json.dumps({'entries': experiment_spec.address_book.entries,
+                            'removed': changes.removed_services})
+        return ('kubectl exec -i {} --namespace {} -- {} publish'.format(
+            NAME_SERVICE, experiment_spec.name, ' '.join(server_command())), stdin)
+
+    def _update_cmds(self, experiment_spec, changes):
+        """
+        Pods are immutable, a changed process is recreated with its pod:
+        a lone process is its own pod, a process in a group is recreated with
+        the whole group.
+
+        Returns:
+            list of (kubectl command, stdin) that apply a ChangeSet
+        """
+        ns = experiment_spec.name
+        components = experiment_spec._components  # of the compile in update()
+        removed_pods = list(changes.removed_process_groups)
+        removed_pods += [name for group, name in changes.removed if group is None]
+        replaced = ['process-group-' + name for name in changes.changed_process_groups()]
+        replaced += ['process-' + name for group, name in changes.restarted()
+                     if group is None]
+        created = []
+        for name in changes.added_services:
+            for kind in ('exposed-service-', 'binded-service-'):
+                if kind + name in components:
+                    created.append(kind + name)
+        created += ['process-group-' + name for name in changes.added_process_groups]
+        created += ['process-' + name for group, name in changes.added
+                    if group is None]
+
+        def _plan(names):
+            return ''.join('---\n' + components[name] for name in names)
+
+        cmds = []
+        if changes.removed_services:
+            cmds.append(('kubectl delete service {} --namespace {} --ignore-not-found'
+                         .format(' '.join(changes.removed_services), ns), ''))
+        if removed_pods:
+            cmds.append(('kubectl delete pod {} --namespace {} --ignore-not-found'
+                         .format(' '.join(removed_pods), ns), ''))
+        if replaced:
+            cmds.append(('kubectl replace --force -f - --namespace {}'.format(ns),
+                         _plan(replaced)))
+        if created:
+            cmds.append(('kubectl create -f - --namespace {}'.format(ns),
+                         _plan(created)))
+        return cmds
 
     # ========================================================
     # ===================== Action API =======================
     # ========================================================
 
     def delete(self, experiment_name):
+        # raises, so that delete_batch reports the failures
+        cmd = self._delete_cmd(experiment_name)
+        runner.run_verbose(cmd, print_out=True, raise_on_error=True,
+                           throttle=self._throttle_for(cmd))
+
+    def _delete_cmd(self, experiment_name):
         assert experiment_name not in _RESERVED_NS, \
             'cannot delete reserved names: default, kube-public, kube-system'
         check_valid_dns(experiment_name)
-        runner.run_verbose(
-            'kubectl delete namespace {}'.format(experiment_name),
-            print_out=True, raise_on_error=False)
-
-    # def delete_batch(self, experiments):
+        return 'kubectl delete namespace {}'.format(experiment_name)
 
     def transfer_file(self, experiment_name, src_path, dest_path,
                       src_process=None, src_process_group=None,
@@ -117,6 +290,9 @@ class KubeCluster(Cluster):
             list of experiment names
         """
         all_names = self.query_resources('namespace', output_format='name')
+        return self._parse_namespaces(all_names)
+
+    def _parse_namespaces(self, all_names):
         # names look like namespace/<actual_name>, need to postprocess
         all_namespaces = [n.split('/')[-1] for n in all_names]
         filtered_namespaces = [x for x in all_namespaces if x not in _RESERVED_NS]
@@ -138,8 +314,16 @@ class KubeCluster(Cluster):
             }
         }
         """
-        all_processes = BeneDict(self.query_resources('pod', output_format='json',
-                                                      namespace=experiment_name))
+        all_processes = self.query_resources('pod', output_format='json',
+                                             namespace=experiment_name)
+        return self._parse_pods(all_processes)
+
+    def _parse_pods(self, all_processes):
+        """
+        Turns the output of `kubectl get pod -o json` into the format
+        of describe_experiment
+        """
+        all_processes = BeneDict(all_processes)
         out = OrderedDict()
         for pod in all_processes.items:
             pod_name = pod.metadata.name
@@ -243,6 +427,9 @@ class KubeCluster(Cluster):
         res = self.query_resources('pod', names=[process_group_name],
                                    output_format='json',
                                    namespace=experiment_name)
+        return self._parse_pod(res, experiment_name, process_group_name)
+
+    def _parse_pod(self, res, experiment_name, process_group_name):
         if not res:
             raise ValueError('Cannot find process_group {} in experiment {}' \
                 .format(process_group_name, experiment_name))
@@ -281,7 +468,8 @@ class KubeCluster(Cluster):
             out, err, retcode = runner.run_verbose(
                 cmd,
                 print_out=print_logs,
-                raise_on_error=False
+                raise_on_error=False,
+                throttle=self.throttle
             )
             if retcode != 0:
                 return ''
@@ -296,19 +484,14 @@ class KubeCluster(Cluster):
         Wait until the pod is alive and then the same as get_log()
 
         Args:
-            sleep_interval: interval between queries
-        """
-        while True:
-            stats_dict = self.describe_experiment(experiment_name)
-            try:
-                stat = stats_dict[process_group][process_name]
-            except KeyError as e:
-                print("Waiting for pod and container creation.")
-                time.sleep(sleep_interval)
+            sleep_interval: unused, pod status is watched instead of polled
+        """
+        print("Waiting for pod and container creation.")
+        for event in self.watch_experiment(experiment_name):
+            if (event.process_group_name, event.process_name) != \
+                    (process_group, process_name):
                 continue
-                # raise KeyError('process_group or process_name not found: {}'.format(e))
-
-            if stat['Ready'] == '1' and stat['State'].startswith('running'):
+            if event.type == ProcessEvent.READY:
                 # pod is alive
                 return self.get_log(
                     experiment_name=experiment_name,
@@ -316,15 +499,74 @@ class KubeCluster(Cluster):
                     process_group=process_group,
                     follow=follow, since=since, tail=tail, print_logs=print_logs
                 )
-            if int(stat['Restarts']) > 0:
+            if event.type == ProcessEvent.RESTARTED:
                 print('Container has a restart. There is probably something wrong. Exiting.')
                 return
-            time.sleep(sleep_interval)
+
+    def _watch_cmd(self, experiment_name):
+        return ['kubectl', 'get', 'pod', '--namespace', experiment_name,
+                '--watch', '--output-watch-events', '--output', 'json']
+
+    def watch_experiment(self, experiment_name, timeout=None):
+        """
+        Streams `kubectl get pod --watch` instead of polling.
+        See Cluster.watch_experiment
+        """
+        tracker = EventTracker()
+        for doc in runner.stream_json(self._watch_cmd(experiment_name),
+                                      timeout=timeout):
+            for event in self._parse_watch_event(tracker, doc):
+                yield event
+
+    def _parse_watch_event(self, tracker, doc):
+        """
+        Turns one document printed by `kubectl get pod --watch
+        --output-watch-events -o json` into ProcessEvents
+        """
+        pod = doc.get('object', doc)
+        pod_name = pod['metadata']['name']
+        containers = [c['name'] for c in pod.get('spec', {}).get('containers', [])]
+        # a standalone process is a pod with a single container of the same name
+        if len(containers) == 1 and containers[0] == pod_name:
+            keys = [(None, pod_name)]
+        else:
+            keys = [(pod_name, container) for container in containers]
+
+        events = []
+        if doc.get('type') == 'DELETED':
+            for process_group_name, process_name in keys:
+                events.extend(tracker.remove(process_group_name, process_name))
+            return events
+
+        statuses = pod.get('status', {}).get('containerStatuses') or []
+        statuses = {status['name']: status for status in statuses}
+        for process_group_name, process_name in keys:
+            status = statuses.get(process_name)
+            if status is None:  # pod is created, container is not yet
+                events.extend(tracker.update(process_group_name, process_name))
+                continue
+            state, state_info = next(iter(status['state'].items()))
+            exit_code = None
+            if state == 'terminated':
+                state, exit_code = 'exited', state_info.get('exitCode')
+            events.extend(tracker.update(
+                process_group_name, process_name,
+                state=state,
+                ready=status.get('ready', False),
+                restarts=status.get('restartCount', 0),
+                exit_code=exit_code,
+                info=status
+            ))
+        return events
 
     def external_url(self, experiment_name, service_name):
-        res = BeneDict(self.query_resources(
-                        'svc', 'yaml',
-                        names=[service_name], namespace=experiment_name))
+        res = self.query_resources('svc', 'yaml',
+                                   names=[service_name],
+                                   namespace=experiment_name)
+        return self._parse_external_url(res, experiment_name, service_name)
+
+    def _parse_external_url(self, res, experiment_name, service_name):
+        res = BeneDict(res)
         conf = res.status.loadBalancer
         if not ('ingress' in conf and 'ip' in conf.ingress[0]):
             raise ValueError('Service {} not found in experiment {}'
@@ -337,8 +579,8 @@ class KubeCluster(Cluster):
 
     def current_context(self):
         out, err, retcode = runner.run_verbose(
-            'kubectl config current-context', print_out=False, 
-            raise_on_error=True)
+            'kubectl config current-context', print_out=False,
+            raise_on_error=True, throttle=self.throttle)
         return out
 
     def current_experiment(self):
@@ -347,6 +589,9 @@ class KubeCluster(Cluster):
         """
         config = self.config_view()
         current_context = self.current_context()
+        return self._context_namespace(config, current_context)
+
+    def _context_namespace(self, config, current_context):
         for context in config['contexts']:
             if context['name'] == current_context:
                 return context['context']['namespace']
@@ -357,13 +602,16 @@ class KubeCluster(Cluster):
         https://kubernetes.io/docs/concepts/overview/working-with-objects/namespaces/
         After this call, all subsequent `kubectl` will default to the namespace
         """
-        check_valid_dns(namespace)
         _, _, retcode = runner.run_verbose(
-            'kubectl config set-context $(kubectl config current-context) --namespace={}'.format(namespace),
-            print_out=True, raise_on_error=False)
+            self._set_experiment_cmd(namespace),
+            print_out=True, raise_on_error=False, throttle=self.throttle)
         if retcode == 0:
             print('successfully switched to namespace `{}`'.format(namespace))
 
+    def _set_experiment_cmd(self, namespace):
+        check_valid_dns(namespace)
+        return 'kubectl config set-context $(kubectl config current-context) --namespace={}'.format(namespace)
+
     def _get_selectors(self, labels, fields):
         """
         Helper for list_resources and list_jsonpath
@@ -416,6 +664,22 @@ class KubeCluster(Cluster):
             list if output format is name
             string from stdout otherwise
         """
+        cmd, output_format = self._query_resources_cmd(
+            resource, output_format, names, labels, fields, namespace)
+        out, _, _ = runner.run_verbose(cmd, print_out=False, raise_on_error=True,
+                                       throttle=self.throttle)
+        return self._parse_query_output(out, output_format)
+
+    def _query_resources_cmd(self, resource,
+                             output_format,
+                             names=None,
+                             labels='',
+                             fields='',
+                             namespace=None):
+        """
+        Returns:
+            (kubectl command, quoted output format) for query_resources
+        """
         if names and (labels or fields):
             raise ValueError('names and (labels or fields) are mutually exclusive')
         cmd = 'kubectl get ' + resource
@@ -430,7 +694,9 @@ class KubeCluster(Cluster):
             prefix, arg = output_format.split('=', 1)
             output_format = prefix + '=' + shlex.quote(arg)
         cmd += ' -o ' + output_format
-        out, _, _ = runner.run_verbose(cmd, print_out=False, raise_on_error=True)
+        return cmd, output_format
+
+    def _parse_query_output(self, out, output_format):
         if output_format == 'yaml':
             return load_yaml_str(out)
         elif output_format == 'json':
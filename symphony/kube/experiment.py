@@ -1,6 +1,8 @@
-import copy
 from symphony.spec import ExperimentSpec
+from symphony.spec.process import IPC
+from symphony.spec.shards import expand_shards
 from symphony.engine.address_book import AddressBook
+from symphony.nameservice import NAME_SERVICE, server_command
 from symphony.utils.common import compact_range_dumps, compact_range_loads
 from symphony.utils.common import sanitize_name_kubernetes
 from .process import KubeProcessSpec
@@ -15,6 +17,8 @@ from .builder import (
 class KubeExperimentSpec(ExperimentSpec):
     _ProcessClass = KubeProcessSpec
     _ProcessGroupClass = KubeProcessGroupSpec
+    # other pods reach the name service through its service
+    _name_service_listen = '0.0.0.0'
 
     def __init__(self,
                  name,
@@ -38,31 +42,65 @@ class KubeExperimentSpec(ExperimentSpec):
         self.binded_services = {}
         self.exposed_services = {}
         self.secrets = secrets
+        self._components = {}  # {component name: yml} of the last compile
 
-    def _compile(self):
-        self.address_book = AddressBook()
+    def _name_service_process(self, container_image, **kwargs):
+        """
+        Args:
+            container_image: an image with python and symphony installed
+        """
+        return KubeProcessSpec(NAME_SERVICE, container_image=container_image,
+                               command=server_command(), **kwargs)
 
-        self.declare_services()
-        self.assign_addresses()
+    def _compile(self, full=False):
+        """
+        Returns:
+            {component name: yml}. After the first compile, only the
+            components changed since the last one are serialized again,
+            unless services changed or full=True
+        """
+        self._expand_replicas()
+        if full or self._services_dirty:
+            self.address_book = AddressBook()
+            self.declare_services()
+            self.assign_addresses()
+            full = True
+        else:
+            processes = list(self._dirty_processes)
+            self.validate_connect(processes)
+            self.set_address_envs(processes)
         secrets = self.add_secret()
 
+        cache = self._components
         components = {}
         if secrets is not None:
             components['secrets'] = secrets.yml()
         for k, v in self.exposed_services.items():
-            components['exposed-service-' + k] = v.yml()
+            name = 'exposed-service-' + k
+            components[name] = v.yml() if full else cache[name]
         for k, v in self.binded_services.items():
-            components['binded-service-' + k] = v.yml()
+            name = 'binded-service-' + k
+            components[name] = v.yml() if full else cache[name]
 
-        for process_group in self.list_process_groups():
-            components['process-group-' + process_group.name] = process_group.yml()
-        for process in self.list_processes():
-            components['process-' + process.name] = process.yml()
+        for process_group in self.process_groups.values():
+            name = 'process-group-' + process_group.name
+            if full or process_group in self._dirty_process_groups:
+                components[name] = process_group.yml()
+            else:
+                components[name] = cache[name]
+        for process in self.lone_processes.values():
+            name = 'process-' + process.name
+            if full or process in self._dirty_processes:
+                components[name] = process.yml()
+            else:
+                components[name] = cache[name]
 
+        self._components = components
+        self._clear_dirty()
         return components
 
-    def compile(self):
-        components = self._compile()
+    def compile(self, full=False):
+        components = self._compile(full)
         return ''.join(['---\n' + x for x in components.values()])
 
     def assign_addresses(self):
@@ -76,9 +114,8 @@ class KubeExperimentSpec(ExperimentSpec):
             self.address_book.add_entry(binded_service.name,
                                         binded_service.name,
                                         binded_service.port)
-        env_dict = self.address_book.dump()
-        for process in self.list_all_processes():
-            process.set_envs(env_dict)
+        self._add_shard_entries()
+        self.set_address_envs(self.list_all_processes(), report=True)
 
     def declare_services(self):
         """
@@ -86,7 +123,8 @@ class KubeExperimentSpec(ExperimentSpec):
         """
         exposed = {}
         binded = {}
-        port_range = copy.deepcopy(self.port_range)
+        # ports of the previous compile, their probes are regenerated
+        old_ports = {service.port for service in self.binded_services.values()}
         for process in self.list_all_processes():
             if process.standalone:
                 pod_yml = process.pod_yml
@@ -95,34 +133,56 @@ class KubeExperimentSpec(ExperimentSpec):
 
             for exposed_service_name in process.exposed_services:
                 pod_yml.add_label('service-' + exposed_service_name, 'expose')
-                port = process.exposed_services[exposed_service_name]
-                exposed[exposed_service_name] = port
-                if port in self.port_range:
-                    port_range.remove(port)
+            exposed.update(process.exposed_services)
 
-            for binded_service_name in process.binded_services:
+            process_binded = expand_shards(process.binded_services)
+            for binded_service_name in process_binded:
                 pod_yml.add_label('service-' + binded_service_name, 'bind')
-                port = process.binded_services[binded_service_name]
-                binded[binded_service_name] = port
-                if port in self.port_range:
-                    port_range.remove(port)
-
-        for exposed_service_name, port in exposed.items():
-            if port is None:
-                port = self.get_port(port_range)
-            service = KubeCloudExternelService(exposed_service_name, port)
+            binded.update(process_binded)
+
+        if IPC in binded.values():
+            raise ValueError('[Error] Experiment {} binds a unix domain socket, '
+                             'only tmux and subproc support "ipc" services'
+                             .format(self.name))
+        self._declare_shards()
+        services = dict(exposed)
+        services.update(binded)
+        ports = self._allocate_ports(services)
+        for exposed_service_name in exposed:
+            service = KubeCloudExternelService(exposed_service_name,
+                                               ports[exposed_service_name])
             self.exposed_services[service.name] = service
-        for binded_service_name, port in binded.items():
-            if port is None:
-                port = self.get_port(port_range)
-            service = KubeIntraClusterService(binded_service_name, port)
+        for binded_service_name in binded:
+            service = KubeIntraClusterService(binded_service_name,
+                                              ports[binded_service_name])
             self.binded_services[service.name] = service
+        self.add_readiness_probes(old_ports)
         self.validate_connect()
 
+    def add_readiness_probes(self, old_ports=()):
+        """
+        A process that binds services is ready when the port of the first
+        one accepts connections, unless it has a probe of its own
+        """
+        for process in self.list_all_processes():
+            if not process.binded_services:
+                continue
+            probe = process.container_yml.get('readinessProbe')
+            if probe is not None and \
+                    probe.get('tcpSocket', {}).get('port') not in old_ports:
+                continue
+            service_name = next(iter(expand_shards(process.binded_services)))
+            process.container_yml.readiness_probe(
+                self.binded_services[service_name].port)
+
     def add_secret(self):
         default_secret_name = 'symph-default-secret'
         if len(self.secrets) > 0:
             for process in self.list_all_processes():
+                # mounted by a previous compile
+                if any(volume.name == default_secret_name
+                       for volume in process.container_yml.mounted_volumes):
+                    continue
                 process.mount_secret(secret_name=default_secret_name,
                                      mount_path='/etc/secrets')
             return KubeSecret.from_files(
@@ -131,22 +191,22 @@ class KubeExperimentSpec(ExperimentSpec):
         else:
             return None
 
-    def validate_connect(self):
+    def validate_connect(self, processes=None):
         """
         Check if all connected services are correctly provided
+
+        Args:
+            processes: processes to check, all by default
         """
-        for process in self.list_all_processes():
+        if processes is None:
+            processes = self.list_all_processes()
+        for process in processes:
             for connected_service_name in process.connected_services:
-                if connected_service_name not in self.binded_services:
+                if connected_service_name not in self.binded_services \
+                        and connected_service_name not in self.sharded_services:
                     raise ValueError('Service {} is connected by process {} but not binded' \
                                      .format(connected_service_name, process.name))
 
-    def get_port(self, port_range):
-        if len(port_range) == 0:
-            raise ValueError('[Error] Experiment {} ran out of ports on Kubernetes.' \
-                             .format(self.name))
-        return port_range.pop(0)
-
     def _load_dict(self, di):
         super()._load_dict(di)
         self.port_range = compact_range_loads(di['port_range'])
@@ -1,9 +1,13 @@
+from collections import OrderedDict
 from symphony.spec import ProcessSpec
+from symphony.spec.base import marks_dirty
 from symphony.utils.common import sanitize_name_kubernetes, print_err
 from .builder import KubeContainerYML, KubePodYML
 
 
 class KubeProcessSpec(ProcessSpec):
+    __slots__ = ('container_image', 'standalone', 'container_yml', 'pod_yml')
+
     def __init__(self, name, *, container_image=None, standalone=True,
                  command=None, args=None, env=None, **kwargs):
         name = sanitize_name_kubernetes(name)
@@ -11,8 +15,10 @@ class KubeProcessSpec(ProcessSpec):
         self.container_image = container_image
         self.standalone = standalone
         self.container_yml = KubeContainerYML(self.name, self.container_image)
+        self.container_yml.owner = self
         if self.standalone:
             self.pod_yml = KubePodYML(self.name)
+            self.pod_yml.owner = self
             self.pod_yml.add_container(self.container_yml)
         if command is not None:
             self.set_command(command)
@@ -28,15 +34,50 @@ class KubeProcessSpec(ProcessSpec):
         super()._set_process_group(process_group)
         process_group.pod_yml.add_container(self.container_yml)
 
+    def _replicate(self, name, shared=()):
+        # replicas share the container and pod of the template and only
+        # store what they change, see KubeTemplateYML
+        name = sanitize_name_kubernetes(name)
+        shared = list(shared) + [self.container_yml]
+        if self.standalone:
+            shared.append(self.pod_yml)
+        process = super()._replicate(name, shared=shared)
+        process.container_yml = self.container_yml.derive(name)
+        process.container_yml.owner = process
+        if process.standalone:
+            process.pod_yml = self.pod_yml.derive(name)
+            process.pod_yml.owner = process
+            process.pod_yml.add_container(process.container_yml)
+        return process
+
+    def _append_args(self, args):
+        self.set_args(list(self.container_yml.get('args', [])) + args)
+
+    def _diff_parts(self):
+        di = self.dump_dict()
+        container_yml = dict(di['container_yml'])
+        data = dict(container_yml['data'])
+        env = OrderedDict((entry['name'], entry['value'])
+                          for entry in data.pop('env', []))
+        probe = data.get('readinessProbe')
+        if probe is not None and 'tcpSocket' in probe and self.binded_services:
+            # follows the address book like env, see diff_specs
+            data['readinessProbe'] = dict(probe, tcpSocket=None)
+        container_yml['data'] = data
+        di['container_yml'] = container_yml
+        return di, env
+
     def _load_dict(self, di):
         super()._load_dict(di)
         self.container_image = di['container_image']
         self.standalone = di['standalone']
 
         self.container_yml = KubeContainerYML.load(di['container_yml'])
+        self.container_yml.owner = self
 
         if self.standalone:
             self.pod_yml = KubePodYML.load(di['pod_yml'])
+            self.pod_yml.owner = self
             self.pod_yml.add_container(self.container_yml)
 
     def dump_dict(self):
@@ -54,12 +95,14 @@ class KubeProcessSpec(ProcessSpec):
 
     ### Container level
 
+    @marks_dirty
     def set_command(self, command):
         if not isinstance(command, list):
             print_err('[Warning] command {} for KubernetesProcess {} must be a list'.format(command, self.name))
             command = [command]
         self.container_yml.set_command(command)
 
+    @marks_dirty
     def set_args(self, args):
         if not isinstance(args, list):
             print_err('[Warning] args {} for KubernetesProcess {} should be a list'.format(args, self.name))
@@ -67,62 +110,93 @@ class KubeProcessSpec(ProcessSpec):
         args = list(map(str, args))
         self.container_yml.set_args(args)
 
+    @marks_dirty
     def set_env(self, name, value):
         self.container_yml.set_env(name, value)
 
+    @marks_dirty
     def set_envs(self, di):
         self.container_yml.set_envs(di)
 
+    def _drop_envs(self, drop):
+        names = [entry['name'] for entry in self.container_yml.get('env', ())
+                 if drop(entry['name'])]
+        if names:
+            self._mark_dirty()
+            self.container_yml.unset_envs(names)
+
+    @marks_dirty
     def mount_volume(self, volume, mount_path):
         self.container_yml.mount_volume(volume, mount_path)
 
+    @marks_dirty
     def mount_nfs(self, server, path, mount_path, name=None):
         self.container_yml.mount_nfs(server, path, mount_path, name)
 
+    @marks_dirty
     def mount_secret(self, secret_name, mount_path, defaultMode=None, name=None):
         self.container_yml.mount_secret(secret_name, mount_path, defaultMode=defaultMode, name=name)
 
+    @marks_dirty
     def mount_git_repo(self, repository, revision, mount_path, name=None):
         self.container_yml.mount_git_repo(repository, revision, mount_path, name)
 
+    @marks_dirty
     def mount_host_path(self, path, mount_path, hostpath_type='', name=None):
         self.container_yml.mount_host_path(path, mount_path, hostpath_type, name)
 
+    @marks_dirty
     def mount_empty_dir(self, name, use_memory, mount_path):
         self.container_yml.mount_empty_dir(mount_path, use_memory, name)
 
+    @marks_dirty
     def mount_shared_memory(self, name='devshm'):
         """
         https://stackoverflow.com/questions/46085748/define-size-for-dev-shm-on-container-engine/46434614#46434614
         """
         self.container_yml.mount_shared_memory(name=name)
 
+    @marks_dirty
     def resource_request(self, cpu=None, memory=None):
         self.container_yml.resource_request(cpu, memory)
 
+    @marks_dirty
     def resource_limit(self, cpu=None, memory=None, gpu=None):
         self.container_yml.resource_limit(cpu, memory, gpu)
 
+    @marks_dirty
     def image_pull_policy(self, policy):
         self.container_yml.image_pull_policy(policy)
 
+    @marks_dirty
+    def readiness_probe(self, port, initial_delay_seconds=0, period_seconds=2):
+        """
+        Replaces the probe generated from the first binded service
+        """
+        self.container_yml.readiness_probe(port, initial_delay_seconds, period_seconds)
+
     ### Pod level
+    @marks_dirty
     def restart_policy(self, policy):
         assert self.standalone, 'Restart policy for process {} should be configured at process group level'.format(self.name)
         self.pod_yml.restart_policy(policy)
 
+    @marks_dirty
     def add_labels(self, **kwargs):
         assert self.standalone, 'Labels for process {} should be configured at process group level'.format(self.name)
         self.pod_yml.add_labels(**kwargs)
 
+    @marks_dirty
     def add_label(self, key, val):
         assert self.standalone, 'Labels for process {} should be configured at process group level'.format(self.name)
         self.pod_yml.add_label(key, val)
 
+    @marks_dirty
     def add_toleration(self, **kwargs):
         assert self.standalone, 'Tolerations for process {} should be configured at process group level'.format(self.name)
         self.pod_yml.add_toleration(**kwargs)
 
+    @marks_dirty
     def node_selector(self, key, value):
         assert self.standalone, 'Node selector for process {} should be configured at process group level'.format(self.name)
         self.pod_yml.node_selector(key, value)
@@ -1,4 +1,5 @@
 from symphony.spec import ProcessGroupSpec
+from symphony.spec.base import marks_dirty
 from symphony.utils.common import sanitize_name_kubernetes, strip_repository_name
 from .process import KubeProcessSpec
 from .builder import (
@@ -18,6 +19,7 @@ class KubeProcessGroupSpec(ProcessGroupSpec):
         name = sanitize_name_kubernetes(name)
         super().__init__(name)
         self.pod_yml = KubePodYML(self.name)
+        self.pod_yml.owner = self
 
     def new_process(self, *args, **kwargs):
         if self._ProcessClass is None:
@@ -29,6 +31,7 @@ class KubeProcessGroupSpec(ProcessGroupSpec):
 
     def _load_dict(self, di):
         self.pod_yml = KubePodYML.load(di['pod_yml'])
+        self.pod_yml.owner = self
         super()._load_dict(di)
 
     def dump_dict(self):
@@ -37,26 +40,33 @@ class KubeProcessGroupSpec(ProcessGroupSpec):
         return di
 
     def yml(self):
+        self._expand_replicas()
         return self.pod_yml.yml()
 
     ### Pod level 
 
+    @marks_dirty
     def add_labels(self, **kwargs):
         self.pod_yml.add_labels(**kwargs)
 
+    @marks_dirty
     def add_label(self, key, val):
         self.pod_yml.add_label(key, val)
 
+    @marks_dirty
     def restart_policy(self, policy):
         self.pod_yml.restart_policy(policy)
 
+    @marks_dirty
     def add_toleration(self, **kwargs):
         self.pod_yml.add_toleration(**kwargs)
 
+    @marks_dirty
     def node_selector(self, key, value):
         self.pod_yml.node_selector(key, value)
 
     ### Batch methods
+    @marks_dirty
     def mount_volume(self, volume, path):
         self.pod_yml.mount_volume(volume, path)
 
@@ -0,0 +1,45 @@
+"""
+Name service of an experiment, see ExperimentSpec.use_name_service(). A
+process "nameservice" holds the address book, processes look addresses up
+and register new ones at runtime, and are notified when they change:
+
+    from symphony.nameservice import NameServiceClient
+    client = NameServiceClient()  # reads SYMPH_NAMESERVICE_ADDR
+    client.watch()  # keeps the cached addresses up to date
+    host, port = client.address('replay')
+
+The protocol is one JSON object per line over TCP.
+"""
+import importlib
+
+# process and service name, processes reach it through SYMPH_NAMESERVICE_ADDR
+NAME_SERVICE = 'nameservice'
+ADDR_ENV = 'SYMPH_NAMESERVICE_ADDR'
+PORT_ENV = 'SYMPH_NAMESERVICE_PORT'
+# JSON address book the name service starts with, set at compile
+BOOK_ENV = 'SYMPH_NAMESERVICE_BOOK'
+# interface the name service listens on, set at compile
+LISTEN_ENV = 'SYMPH_NAMESERVICE_LISTEN'
+
+# {attribute: module that defines it}
+_LAZY_ATTRS = {
+    'NameServer': '.server',
+    'NameServiceClient': '.client',
+    'NameServiceError': '.client',
+}
+
+
+def server_command(python='python'):
+    """
+    Returns:
+        command line (list) of the name service process
+    """
+    return [python, '-m', 'symphony.nameservice']
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,42 @@
+"""
+python -m symphony.nameservice: runs the name service of an experiment on
+the port of SYMPH_NAMESERVICE_PORT and the interface of
+SYMPH_NAMESERVICE_LISTEN (loopback by default), starting with the address
+book of SYMPH_NAMESERVICE_BOOK.
+
+python -m symphony.nameservice publish: sends the JSON
+{"entries": {...}, "removed": [...]} read from stdin to the name service of
+this host, used by Cluster.update() where the name service is not reachable
+from outside (Kubernetes).
+"""
+import argparse
+import json
+import os
+import sys
+from . import BOOK_ENV, LISTEN_ENV, PORT_ENV
+from .client import NameServiceClient
+from .server import NameServer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m symphony.nameservice')
+    parser.add_argument('action', nargs='?', choices=['serve', 'publish'],
+                        default='serve')
+    parser.add_argument('--port', type=int, default=None,
+                        help='default: ${}'.format(PORT_ENV))
+    args = parser.parse_args(argv)
+    port = args.port if args.port is not None else int(os.environ[PORT_ENV])
+    if args.action == 'publish':
+        data = json.load(sys.stdin)
+        client = NameServiceClient(('127.0.0.1', port))
+        client.publish(data['entries'], data.get('removed', ()))
+        client.close()
+        return
+    server = NameServer(json.loads(os.environ.get(BOOK_ENV, '{}')),
+                        host=os.environ.get(LISTEN_ENV, '127.0.0.1'), port=port)
+    print('name service listening on port', port, flush=True)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Client of the name service, see symphony.nameservice
+"""
+import json
+import os
+import socket
+import threading
+import time
+from symphony.utils.threads import start_thread
+from . import ADDR_ENV
+
+
+class NameServiceError(RuntimeError):
+    """
+    Raised when the name service rejects a request
+    """
+    pass
+
+
+def _parse_address(address):
+    if isinstance(address, str):
+        host, port = address.rsplit(':', 1)
+        return host, int(port)
+    return tuple(address)
+
+
+class NameServiceClient(object):
+    """
+    Looks up and registers addresses. Lookups are cached: without watch()
+    an address is asked once (lookup(name, refresh=True) asks again), with
+    watch() the cache follows every change of the name service. If the
+    watch connection drops, e.g. the name service restarts, the cache is
+    cleared until the watch is issued again.
+    """
+    # seconds between attempts to watch again, doubled up to the maximum
+    reconnect_delay = 0.1
+    max_reconnect_delay = 5.
+    def __init__(self, address=None, timeout=10):
+        """
+        Args:
+            address: 'host:port' or (host, port) of the name service,
+                SYMPH_NAMESERVICE_ADDR by default
+            timeout: seconds to wait for a reply
+        """
+        if address is None:
+            if ADDR_ENV not in os.environ:
+                raise ValueError('[Error] {} is not set, the experiment has no name '
+                                 'service'.format(ADDR_ENV))
+            address = os.environ[ADDR_ENV]
+        self.server_address = _parse_address(address)
+        self.timeout = timeout
+        self._cache = {}  # {name: entry or None}
+        self._lock = threading.Lock()
+        self._connection = None  # (socket, file) of requests
+        self._watch_connection = None
+        self._callbacks = []
+
+    def _connect(self):
+        sock = socket.create_connection(self.server_address, timeout=self.timeout)
+        return sock, sock.makefile('rwb')
+
+    def _request(self, **request):
+        """
+        Sends a request on the shared connection, reconnects once if it
+        was closed
+
+        Returns:
+            the reply
+        """
+        line = json.dumps(request).encode('utf-8') + b'\n'
+        with self._lock:
+            for attempt in range(2):
+                if self._connection is None:
+                    self._connection = self._connect()
+                sock, f = self._connection
+                try:
+                    f.write(line)
+                    f.flush()
+                    reply = f.readline()
+                    if reply:
+                        break
+                except OSError:
+                    if attempt:
+                        raise
+                f.close()
+                sock.close()
+                self._connection = None
+            else:
+                raise ConnectionError('Name service {}:{} closed the connection'
+                                      .format(*self.server_address))
+        reply = json.loads(reply.decode('utf-8'))
+        if not reply['ok']:
+            raise NameServiceError(reply['error'])
+        return reply
+
+    def lookup(self, name, refresh=False):
+        """
+        Returns:
+            address book entry of name ({'host', 'port'}, {'ipc'} or
+            {'shards'}), None if the name service does not know it
+        """
+        if refresh or name not in self._cache:
+            self._cache[name] = self._request(op='lookup', name=name)['entry']
+        return self._cache[name]
+
+    def address(self, name, refresh=False):
+        """
+        Returns:
+            (host, port), or the socket path of an "ipc" service
+
+        Raises:
+            KeyError if the name service does not know name
+        """
+        entry = self.lookup(name, refresh=refresh)
+        if entry is None:
+            raise KeyError('Name service has no service {}'.format(name))
+        if 'ipc' in entry:
+            return entry['ipc']
+        return entry['host'], entry['port']
+
+    def list(self):
+        """
+        Returns:
+            {name: entry} of all the services, they are cached
+        """
+        entries = self._request(op='list')['entries']
+        self._cache.update(entries)
+        return entries
+
+    def register(self, name, host=None, port=None, ipc=None):
+        """
+        Adds or moves a service, the watchers are notified
+        """
+        entry = {'ipc': ipc} if ipc is not None else {'host': host, 'port': port}
+        self._request(op='register', name=name, entry=entry)
+        self._cache[name] = entry
+
+    def unregister(self, name):
+        self._request(op='unregister', name=name)
+        self._cache[name] = None
+
+    def publish(self, entries, removed=()):
+        """
+        Sends a whole address book, e.g. after Cluster.update()
+        """
+        self._request(op='publish', entries=entries, removed=list(removed))
+
+    def watch(self, callback=None):
+        """
+        Keeps the cache up to date in a background thread
+
+        Args:
+            callback: called as callback(name, entry) for every change,
+                entry is None when the service is removed
+        """
+        if callback is not None:
+            self._callbacks.append(callback)
+        if self._watch_connection is not None:
+            return
+        self._watch_connection, entries = self._open_watch()
+        self._cache.update(entries)
+        start_thread(self._follow, args=(self._watch_connection,))
+
+    def _open_watch(self):
+        """
+        Returns:
+            (socket, file) receiving the events, and the entries of the
+            name service when the watch started
+        """
+        sock, f = self._connect()
+        try:
+            f.write(json.dumps({'op': 'watch'}).encode('utf-8') + b'\n')
+            f.flush()
+            reply = f.readline()
+            if not reply:
+                raise ConnectionError('Name service {}:{} closed the connection'
+                                      .format(*self.server_address))
+            entries = json.loads(reply.decode('utf-8'))['entries']
+        except (OSError, ValueError):
+            f.close()
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return (sock, f), entries
+
+    def _changed(self, name, entry):
+        self._cache[name] = entry
+        for callback in self._callbacks:
+            callback(name, entry)
+
+    def _follow(self, connection):
+        """
+        Applies the events of the watch connection. When it drops, lookups
+        go to the name service while the watch is issued again with
+        backoff, the changes missed meanwhile are reported to the callbacks
+        """
+        while True:
+            sock, f = connection
+            try:
+                for line in f:
+                    event = json.loads(line.decode('utf-8'))
+                    self._changed(event['name'], event['entry'])
+            except (OSError, ValueError):
+                pass
+            f.close()
+            sock.close()
+            if self._watch_connection is not connection:  # close()
+                return
+            known = dict(self._cache)
+            self._cache.clear()
+            delay = self.reconnect_delay
+            while True:
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                if self._watch_connection is not connection:
+                    return
+                try:
+                    connection, entries = self._open_watch()
+                    break
+                except (OSError, ValueError):
+                    pass
+            if self._watch_connection is None:  # closed meanwhile
+                connection[1].close()
+                connection[0].close()
+                return
+            self._watch_connection = connection
+            for name in set(known) | set(entries):
+                entry = entries.get(name)
+                if known.get(name) != entry:
+                    self._changed(name, entry)
+            self._cache.update(entries)
+
+    def close(self):
+        for connection in (self._connection, self._watch_connection):
+            if connection is not None:
+                sock, f = connection
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                f.close()
+                sock.close()
+        self._connection = self._watch_connection = None
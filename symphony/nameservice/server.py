@@ -0,0 +1,188 @@
+"""
+Name service server: holds the address book of an experiment
+
+Requests and replies are JSON objects, one per line:
+
+    {"op": "lookup", "name": n}              -> {"ok": true, "entry": e, "version": v}
+    {"op": "list"}                           -> {"ok": true, "entries": {...}, "version": v}
+    {"op": "register", "name": n, "entry": e} -> {"ok": true, "version": v}
+    {"op": "unregister", "name": n}          -> {"ok": true, "version": v}
+    {"op": "publish", "entries": {...}, "removed": [...]} -> {"ok": true, "version": v}
+    {"op": "watch"}                          -> {"ok": true, "entries": {...}, "version": v}
+
+Entries are the ones of AddressBook: {"host", "port"}, {"ipc"} or
+{"shards"}, null when a name is unknown. After "watch", the connection
+receives {"event": "changed", "name": n, "entry": e or null, "version": v}
+for every change.
+"""
+import collections
+import json
+import socketserver
+import threading
+from symphony.utils.threads import start_thread
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server.name_server
+        # replies and the events of a watching connection are written by
+        # different threads, each message is written whole under the lock
+        connection = (self.wfile, threading.Lock())
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+                if request.get('op') == 'watch':
+                    server._watch(connection)
+                    continue
+                reply = server.handle(request)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                reply = {'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+            if not server._send(connection, reply):
+                return
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class NameServer(object):
+    """
+    Address book served over TCP. Every change bumps the version and is
+    pushed to the watching connections.
+    """
+    def __init__(self, entries=None, host='127.0.0.1', port=0):
+        """
+        Args:
+            entries: address book entries to start with
+            host: interface to listen on, '' for all of them. Requests are
+                not authenticated, only listen where processes need it
+            port: 0 picks a free port, see address
+        """
+        self.entries = dict(entries or {})
+        self.version = 0
+        self._lock = threading.Lock()
+        # (watcher or None for all of them, message), queued under _lock
+        self._messages = collections.deque()
+        self._send_lock = threading.Lock()  # sends the messages in order
+        self._watchers = []  # connections (wfile, write lock)
+        self._server = _TCPServer((host, port), _Handler)
+        self._server.name_server = self
+
+    @property
+    def address(self):
+        """
+        Returns:
+            (host, port) the server listens on
+        """
+        return self._server.server_address[:2]
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Serves in a background thread
+        """
+        start_thread(self.serve_forever)
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, request):
+        """
+        Returns:
+            reply to a request
+        """
+        try:
+            with self._lock:
+                return self._handle(request)
+        finally:
+            self._notify()
+
+    def _handle(self, request):
+        """
+        Returns the reply to a request, under the lock
+        """
+        op = request['op']
+        if op == 'lookup':
+            return {'ok': True, 'entry': self.entries.get(request['name']),
+                    'version': self.version}
+        if op == 'list':
+            return {'ok': True, 'entries': dict(self.entries),
+                    'version': self.version}
+        if op == 'register':
+            self._set(request['name'], dict(request['entry']))
+        elif op == 'unregister':
+            self._set(request['name'], None)
+        elif op == 'publish':
+            for name, entry in request['entries'].items():
+                self._set(name, entry)
+            for name in request.get('removed', ()):
+                self._set(name, None)
+        else:
+            raise ValueError('unknown op {}'.format(op))
+        return {'ok': True, 'version': self.version}
+
+    def _set(self, name, entry):
+        """
+        Changes one entry and queues the event for the watchers, under the
+        lock
+        """
+        if self.entries.get(name) == entry:
+            return
+        if entry is None:
+            del self.entries[name]
+        else:
+            self.entries[name] = entry
+        self.version += 1
+        self._messages.append((None, {'event': 'changed', 'name': name,
+                                      'entry': entry, 'version': self.version}))
+
+    def _watch(self, connection):
+        """
+        Replies with the entries and adds a watcher. The reply is queued with
+        the events, so that the watcher gets every change after them
+        """
+        with self._lock:
+            self._messages.append((connection, {'ok': True, 'entries': dict(self.entries),
+                                           'version': self.version}))
+        self._notify()
+
+    def _notify(self):
+        """
+        Sends the queued messages, outside of the lock so that a slow
+        watcher does not block the requests of the other connections. If
+        another thread is sending, it sends them after its own
+        """
+        while self._messages and self._send_lock.acquire(blocking=False):
+            try:
+                while self._messages:
+                    connection, message = self._messages.popleft()
+                    if connection is not None:
+                        if self._send(connection, message):
+                            self._watchers.append(connection)
+                        continue
+                    self._watchers = [watcher for watcher in self._watchers
+                                      if self._send(watcher, message)]
+            finally:
+                self._send_lock.release()
+
+    def _send(self, connection, message):
+        """
+        Args:
+            connection: (wfile, lock held while writing to it)
+
+        Returns:
+            False if the connection is closed
+        """
+        wfile, lock = connection
+        try:
+            with lock:
+                wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+                wfile.flush()
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,38 @@
+"""
+Virtual time for SimCluster: sleeping advances the clock instantly
+"""
+import threading
+
+
+class VirtualClock(object):
+    def __init__(self, start=0.):
+        self._now = float(start)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        """
+        Same signature as time.time / time.monotonic, so the clock can be
+        passed wherever those are expected (e.g. QueryCache(clock=...))
+        """
+        return self.now()
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        """
+        Advances the clock instead of blocking. The clock is shared: calls
+        from several threads add up instead of overlapping.
+        """
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        assert seconds >= 0, 'virtual time cannot go backwards'
+        with self._lock:
+            self._now += seconds
+            return self._now
+
+    def advance_to(self, timestamp):
+        with self._lock:
+            self._now = max(self._now, float(timestamp))
+            return self._now
@@ -0,0 +1,382 @@
+import importlib
+import random
+from collections import OrderedDict, defaultdict
+from symphony.engine import Cluster
+from symphony.engine.cluster import _load_backend
+from symphony.engine.events import EventTracker
+from symphony.errors import ReadinessTimeoutError
+from symphony.spec.diff import get_process, process_keys
+from symphony.spec.dependencies import launch_waves
+from .clock import VirtualClock
+
+
+class SimulatedError(RuntimeError):
+    """
+    Raised by SimCluster operations picked by failure injection
+    """
+    pass
+
+
+class _SimProcess(object):
+    __slots__ = ('spec', 'running_at', 'ready_at', 'exit_at', 'exit_code',
+                 'restarts', 'log')
+
+    def __init__(self, spec, running_at, ready_at):
+        self.spec = spec
+        self.running_at = running_at
+        self.ready_at = ready_at
+        self.exit_at = None
+        self.exit_code = None
+        self.restarts = 0
+        self.log = []
+
+    def state(self, now):
+        """
+        Returns:
+            (state, ready) at virtual time now, state is one of 'waiting',
+            'running', 'exited'
+        """
+        if self.exit_at is not None and now >= self.exit_at:
+            return 'exited', False
+        if now >= self.running_at:
+            return 'running', now >= self.ready_at
+        return 'waiting', False
+
+    def next_change(self, now):
+        """
+        Returns:
+            virtual time of the next state change after now, None if none
+        """
+        changes = [t for t in (self.running_at, self.ready_at, self.exit_at)
+                   if t is not None and t > now]
+        return min(changes) if changes else None
+
+
+class SimCluster(Cluster):
+    """
+    Keeps experiments in memory and moves them through their lifecycle in
+    virtual time, to test orchestration logic at scale without a cluster.
+
+    Specs are the ones of a real backend (spec_backend) and are compiled as
+    usual at launch. Every operation advances the virtual clock by its
+    latency and may fail with SimulatedError.
+    """
+    def __init__(self,
+                 spec_backend='subproc',
+                 clock=None,
+                 latencies=None,
+                 failures=None,
+                 boot_time=1.,
+                 ready_time=0.,
+                 crash_probability=0.,
+                 crash_after=1.,
+                 seed=None):
+        """
+        Args:
+            spec_backend: backend whose ExperimentSpec new_experiment returns
+            clock: VirtualClock, a new one starting at 0 by default
+            latencies: {operation: seconds}, e.g. {'launch': 2.,
+                'describe_experiment': 0.05}, operations are method names
+            failures: {operation: probability} that the operation raises
+                SimulatedError
+            boot_time: seconds from launch until a process is running
+            ready_time: seconds from running until a process is ready
+            crash_probability: probability that a process exits with code 1
+            crash_after: seconds a crashing process stays ready before exiting
+            seed: seed of the random generator of failure injection
+        """
+        super().__init__()
+        self.spec_backend = spec_backend
+        self.clock = VirtualClock() if clock is None else clock
+        self.latencies = dict(latencies or {})
+        self.failures = dict(failures or {})
+        self.boot_time = boot_time
+        self.ready_time = ready_time
+        self.crash_probability = crash_probability
+        self.crash_after = crash_after
+        self.calls = defaultdict(int)  # {operation: number of calls}
+        self._random = random.Random(seed)
+        self._forced_failures = defaultdict(int)
+        self._experiments = OrderedDict()  # {name: {(group, process): _SimProcess}}
+        self._specs = {}  # {name: spec launched or updated last}
+        self._current = None
+        self._spec_class = None
+
+    # =================== Private helpers ====================
+    def _op(self, operation):
+        """
+        Accounts for one call: counts it, injects failures, waits its latency
+        """
+        self.calls[operation] += 1
+        self.clock.sleep(self.latencies.get(operation, 0.))
+        if self._forced_failures[operation] > 0:
+            self._forced_failures[operation] -= 1
+            raise SimulatedError('injected failure of {}'.format(operation))
+        if self._random.random() < self.failures.get(operation, 0.):
+            raise SimulatedError('random failure of {}'.format(operation))
+
+    def _get_experiment(self, experiment_name):
+        if experiment_name is None:
+            experiment_name = self._current
+        if experiment_name not in self._experiments:
+            raise ValueError('Experiment "{}" does not exist'.format(experiment_name))
+        return self._experiments[experiment_name]
+
+    def _get_process(self, experiment_name, process_name, process_group_name=None):
+        processes = self._get_experiment(experiment_name)
+        key = (process_group_name, process_name)
+        if key not in processes:
+            raise ValueError('Process "{}" does not exist'.format(
+                process_name if process_group_name is None
+                else process_group_name + '/' + process_name))
+        return processes[key]
+
+    def _status(self, process, now):
+        state, ready = process.state(now)
+        if state == 'exited':
+            state = 'terminated ({})'.format(process.exit_code)
+        elif state == 'waiting':
+            state = 'waiting: ContainerCreating'
+        return OrderedDict([
+            ('Ready', str(int(ready))),
+            ('Restarts', str(process.restarts)),
+            ('State', state),
+        ])
+
+    def inject_failure(self, operation, count=1):
+        """
+        The next `count` calls of `operation` raise SimulatedError
+        """
+        self._forced_failures[operation] += count
+
+    def kill_process(self, experiment_name, process_name,
+                     process_group_name=None, exit_code=137, restart=False):
+        """
+        Makes a process exit now, and boot again if restart
+        """
+        process = self._get_process(experiment_name, process_name,
+                                     process_group_name)
+        now = self.clock.now()
+        process.log.append('[{:.3f}] exited with code {}'.format(now, exit_code))
+        if restart:
+            process.restarts += 1
+            process.running_at = now + self.boot_time
+            process.ready_at = process.running_at + self.ready_time
+            process.exit_at, process.exit_code = None, None
+        else:
+            process.exit_at, process.exit_code = now, exit_code
+
+    # ===================== Launch API =======================
+    def new_experiment(self, *args, **kwargs):
+        if self._spec_class is None:
+            cluster_cls = _load_backend(self.spec_backend)
+            assert cluster_cls is not None, \
+                '"{}" is not a valid spec backend'.format(self.spec_backend)
+            # by convention KubeCluster's package has KubeExperimentSpec
+            # in its experiment module
+            package = cluster_cls.__module__.rsplit('.', 1)[0]
+            module = importlib.import_module(package + '.experiment')
+            self._spec_class = getattr(
+                module, cluster_cls.__name__[:-len('Cluster')] + 'ExperimentSpec')
+        return self._spec_class(*args, **kwargs)
+
+    def launch(self, experiment_spec, force=False, dry_run=False,
+               wait_ready=False, ready_timeout=60):
+        """
+        Compiles the spec like its backend would, then creates its
+        processes. With wait_ready, a wave of processes is created when the
+        previous one is ready and the clock advances until all are ready.
+        """
+        self._op('launch')
+        if hasattr(experiment_spec, 'compile'):
+            launch_plan = experiment_spec.compile()
+        else:  # docker
+            launch_plan = experiment_spec.yml()
+        if dry_run:
+            print(launch_plan)
+            return
+        if experiment_spec.name in self._experiments and not force:
+            raise ValueError('[Error] Experiment {} already exists'
+                             .format(experiment_spec.name))
+        if wait_ready:
+            waves = launch_waves(experiment_spec)
+        else:
+            waves = [process_keys(experiment_spec)]
+        start = self.clock.now()
+        created = {}
+        for wave in waves:
+            for key in wave:
+                created[key] = self._new_process(
+                    get_process(experiment_spec, key), start)
+            if wait_ready and wave:
+                ready_at = max(created[key].ready_at for key in wave)
+                if ready_at - start > ready_timeout:
+                    raise ReadinessTimeoutError(
+                        'Experiment {} is not ready after {} seconds'
+                        .format(experiment_spec.name, ready_timeout))
+                start = ready_at
+        # processes are listed in declaration order whatever the waves
+        processes = OrderedDict((key, created[key])
+                                for key in process_keys(experiment_spec))
+        self._experiments[experiment_spec.name] = processes
+        self._specs[experiment_spec.name] = experiment_spec
+        self._current = experiment_spec.name
+        if wait_ready:
+            self.clock.advance_to(start)
+
+    def _new_process(self, spec, now):
+        running_at = now + self.boot_time
+        process = _SimProcess(spec, running_at, running_at + self.ready_time)
+        process.log.append('[{:.3f}] created'.format(now))
+        if self._random.random() < self.crash_probability:
+            process.exit_at = process.ready_at + self.crash_after
+            process.exit_code = 1
+        return process
+
+    def _running_spec(self, experiment_spec):
+        self._get_experiment(experiment_spec.name)
+        return self._specs[experiment_spec.name]
+
+    def _save_running_spec(self, experiment_spec):
+        self._specs[experiment_spec.name] = experiment_spec
+
+    def _publish_addresses(self, experiment_spec, changes):
+        # simulated processes run nothing, there is no name service to reach
+        pass
+
+    def _apply_changes(self, experiment_spec, changes):
+        """
+        Restarted processes keep their restart count and boot again
+        """
+        self._op('update')
+        processes = self._get_experiment(experiment_spec.name)
+        now = self.clock.now()
+        for key in changes.removed:
+            del processes[key]
+        for key in changes.restarted():
+            old = processes[key]
+            process = self._new_process(get_process(experiment_spec, key), now)
+            process.restarts = old.restarts + 1
+            process.log = old.log + process.log
+            processes[key] = process
+        for key in changes.added:
+            processes[key] = self._new_process(get_process(experiment_spec, key), now)
+
+    # ===================== Action API =======================
+    def delete(self, experiment_name):
+        self._op('delete')
+        self._get_experiment(experiment_name)
+        del self._experiments[experiment_name]
+        self._specs.pop(experiment_name, None)
+        if self._current == experiment_name:
+            self._current = None
+
+    def transfer_file(self, experiment_name, src, dest, *args, **kwargs):
+        self._op('transfer_file')
+        self._get_experiment(experiment_name)
+
+    def login(self, experiment_name, *args, **kwargs):
+        self._op('login')
+        self._get_experiment(experiment_name)
+
+    def exec_command(self, experiment_name, process_name, command,
+                     process_group_name=None):
+        self._op('exec_command')
+        process = self._get_process(experiment_name, process_name,
+                                    process_group_name)
+        process.log.append('[{:.3f}] exec {}'.format(self.clock.now(), command))
+        return ''
+
+    # ===================== Query API ========================
+    def list_experiments(self):
+        self._op('list_experiments')
+        return list(self._experiments.keys())
+
+    def describe_headers(self):
+        return ['Ready', 'Restarts', 'State']
+
+    def describe_experiment(self, experiment_name):
+        self._op('describe_experiment')
+        now = self.clock.now()
+        out = OrderedDict()
+        for (group, name), process in self._get_experiment(experiment_name).items():
+            out.setdefault(group, OrderedDict())[name] = self._status(process, now)
+        return out
+
+    def describe_process_group(self, experiment_name, process_group_name):
+        self._op('describe_process_group')
+        now = self.clock.now()
+        out = OrderedDict()
+        for (group, name), process in self._get_experiment(experiment_name).items():
+            if group == process_group_name:
+                out[name] = self._status(process, now)
+        if not out:
+            raise ValueError('Cannot find process_group {} in experiment {}'
+                             .format(process_group_name, experiment_name))
+        return out
+
+    def describe_process(self, experiment_name, process_name,
+                         process_group_name=None):
+        self._op('describe_process')
+        process = self._get_process(experiment_name, process_name,
+                                    process_group_name)
+        return self._status(process, self.clock.now())
+
+    def get_log(self, experiment_name, process_name, process_group=None,
+                follow=False, since=0, tail=100, print_logs=False):
+        self._op('get_log')
+        process = self._get_process(experiment_name, process_name, process_group)
+        lines = process.log[since or 0:]
+        if tail:
+            lines = lines[-tail:]
+        log = '\n'.join(lines)
+        if print_logs:
+            print(log)
+        return log
+
+    def external_service(self, experiment_name, service_name):
+        self._op('external_service')
+        self._get_experiment(experiment_name)
+        return 'sim://{}/{}'.format(experiment_name, service_name)
+
+    def external_url(self, experiment_name, service_name):
+        return self.external_service(experiment_name, service_name)
+
+    def watch_experiment(self, experiment_name, timeout=None):
+        """
+        Fast-forwards the virtual clock from one state change to the next,
+        so a watch over minutes of virtual time returns instantly.
+        Stops when nothing is left to happen or after timeout virtual seconds.
+        See Cluster.watch_experiment
+        """
+        self._op('watch_experiment')
+        tracker = EventTracker()
+        deadline = None if timeout is None else self.clock.now() + timeout
+        while True:
+            now = self.clock.now()
+            processes = self._experiments.get(experiment_name, {})
+            for (group, name), process in processes.items():
+                state, ready = process.state(now)
+                for event in tracker.update(group, name, state=state, ready=ready,
+                                            restarts=process.restarts,
+                                            exit_code=process.exit_code):
+                    yield event
+            for key in tracker.keys():
+                if key not in processes:
+                    for event in tracker.remove(*key):
+                        yield event
+            changes = [t for t in (p.next_change(now) for p in processes.values())
+                       if t is not None]
+            if deadline is not None:
+                changes.append(deadline)
+            if not changes or (deadline is not None and now >= deadline):
+                return
+            self.clock.advance_to(min(changes))
+
+    def set_experiment(self, experiment_name):
+        self._op('set_experiment')
+        self._get_experiment(experiment_name)
+        self._current = experiment_name
+
+    def current_experiment(self):
+        return self._current
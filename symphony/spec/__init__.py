@@ -1,3 +1,6 @@
 from .process import ProcessSpec
 from .process_group import ProcessGroupSpec
-from .experiment import ExperimentSpec
\ No newline at end of file
+from .experiment import ExperimentSpec
+from .replicas import ReplicaSpec
+from .shards import Shards
+from .binary import SpecArchive
\ No newline at end of file
@@ -1,10 +1,28 @@
 """
 All experiments, processes, and process_groups extend from this base class
 """
+import functools
 import benedict.data_format as df
+from . import binary
+
+
+def marks_dirty(method):
+    """
+    Decorates a spec method that changes what compile() emits, so that the
+    next compile re-emits the component of the spec
+    """
+    @functools.wraps(method)
+    def wrapped(self, *args, **kwargs):
+        self._mark_dirty()
+        return method(self, *args, **kwargs)
+    return wrapped
 
 
 class BaseSpec:
+    # subclasses instantiated in bulk (processes) declare __slots__ too,
+    # the others get a __dict__ by not declaring any
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = name
 
@@ -18,30 +36,36 @@ class BaseSpec:
     # ---------------- derived JSON/YAML methods -----------------
     @classmethod
     def load_json_file(cls, file_path, **loader_kwargs):
-        return cls(df.load_json_file(file_path, **loader_kwargs))
+        return cls.load_dict(df.load_json_file(file_path, **loader_kwargs))
 
     @classmethod
     def load_json_str(cls, string, **loader_kwargs):
-        return cls(df.load_json_str(string, **loader_kwargs))
+        return cls.load_dict(df.load_json_str(string, **loader_kwargs))
 
     @classmethod
     def load_yaml_file(cls, file_path, **loader_kwargs):
-        return cls(df.load_yaml_file(file_path, **loader_kwargs))
+        return cls.load_dict(df.load_yaml_file(file_path, **loader_kwargs))
 
     @classmethod
     def load_yaml_str(cls, string, **loader_kwargs):
-        return cls(df.load_yaml_str(string, **loader_kwargs))
+        return cls.load_dict(df.load_yaml_str(string, **loader_kwargs))
 
     @classmethod
     def load_file(cls, file_path, **loader_kwargs):
         """
         Args:
-            file_path: JSON or YAML loader depends on the file extension
+            file_path: JSON, YAML or binary (".symph", see spec.binary)
+                loader depends on the file extension
 
         Raises:
-            IOError: if extension is not ".json", ".yml", or ".yaml"
+            IOError: if extension is not ".json", ".yml", ".yaml" or ".symph"
         """
-        return cls(df.load_file(file_path, **loader_kwargs))
+        if str(file_path).endswith(binary.EXTENSION):
+            spec = binary.load_file(file_path)
+            assert isinstance(spec, cls), \
+                '{} contains a {}'.format(file_path, type(spec).__name__)
+            return spec
+        return cls.load_dict(df.load_file(file_path, **loader_kwargs))
 
     def dump_json_file(self, file_path, **dumper_kwargs):
         df.dump_json_file(self.dump_dict(), file_path, **dumper_kwargs)
@@ -57,12 +81,23 @@ class BaseSpec:
         """Returns: string"""
         return df.dump_yaml_str(self.dump_dict(), **dumper_kwargs)
 
+    def dump_binary_file(self, file_path, compression='zlib'):
+        """
+        Args:
+            compression: 'zlib' or None
+        """
+        binary.dump_file(self, file_path, compression=compression)
+
     def dump_file(self, file_path, **dumper_kwargs):
         """
         Args:
-            file_path: JSON or YAML loader depends on the file extension
+            file_path: JSON, YAML or binary (".symph", see spec.binary)
+                dumper depends on the file extension
 
         Raises:
-            IOError: if extension is not ".json", ".yml", or ".yaml"
+            IOError: if extension is not ".json", ".yml", ".yaml" or ".symph"
         """
+        if str(file_path).endswith(binary.EXTENSION):
+            self.dump_binary_file(file_path, **dumper_kwargs)
+            return
         df.dump_file(self.dump_dict(), file_path, **dumper_kwargs)
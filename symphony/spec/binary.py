@@ -0,0 +1,232 @@
+"""
+Compact binary format of specs (".symph" files)
+
+    magic "SYMPH\\0" | version (uint16) | header length (uint32) | header | records
+
+The header is JSON: the spec class, the compression and an index
+{record key: [offset, length]} into the records that follow it. Every
+process and process group of an experiment is its own record, JSON
+compressed with zlib by default, so SpecArchive can load one process
+without decoding the rest of the experiment.
+"""
+import importlib
+import json
+import struct
+import zlib
+from collections import OrderedDict
+
+
+MAGIC = b'SYMPH\x00'
+FORMAT_VERSION = 1
+EXTENSION = '.symph'
+_PREAMBLE = struct.Struct('>6sHI')
+
+# compression: (compress, decompress)
+_CODECS = {
+    None: (lambda b: b, lambda b: b),
+    'zlib': (zlib.compress, zlib.decompress),
+}
+
+
+class SpecFormatError(ValueError):
+    """
+    Raised when a file is not a .symph file of a supported version
+    """
+    pass
+
+
+def _class_path(cls):
+    return '{}:{}'.format(cls.__module__, cls.__qualname__)
+
+
+def _import_class(path):
+    module, qualname = path.split(':')
+    obj = importlib.import_module(module)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _process_key(name, process_group=None):
+    if process_group is None:
+        return 'process/' + name
+    return 'group/{}/process/{}'.format(process_group, name)
+
+
+def _split_records(spec):
+    """
+    Returns:
+        OrderedDict {record key: JSON-able dict}
+    """
+    from .experiment import ExperimentSpec
+    data = spec.dump_dict()
+    records = OrderedDict()
+    if not isinstance(spec, ExperimentSpec):
+        records['spec'] = data
+        return records
+    meta = dict(data)
+    groups = meta.pop('process_groups')
+    processes = meta.pop('processes')
+    meta['process_groups'] = [group['name'] for group in groups]
+    meta['processes'] = [process['name'] for process in processes]
+    records['experiment'] = meta
+    for group in groups:
+        group = dict(group)
+        group_processes = group.pop('processes')
+        group['processes'] = [process['name'] for process in group_processes]
+        records['group/' + group['name']] = group
+        for process in group_processes:
+            records[_process_key(process['name'], group['name'])] = process
+    for process in processes:
+        records[_process_key(process['name'])] = process
+    return records
+
+
+def dumps(spec, compression='zlib'):
+    """
+    Args:
+        spec: BaseSpec, experiments are split into one record per process
+        compression: 'zlib' or None
+
+    Returns:
+        bytes
+    """
+    if compression not in _CODECS:
+        raise ValueError('Unknown compression {}, expected one of {}'
+                         .format(compression, list(_CODECS)))
+    compress = _CODECS[compression][0]
+    index = OrderedDict()
+    chunks = []
+    offset = 0
+    for key, record in _split_records(spec).items():
+        chunk = compress(json.dumps(record, separators=(',', ':')).encode('utf-8'))
+        index[key] = [offset, len(chunk)]
+        chunks.append(chunk)
+        offset += len(chunk)
+    header = json.dumps({
+        'spec_class': _class_path(type(spec)),
+        'name': spec.name,
+        'compression': compression,
+        'index': index,
+    }, separators=(',', ':')).encode('utf-8')
+    return b''.join([_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)), header]
+                    + chunks)
+
+
+def dump_file(spec, file_path, compression='zlib'):
+    with open(file_path, 'wb') as f:
+        f.write(dumps(spec, compression=compression))
+
+
+class SpecArchive(object):
+    """
+    Reads a .symph file. Only the header is decoded when the archive is
+    opened, every record is decoded when it is asked for.
+    """
+    def __init__(self, data):
+        """
+        Args:
+            data: bytes of a .symph file, see SpecArchive.open()
+        """
+        if len(data) < _PREAMBLE.size:
+            raise SpecFormatError('Not a symphony spec file: too short')
+        magic, version, header_length = _PREAMBLE.unpack_from(data)
+        if magic != MAGIC:
+            raise SpecFormatError('Not a symphony spec file')
+        if version > FORMAT_VERSION:
+            raise SpecFormatError('Spec file version {} is newer than the supported '
+                                  'version {}, please upgrade symphony'
+                                  .format(version, FORMAT_VERSION))
+        start = _PREAMBLE.size
+        header = json.loads(data[start:start + header_length].decode('utf-8'))
+        self.version = version
+        self.name = header['name']
+        self.compression = header['compression']
+        self._spec_class_path = header['spec_class']
+        self._index = header['index']
+        self._decompress = _CODECS[self.compression][1]
+        self._data = data
+        self._records_start = start + header_length
+
+    @classmethod
+    def open(cls, file_path):
+        with open(file_path, 'rb') as f:
+            return cls(f.read())
+
+    @property
+    def spec_class(self):
+        return _import_class(self._spec_class_path)
+
+    def keys(self):
+        return list(self._index)
+
+    def record(self, key):
+        """
+        Returns:
+            the dict stored under key
+        """
+        if key not in self._index:
+            raise KeyError('No record "{}" in spec {}'.format(key, self.name))
+        offset, length = self._index[key]
+        start = self._records_start + offset
+        return json.loads(self._decompress(
+            self._data[start:start + length]).decode('utf-8'))
+
+    def _is_experiment(self):
+        return 'experiment' in self._index
+
+    def list_process_groups(self):
+        assert self._is_experiment(), '{} is not an experiment'.format(self.name)
+        return self.record('experiment')['process_groups']
+
+    def list_processes(self, process_group=None):
+        """
+        Returns:
+            names of the lone processes, or of the processes of process_group
+        """
+        assert self._is_experiment(), '{} is not an experiment'.format(self.name)
+        if process_group is None:
+            return self.record('experiment')['processes']
+        return self.record('group/' + process_group)['processes']
+
+    def load_process(self, name, process_group=None):
+        """
+        Decodes a single process, it does not belong to any experiment
+
+        Returns:
+            ProcessSpec
+        """
+        assert self._is_experiment(), '{} is not an experiment'.format(self.name)
+        process_class = self.spec_class._ProcessClass
+        if process_group is not None:
+            process_class = self.spec_class._ProcessGroupClass._ProcessClass
+        return process_class.load_dict(self.record(_process_key(name, process_group)))
+
+    def load(self):
+        """
+        Decodes the whole spec
+
+        Returns:
+            instance of the spec class
+        """
+        if not self._is_experiment():
+            return self.spec_class.load_dict(self.record('spec'))
+        data = self.record('experiment')
+        groups = []
+        for group_name in data['process_groups']:
+            group = self.record('group/' + group_name)
+            group['processes'] = [self.record(_process_key(name, group_name))
+                                  for name in group['processes']]
+            groups.append(group)
+        data['process_groups'] = groups
+        data['processes'] = [self.record(_process_key(name))
+                             for name in data['processes']]
+        return self.spec_class.load_dict(data)
+
+
+def loads(data):
+    return SpecArchive(data).load()
+
+
+def load_file(file_path):
+    return SpecArchive.open(file_path).load()
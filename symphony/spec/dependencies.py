@@ -0,0 +1,155 @@
+"""
+Service dependencies between the processes of an experiment: a process
+depends on the processes that bind the services it connects to. Backends
+launch the processes in waves so that the services a wave connects to are
+bound by earlier waves.
+"""
+from collections import OrderedDict
+from .diff import _processes, get_process
+from .shards import expand_shards
+
+
+def dependency_graph(experiment):
+    """
+    Args:
+        experiment: ExperimentSpec, services need not be declared yet
+
+    Returns:
+        OrderedDict {(process_group_name, process_name): [keys of the
+        processes that bind a service it connects to]}, the group is None for
+        lone processes
+    """
+    processes = _processes(experiment)
+    providers = {}  # {service name: [keys of binding processes]}
+    for key, process in processes.items():
+        for service_name in process.binded_services:
+            providers.setdefault(service_name, []).append(key)
+    graph = OrderedDict()
+    for key, process in processes.items():
+        dependencies = []
+        for service_name in process.connected_services:
+            for provider in providers.get(service_name, ()):
+                if provider != key and provider not in dependencies:
+                    dependencies.append(provider)
+        graph[key] = dependencies
+    return graph
+
+
+def _strongly_connected_components(graph):
+    """
+    Iterative Tarjan, experiments can have more processes than the
+    recursion limit
+
+    Returns:
+        list of components (lists of nodes). A component comes after all
+        the components it has edges to.
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    counter = 0
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, iter(graph[root]))]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, edges = work[-1]
+            for child in edges:
+                if child not in index:
+                    index[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(graph[child])))
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+def launch_waves(experiment, by_process_group=False):
+    """
+    Orders the processes of an experiment in waves: every process comes in
+    a later wave than the processes it depends on. Processes that depend on
+    each other in a cycle are launched in the same wave.
+
+    Args:
+        by_process_group: a process group is launched as a whole, as the
+            pod of Kubernetes, it is the node (process_group_name, None)
+
+    Returns:
+        list of waves, each a list of keys in declaration order
+    """
+    graph = dependency_graph(experiment)
+    if by_process_group:
+        def _node(key):
+            return key if key[0] is None else (key[0], None)
+        nodes = OrderedDict()
+        for key, dependencies in graph.items():
+            node_dependencies = nodes.setdefault(_node(key), [])
+            for dependency in map(_node, dependencies):
+                if dependency != _node(key) and dependency not in node_dependencies:
+                    node_dependencies.append(dependency)
+        graph = nodes
+
+    level = {}
+    for component in _strongly_connected_components(graph):
+        members = set(component)
+        wave = 0
+        for node in component:
+            for dependency in graph[node]:
+                if dependency not in members:
+                    wave = max(wave, level[dependency] + 1)
+        for node in component:
+            level[node] = wave
+    waves = [[] for _ in range(max(level.values()) + 1 if level else 0)]
+    for node in graph:
+        waves[level[node]].append(node)
+    return waves
+
+
+def bound_addresses(experiment, keys):
+    """
+    Args:
+        experiment: compiled ExperimentSpec
+        keys: keys of processes as returned by launch_waves()
+
+    Returns:
+        OrderedDict {service name: (host, port) or socket path} of the
+        services the processes bind, whole groups for
+        (process_group_name, None)
+    """
+    addresses = OrderedDict()
+    for process_group_name, process_name in keys:
+        if process_name is None:
+            processes = experiment.get_process_group(process_group_name).list_processes()
+        else:
+            processes = [get_process(experiment, (process_group_name, process_name))]
+        for process in processes:
+            for service_name in expand_shards(process.binded_services):
+                entry = experiment.address_book.entries[service_name]
+                if 'ipc' in entry:
+                    addresses[service_name] = entry['ipc']
+                else:
+                    addresses[service_name] = (entry['host'], entry['port'])
+    return addresses
@@ -0,0 +1,167 @@
+"""
+Differences between two versions of an experiment spec, applied by
+Cluster.update() without relaunching the processes that did not change
+"""
+from collections import OrderedDict
+from symphony.nameservice import BOOK_ENV
+from .shards import expand_shards
+
+
+def get_process(experiment, key):
+    """
+    Args:
+        key: (process_group_name, process_name), group None for lone processes
+    """
+    process_group_name, process_name = key
+    if process_group_name is None:
+        return experiment.get_process(process_name)
+    return experiment.get_process_group(process_group_name).get_process(process_name)
+
+
+def _processes(experiment):
+    """
+    Returns:
+        OrderedDict {(process_group_name, process_name): ProcessSpec}
+    """
+    processes = OrderedDict()
+    for process_group in experiment.list_process_groups():
+        for process in process_group.list_processes():
+            processes[(process_group.name, process.name)] = process
+    for process in experiment.list_processes():
+        processes[(None, process.name)] = process
+    return processes
+
+
+def process_keys(experiment):
+    """
+    Returns:
+        keys of all the processes, in the order backends launch them
+    """
+    return list(_processes(experiment))
+
+
+def _services(experiment):
+    services = []
+    for process in experiment.list_all_processes():
+        for name in list(expand_shards(process.binded_services)) \
+                + list(process.exposed_services):
+            if name not in services:
+                services.append(name)
+    return services
+
+
+class ChangeSet(object):
+    """
+    Minimal changes that turn a running experiment into a new spec.
+    Processes are identified by (process_group_name, process_name), the
+    group is None for lone processes.
+    """
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.replaced = []  # definition changed, must be recreated
+        self.env_updated = OrderedDict()  # {process: {name: value, None if unset}}
+        self.added_process_groups = []
+        self.removed_process_groups = []
+        self.added_services = []
+        self.removed_services = []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.replaced
+                    or self.env_updated or self.added_process_groups
+                    or self.removed_process_groups or self.added_services
+                    or self.removed_services)
+
+    def restarted(self):
+        """
+        Returns:
+            processes that keep running with a new definition or environment,
+            a running process only picks up either by restarting
+        """
+        return self.replaced + [key for key in self.env_updated
+                                if key not in self.replaced]
+
+    def changed_process_groups(self):
+        """
+        Returns:
+            names of the process groups that exist before and after the
+            change and have processes added, removed or restarted
+        """
+        untouched = set(self.added_process_groups) | set(self.removed_process_groups)
+        names = []
+        for process_group_name, _ in self.added + self.removed + self.restarted():
+            if process_group_name is not None and process_group_name not in untouched \
+                    and process_group_name not in names:
+                names.append(process_group_name)
+        return names
+
+    def summary(self):
+        """
+        Returns:
+            list of lines, one per change
+        """
+        def _name(key):
+            return key[1] if key[0] is None else '{}/{}'.format(*key)
+        lines = []
+        lines.extend('+ process group ' + name for name in self.added_process_groups)
+        lines.extend('- process group ' + name for name in self.removed_process_groups)
+        lines.extend('+ service ' + name for name in self.added_services)
+        lines.extend('- service ' + name for name in self.removed_services)
+        lines.extend('+ ' + _name(key) for key in self.added)
+        lines.extend('- ' + _name(key) for key in self.removed)
+        lines.extend('~ ' + _name(key) for key in self.replaced)
+        for key, env in self.env_updated.items():
+            lines.append('~ {} env: {}'.format(_name(key), ', '.join(sorted(env))))
+        return lines
+
+    def __str__(self):
+        return '\n'.join(self.summary()) or 'no changes'
+
+
+def diff_specs(old, new):
+    """
+    Compares two compiled versions of an experiment. Environment variables
+    of the address book are ignored: processes that only see new addresses
+    are not restarted, the name service is sent them by Cluster.update().
+
+    Args:
+        old: ExperimentSpec that is running
+        new: ExperimentSpec to update it to
+
+    Returns:
+        ChangeSet
+    """
+    changes = ChangeSet()
+    address_vars = set(old.address_book.dump()) | set(new.address_book.dump())
+    address_vars.add(BOOK_ENV)
+
+    old_groups = [pg.name for pg in old.list_process_groups()]
+    new_groups = [pg.name for pg in new.list_process_groups()]
+    changes.added_process_groups = [g for g in new_groups if g not in old_groups]
+    changes.removed_process_groups = [g for g in old_groups if g not in new_groups]
+
+    old_services, new_services = _services(old), _services(new)
+    changes.added_services = [s for s in new_services if s not in old_services]
+    changes.removed_services = [s for s in old_services if s not in new_services]
+
+    old_processes, new_processes = _processes(old), _processes(new)
+    changes.removed = [key for key in old_processes if key not in new_processes]
+    for key, process in new_processes.items():
+        if key not in old_processes:
+            changes.added.append(key)
+            continue
+        old_definition, old_env = old_processes[key]._diff_parts()
+        new_definition, new_env = process._diff_parts()
+        if old_definition != new_definition:
+            changes.replaced.append(key)
+            continue
+        env = OrderedDict()
+        for name in new_env:
+            if name not in address_vars and old_env.get(name) != new_env[name]:
+                env[name] = new_env[name]
+        for name in old_env:
+            if name not in address_vars and name not in new_env:
+                env[name] = None
+        if env:
+            changes.env_updated[key] = env
+    return changes
@@ -1,13 +1,29 @@
 from symphony.engine.application_config import SymphonyConfig
-from symphony.engine.address_book import AddressBook
+import json
+from symphony.engine.address_book import AddressBook, LOCALHOST, is_address_env
+from symphony.nameservice import NAME_SERVICE, BOOK_ENV, LISTEN_ENV
+from symphony.utils.ports import PortAllocator
 from .base import BaseSpec
 from .process import ProcessSpec
 from .process_group import ProcessGroupSpec
+from .replicas import ReplicaSpec
+from .shards import Shards, assign_shards, expand_shards, shard_name
+
+
+def _env_size(env):
+    """
+    Returns:
+        bytes of env in the environment of a process, NAME=value\0 each
+    """
+    return sum(len(name) + len(str(value)) + 2 for name, value in env.items())
 
 
 class ExperimentSpec(BaseSpec):
     _ProcessClass = None
     _ProcessGroupClass = None
+    # interface of the name service, the processes of one host reach it
+    # on the loopback interface
+    _name_service_listen = '127.0.0.1'
 
     def __init__(self, name):
         if SymphonyConfig().username:
@@ -18,6 +34,19 @@ class ExperimentSpec(BaseSpec):
         self.lone_processes = {}
         self.all_processes = {}
         self.process_groups = {}
+        self._replicas = []  # ReplicaSpecs not materialized yet
+        # changed since the last compile, see _mark_dirty()
+        self._dirty_processes = set()
+        self._dirty_process_groups = set()
+        self._services_dirty = True
+        self._pinned_ports = {}  # {service name: port}, see pin_addresses()
+        self.scoped_addresses = False
+        self._port_allocator = None  # see use_port_allocator()
+        self._binders = None  # see _service_binders()
+        self._port_owner = None
+        self.sharded_services = {}  # {service name: number of shards}
+        self._shard_assignments = {}  # see _assign_shards()
+        self.name_service = False  # see use_name_service()
 
     def add_process_group(self, process_group):
         assert isinstance(process_group, ProcessGroupSpec)
@@ -28,6 +57,7 @@ class ExperimentSpec(BaseSpec):
                 .format(process_group_name, self.name))
         self.process_groups[process_group_name] = process_group
         process_group._set_experiment(self)
+        self._mark_dirty(process_group=process_group)
 
     def add_process_groups(self, process_groups):
         for process_group in process_groups:
@@ -47,9 +77,11 @@ class ExperimentSpec(BaseSpec):
         return process_group
 
     def get_process_group(self, name):
+        self._expand_replicas()
         return self.process_groups[name]
 
     def list_process_groups(self):
+        self._expand_replicas()
         return self.process_groups.values()
 
     def add_process(self, process, lone=True):
@@ -62,6 +94,9 @@ class ExperimentSpec(BaseSpec):
             self.lone_processes[process_name] = process
         self.all_processes[process_name] = process
         process._set_experiment(self)
+        self._mark_dirty(process=process,
+                         services=bool(process.binded_services
+                                       or process.exposed_services))
 
     def add_processes(self, processes):
         for process in processes:
@@ -76,13 +111,384 @@ class ExperimentSpec(BaseSpec):
         self.add_process(process)
         return process
 
+    def use_name_service(self, **kwargs):
+        """
+        Launches a name service with the experiment: a process "nameservice"
+        that holds the address book, reachable through SYMPH_NAMESERVICE_ADDR.
+        Processes look addresses up and register new ones at runtime with
+        symphony.nameservice.NameServiceClient, and Cluster.update() sends it
+        the new addresses, so running processes find restarted, added or
+        moved services without restarting.
+
+        Args:
+            kwargs: passed to the process, e.g. container_image on
+                Kubernetes, an image with symphony installed
+
+        Returns:
+            the name service ProcessSpec
+        """
+        if self.name_service:
+            return self.all_processes[NAME_SERVICE]
+        process = self._name_service_process(**kwargs)
+        process.binds(NAME_SERVICE)
+        self.add_process(process)
+        self.name_service = True
+        return process
+
+    def _name_service_process(self, **kwargs):
+        """ Internal method
+            Returns a process named NAME_SERVICE that runs
+            symphony.nameservice.server_command()
+        """
+        raise NotImplementedError('{} does not support a name service'
+                                  .format(type(self).__name__))
+
+    def _mark_dirty(self, process=None, process_group=None, services=False):
+        """ Internal method
+            Records what changed since the last compile, so that compile()
+            only redoes the work of the changed parts. A change of services
+            changes the address book, and therefore every process
+        """
+        if process is not None:
+            self._dirty_processes.add(process)
+            if process.parent_process_group is not None:
+                self._dirty_process_groups.add(process.parent_process_group)
+        if process_group is not None:
+            self._dirty_process_groups.add(process_group)
+        if services:
+            self._services_dirty = True
+            self._binders = None
+
+    def pin_addresses(self, address_book):
+        """
+        Services declared without a port keep the port they have in
+        address_book at the next compile, so that processes that keep
+        running still reach them. Used by Cluster.update()
+        """
+        self._pinned_ports = {name: entry['port']
+                              for name, entry in address_book.entries.items()
+                              if 'port' in entry}
+        self._services_dirty = True
+
+    def use_port_allocator(self, allocator, owner=None):
+        """
+        Services get their ports from allocator (a PortAllocator leasing
+        ports host-wide) instead of the first free ones of the port range of
+        the experiment. Clusters of local backends set this before compiling.
+
+        Args:
+            owner: the leases are released under this name, the experiment
+                name by default
+        """
+        self._port_allocator = allocator
+        self._port_owner = owner or self.name
+        self._services_dirty = True
+
+    def _allocate_ports(self, services):
+        """ Internal method
+            Ports of the services declared at compile, services pinned by
+            pin_addresses() keep theirs
+
+        Args:
+            services: {service name: port or None}
+
+        Returns:
+            {service name: port}
+        """
+        requested = {name: port if port is not None else self._pinned_ports.get(name)
+                     for name, port in services.items()}
+        if self._port_allocator is None:
+            return PortAllocator(self.port_range).lease(
+                self.name, requested, exclude=self._pinned_ports.values())
+        return self._port_allocator.lease(
+            self._port_owner, requested, exclude=self._pinned_ports.values())
+
+    def _declare_shards(self):
+        """ Internal method
+            Records the number of shards of every sharded service in
+            sharded_services, at compile. Every shard must be bound by
+            exactly one process.
+        """
+        sharded = {}
+        binders = {}  # {shard name: process}
+        plain = set()
+        for process in self.list_all_processes():
+            for name, port in process.binded_services.items():
+                if not isinstance(port, Shards):
+                    plain.add(name)
+                    continue
+                if sharded.setdefault(name, port.count) != port.count:
+                    raise ValueError('[Error] Service {} has {} shards, process {} '
+                                     'binds {}'.format(name, sharded[name],
+                                                       process.name, port.count))
+                for index in port.indices():
+                    binder = binders.setdefault(shard_name(name, index), process)
+                    if binder is not process:
+                        raise ValueError('[Error] Shard {} of service {} is bound by '
+                                         'both {} and {}'.format(
+                                             index, name, binder.name, process.name))
+        for name, count in sharded.items():
+            missing = [index for index in range(count)
+                       if shard_name(name, index) not in binders]
+            if missing:
+                raise ValueError('[Error] Shards {} of service {} are not bound'
+                                 .format(missing, name))
+            if name in plain or any(shard_name(name, index) in plain
+                                    for index in range(count)):
+                raise ValueError('[Error] Service {} or one of its shards is also '
+                                 'bound without Shards'.format(name))
+        self.sharded_services = sharded
+
+    def _add_shard_entries(self):
+        """ Internal method
+            Adds the sharded services to the address book, after their shards
+        """
+        for name, count in self.sharded_services.items():
+            self.address_book.add_shards(
+                name, [shard_name(name, index) for index in range(count)])
+
+    def _assign_shards(self):
+        """ Internal method
+            Assigns the connectors of every sharded service to its shards,
+            see assign_shards(). Loads are bounded, so a new connector can
+            move others: returns the processes whose shard changed
+        """
+        if not self.sharded_services:
+            self._shard_assignments = {}
+            return []
+        processes = self.list_all_processes()
+        connectors = {name: [] for name in self.sharded_services}
+        for process in processes:
+            for name in process.connected_services:
+                if name in connectors:
+                    connectors[name].append(process.name)
+        old = self._shard_assignments
+        self._shard_assignments = {
+            name: assign_shards(name, self.sharded_services[name], names)
+            for name, names in connectors.items()}
+        return [process for process in processes
+                if any(old.get(name, {}).get(process.name) != shards.get(process.name)
+                       for name, shards in self._shard_assignments.items())]
+
+    def _shard_of(self, service_name, process):
+        """ Internal method
+            Returns the shard of service_name that process connects to
+        """
+        shards = self._shard_assignments.get(service_name)
+        if shards is None or process.name not in shards:
+            self._assign_shards()
+            shards = self._shard_assignments[service_name]
+        return shards[process.name]
+
+    def _shard_env(self, process, local=()):
+        """ Internal method
+            Returns {env var: value} of the shard process binds or connects
+            to, for every sharded service, see _assign_shards()
+        """
+        env = {}
+        if not self.sharded_services:
+            return env
+        for name in process.connected_services:
+            if name in self.sharded_services:
+                env.update(self.address_book.dump_shard(
+                    name, self._shard_of(name, process), local))
+        for name, port in process.binded_services.items():
+            if isinstance(port, Shards) and port.index is not None:
+                env.update(self.address_book.dump_shard(name, port.index, local))
+        return env
+
+    def scope_addresses(self, scoped=True):
+        """
+        Gives each process the addresses of the services it binds, connects
+        to or exposes instead of the whole address book (3 environment
+        variables per service). A process that needs every address calls
+        process.uses_full_address_book(). Call before the first compile,
+        addresses already given to processes are not taken back.
+        """
+        self.scoped_addresses = scoped
+        self._services_dirty = True
+
+    def address_env(self, process, local=None):
+        """
+        Args:
+            local: services process reaches on the loopback interface,
+                see _local_services()
+
+        Returns:
+            {env var: value} of the addresses process is given
+        """
+        if local is None:
+            local = self._local_services(process)
+        if not self.scoped_addresses or process.full_address_book:
+            env = self.address_book.dump(local=local)
+        else:
+            entries = self.address_book.entries
+            names = [name for services in (process.binded_services,
+                                           process.connected_services,
+                                           process.exposed_services)
+                     for name in services if name in entries]
+            if self.name_service:
+                names.append(NAME_SERVICE)
+            env = self.address_book.dump(names=set(names), local=local)
+        env.update(self._shard_env(process, local))
+        return env
+
+    def set_address_envs(self, processes, report=False):
+        """
+        Sets the address environment variables of processes, at compile.
+        Address variables a process is no longer given (e.g. after
+        scope_addresses()) are removed
+
+        Args:
+            report: prints how many bytes of environment scoping saved
+        """
+        full_env = self.address_book.dump()
+        size = 0
+        processes = list(processes)
+        listed = set(processes)
+        for process in self._assign_shards():
+            if process not in listed:
+                # e.g. moved to another shard by a new connector
+                self._mark_dirty(process)
+                processes.append(process)
+        for process in processes:
+            local = self._local_services(process)
+            if self.scoped_addresses or local:
+                env = self.address_env(process, local)
+            else:
+                env = full_env
+                shard_env = self._shard_env(process)
+                if shard_env:
+                    env = dict(full_env)
+                    env.update(shard_env)
+            process._drop_envs(lambda name: name not in env and is_address_env(name))
+            process.set_envs(env)
+            size += _env_size(env)
+            if self.name_service and process.name == NAME_SERVICE:
+                process.set_envs({BOOK_ENV: json.dumps(self.address_book.entries,
+                                                       sort_keys=True),
+                                  LISTEN_ENV: self._name_service_listen})
+        if report and self.scoped_addresses and processes:
+            full_size = _env_size(full_env) * len(processes)
+            print('{}: scoped address book sets {} bytes of environment '
+                  'variables instead of {} ({:.1f}% fewer)'.format(
+                      self.name, size, full_size,
+                      100. * (full_size - size) / full_size if full_size else 0.))
+
+    def _colocated(self, binder, connector):
+        """ Internal method
+            True if connector reaches binder on the loopback interface: they
+            are in the same process group, which shares one network (e.g. a
+            Kubernetes pod). Single-host backends override this
+        """
+        return binder.parent_process_group is not None \
+            and binder.parent_process_group is connector.parent_process_group
+
+    def _service_binders(self):
+        """ Internal method
+            Returns {service name: process that binds it}, cached until
+            services change
+        """
+        if self._binders is None:
+            binders = {}
+            for process in self.list_all_processes():
+                for service_name in expand_shards(process.binded_services):
+                    binders.setdefault(service_name, process)
+            self._binders = binders
+        return self._binders
+
+    def _connections(self, process):
+        """ Internal method
+            Yields (service name, binder) of the services process connects
+            to and that a colocated process binds
+        """
+        binders = self._service_binders()
+        for service_name in process.connected_services:
+            if service_name in self.sharded_services:
+                service_name = shard_name(service_name,
+                                          self._shard_of(service_name, process))
+            binder = binders.get(service_name)
+            if binder is not None and self._colocated(binder, process):
+                yield service_name, binder
+
+    def _local_services(self, process):
+        """ Internal method
+            Services whose address must be rewritten to the loopback
+            interface for process
+        """
+        entries = self.address_book.entries
+        return [service_name for service_name, _ in self._connections(process)
+                if service_name in entries
+                and entries[service_name].get('host', LOCALHOST) != LOCALHOST]
+
+    def short_circuited_edges(self):
+        """
+        Connections that skip the network because the binder and the
+        connector share one: the same process group, or the same host for
+        tmux and subproc.
+
+        Returns:
+            list of (connector, service name, binder), processes are
+            (process_group_name, process_name), the group is None for lone
+            processes
+        """
+        def _key(process):
+            group = process.parent_process_group
+            return (None if group is None else group.name, process.name)
+        edges = []
+        for process in self.list_all_processes():
+            for service_name, binder in self._connections(process):
+                if binder is not process:
+                    edges.append((_key(process), service_name, _key(binder)))
+        return edges
+
+    def _clear_dirty(self):
+        """ Internal method
+            Called at the end of compile()
+        """
+        self._dirty_processes = set()
+        self._dirty_process_groups = set()
+        self._services_dirty = False
+
+    def new_replicas(self, template, count, name_fmt='agent-{i}', **kwargs):
+        """
+        Declares count copies of the template process, they are created when
+        the experiment is compiled or iterated, so this takes constant time.
+        See ReplicaSpec for the per-index overrides (args, env, customize)
+
+        Example:
+            template = SubprocProcessSpec('agent', cmd='python agent.py')
+            template.connects('replay')
+            exp.new_replicas(template, 256, args=['--seed', '{i}'],
+                             env={'AGENT_ID': '{i}'})
+
+        Returns:
+            ReplicaSpec
+        """
+        replicas = ReplicaSpec(template, count, name_fmt, **kwargs)
+        self._replicas.append(replicas)
+        return replicas
+
+    def _expand_replicas(self):
+        """ Internal method
+            Adds the processes of the pending ReplicaSpecs, of the experiment
+            and of its process groups
+        """
+        while self._replicas:
+            self.add_processes(self._replicas.pop(0).materialize())
+        for process_group in self.process_groups.values():
+            process_group._expand_replicas()
+
     def get_process(self, name):
+        self._expand_replicas()
         return self.lone_processes[name]
 
     def list_processes(self):
+        self._expand_replicas()
         return self.lone_processes.values()
 
     def list_all_processes(self):
+        self._expand_replicas()
         return self.all_processes.values()
 
     @classmethod
@@ -100,6 +506,9 @@ class ExperimentSpec(BaseSpec):
         for dictionary in processes:
             self.add_process(self._ProcessClass.load_dict(dictionary))
         self.address_book = AddressBook(data['ab'])
+        self.scoped_addresses = data.get('scoped_addresses', False)
+        self.sharded_services = data.get('sharded_services', {})
+        self.name_service = data.get('name_service', False)
 
     def dump_dict(self):
         pgs = []
@@ -112,4 +521,7 @@ class ExperimentSpec(BaseSpec):
                 'processes': pcs,
                 'name': self.name,
                 'ab': self.address_book.entries,
+                'scoped_addresses': self.scoped_addresses,
+                'sharded_services': self.sharded_services,
+                'name_service': self.name_service,
                }
@@ -1,14 +1,27 @@
-from .base import BaseSpec
+import copy
+import sys
+from types import MappingProxyType
+from .base import BaseSpec, marks_dirty
+from .shards import Shards, dump_services, load_services
 from symphony.utils.common import check_valid_dns
 
 
+# port of a service bound to a unix domain socket instead of a TCP port, see
+# ProcessSpec.binds()
+IPC = 'ipc'
+
+# read-only default shared by every process that declares no service or env,
+# replaced by a dict of its own on first write
+EMPTY_MAPPING = MappingProxyType({})
+
 
 def parse_service_spec(spec):
     """
         Compiles port specification, it can be (tested in this order):
         (str): arrange an arbitrary port for this service
         (list(str)):arrange an arbitrary port for every string in the list
-        (dict): for 'k','v' in dict: arrange port 'v' for service 'k'
+        (dict): for 'k','v' in dict: arrange port 'v' for service 'k',
+            'v' can be Shards(n) for a sharded service
     """
     if isinstance(spec, str):
         check_valid_dns(spec)
@@ -20,19 +33,43 @@ def parse_service_spec(spec):
     if isinstance(spec, dict):
         for name in spec:
             check_valid_dns(name)
-            if not isinstance(spec[name], int) and (spec[name] is not None):
-                raise ValueError('[Error] Invalid port number {}, expected int'.format(spec[name]))
+            if not isinstance(spec[name], (int, Shards)) and (spec[name] is not None) \
+                    and spec[name] != IPC:
+                raise ValueError('[Error] Invalid port number {}, expected int, "ipc" or Shards'
+                                 .format(spec[name]))
         return spec
 
 
+def merge_services(services, spec):
+    """
+    Returns:
+        services updated with spec, copied first if it is the shared
+        EMPTY_MAPPING. Service names are interned because the same few names
+        are repeated by every process of a large experiment.
+    """
+    if not spec:
+        return services
+    if services is EMPTY_MAPPING:
+        services = {}
+    for name, port in spec.items():
+        services[sys.intern(name)] = port
+    return services
+
+
 class ProcessSpec(BaseSpec):
+    # experiments can have 100k processes, slots keep each one small
+    __slots__ = ('parent_process_group', 'parent_experiment',
+                 'binded_services', 'connected_services', 'exposed_services',
+                 'full_address_book')
+
     def __init__(self, name):
         super().__init__(name)
         self.parent_process_group = None
         self.parent_experiment = None
-        self.binded_services = {}
-        self.connected_services = {}
-        self.exposed_services = {}
+        self.binded_services = EMPTY_MAPPING
+        self.connected_services = EMPTY_MAPPING
+        self.exposed_services = EMPTY_MAPPING
+        self.full_address_book = False
 
     def _set_experiment(self, experiment):
         """ Internal method
@@ -56,31 +93,94 @@ class ProcessSpec(BaseSpec):
                                                            self.parent_process_group.name))
         self.parent_process_group = process_group
 
+    def _mark_dirty(self, services=False):
+        """ Internal method
+            Records that the process changed since its experiment was last
+            compiled, services=True if its binded or exposed services changed
+        """
+        if self.parent_experiment is not None:
+            self.parent_experiment._mark_dirty(process=self, services=services)
+
+    def _diff_parts(self):
+        """ Internal method
+            Returns (definition, env) compared by spec.diff. A process whose
+            definition changes is replaced, an env change alone is reported
+            as such
+        """
+        return self.dump_dict(), {}
+
+    def _replicate(self, name, shared=()):
+        """ Internal method
+            Returns a copy of this process named name, see ReplicaSpec
+
+        Args:
+            shared: objects the copy refers to instead of copying them
+        """
+        # the shared EMPTY_MAPPING is kept as is, it cannot be copied
+        memo = {id(EMPTY_MAPPING): EMPTY_MAPPING}
+        memo.update((id(obj), obj) for obj in shared)
+        process = copy.deepcopy(self, memo)
+        process.name = name
+        return process
+
+    def _append_args(self, args):
+        """ Internal method
+            Appends command line arguments, used by ReplicaSpec
+        """
+        raise NotImplementedError('{} does not support replica args'
+                                  .format(type(self).__name__))
+
+    def _drop_envs(self, drop):
+        """ Internal method
+            Removes the environment variables whose name drop(name) is true
+            for, e.g. the addresses a process is no longer given
+        """
+        raise NotImplementedError('{} does not support removing env variables'
+                                  .format(type(self).__name__))
+
     # TODO: docs about bind/connect/expose input format
     def binds(self, spec):
         """ Declare that this process binds to an address / provides a service
         so others can connect to it
         Args:
-        spec(str/list(str)/dict(str: int)): specify the services to provide
+        spec(str/list(str)/dict(str: int)): specify the services to provide,
+            a port of "ipc" binds a unix domain socket (tmux and subproc) whose
+            path is in SYMPH_<NAME>_IPC. A port of Shards(n) binds the n
+            shards of a sharded service, Shards(n).shard(i) only shard i
         """
-        self.binded_services.update(parse_service_spec(spec))
+        self._mark_dirty(services=True)
+        self.binded_services = merge_services(self.binded_services,
+                                              parse_service_spec(spec))
 
     def connects(self, spec):
         """ Declare that this process connects to an address / an service
         Args:
         """
+        self._mark_dirty()
         spec = parse_service_spec(spec)
         for k in spec:
             if spec[k] is not None:
                 raise ValueError('[Error] When connecting to {}, a port is specified. Port must be None when connecting'.format(k))
-        self.connected_services.update(spec)
+        self.connected_services = merge_services(self.connected_services, spec)
 
     def exposes(self, spec):
         """ Declare that this process binds to an address / provides a service
         so user can connect to it externally, i.e. use `symphony visit <service_name>`
         Args:
         """
-        self.exposed_services.update(parse_service_spec(spec))
+        spec = parse_service_spec(spec)
+        if any(port == IPC or isinstance(port, Shards) for port in spec.values()):
+            raise ValueError('[Error] Exposed services need a TCP port')
+        self._mark_dirty(services=True)
+        self.exposed_services = merge_services(self.exposed_services, spec)
+
+    def uses_full_address_book(self, full=True):
+        """ Declare that this process needs the address of every service,
+        e.g. because it discovers them at runtime. Only matters when the
+        experiment scopes addresses, see ExperimentSpec.scope_addresses()
+        """
+        self._mark_dirty()
+        self.full_address_book = full
 
     @classmethod
     def load_dict(cls, di):
@@ -95,13 +195,18 @@ class ProcessSpec(BaseSpec):
         """
         Loads information from data, can be inherited
         """
-        self.binded_services = data['binded_services']
-        self.connected_services = data['connected_services']
-        self.exposed_services = data['exposed_services']
+        self.binded_services = merge_services(EMPTY_MAPPING,
+                                              load_services(data['binded_services']))
+        self.connected_services = merge_services(EMPTY_MAPPING,
+                                                 data['connected_services'])
+        self.exposed_services = merge_services(EMPTY_MAPPING,
+                                               data['exposed_services'])
+        self.full_address_book = data.get('full_address_book', False)
 
     def dump_dict(self):
         data = {'name': self.name}
-        data['binded_services'] = self.binded_services
-        data['connected_services'] = self.connected_services
-        data['exposed_services'] = self.exposed_services
+        data['binded_services'] = dump_services(self.binded_services)
+        data['connected_services'] = dict(self.connected_services)
+        data['exposed_services'] = dict(self.exposed_services)
+        data['full_address_book'] = self.full_address_book
         return data
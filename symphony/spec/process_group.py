@@ -1,5 +1,6 @@
 from .base import BaseSpec
 from .process import ProcessSpec
+from .replicas import ReplicaSpec
 
 
 class ProcessGroupSpec(BaseSpec):
@@ -9,6 +10,7 @@ class ProcessGroupSpec(BaseSpec):
         super().__init__(name)
         self.processes = {}
         self.parent_experiment = None
+        self._replicas = []  # ReplicaSpecs not materialized yet
 
     def add_process(self, process):
         """Inserts a process to this process group
@@ -34,7 +36,16 @@ class ProcessGroupSpec(BaseSpec):
         for process in self.processes.values():
             experiment.add_process(process, lone=False)
 
+    def _mark_dirty(self):
+        """ Internal method
+            Records that the process group changed since its experiment was
+            last compiled
+        """
+        if self.parent_experiment is not None:
+            self.parent_experiment._mark_dirty(process_group=self)
+
     def get_process(self, name):
+        self._expand_replicas()
         return self.processes[name]
 
     def add_processes(self, processes):
@@ -52,7 +63,28 @@ class ProcessGroupSpec(BaseSpec):
         self.add_process(process)
         return process
 
+    def new_replicas(self, template, count, name_fmt='agent-{i}', **kwargs):
+        """
+        Declares count copies of the template process in this process group,
+        they are created when the process group is compiled or iterated.
+        See ReplicaSpec for the per-index overrides (args, env, customize)
+
+        Returns:
+            ReplicaSpec
+        """
+        replicas = ReplicaSpec(template, count, name_fmt, **kwargs)
+        self._replicas.append(replicas)
+        return replicas
+
+    def _expand_replicas(self):
+        """ Internal method
+            Adds the processes of the pending ReplicaSpecs
+        """
+        while self._replicas:
+            self.add_processes(self._replicas.pop(0).materialize())
+
     def list_processes(self):
+        self._expand_replicas()
         return self.processes.values()
 
     @classmethod
@@ -0,0 +1,87 @@
+"""
+Many identical processes declared once, e.g. the agents of an RL experiment
+"""
+
+
+def _per_index(value, i):
+    """
+    value is a function of the index, or a str/list/dict whose strings are
+    formatted with i
+    """
+    if callable(value):
+        return value(i)
+    if isinstance(value, str):
+        return value.format(i=i)
+    if isinstance(value, dict):
+        return {k: _per_index(v, i) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_per_index(v, i) for v in value]
+    return value
+
+
+class ReplicaSpec(object):
+    """
+    Keeps one template process and the per-index overrides of `count`
+    replicas. The concrete processes are only created when the experiment
+    or the process group that owns the replicas is compiled or iterated, so
+    declaring replicas takes constant time and memory.
+    """
+    def __init__(self, template, count, name_fmt='agent-{i}',
+                 args=None, env=None, customize=None):
+        """
+        Args:
+            template: ProcessSpec that every replica copies, its name is not
+                used and it must not belong to an experiment
+            count: number of replicas
+            name_fmt: name of replica i, formatted with i
+            args: arguments appended to the command of each replica, a list
+                whose strings are formatted with i, or a function i -> list
+            env: environment variables of each replica, a dict whose str
+                values are formatted with i, or a function i -> dict
+            customize: function (process, i) called on every new replica
+        """
+        assert count >= 0, 'count must be non-negative'
+        if template.parent_experiment is not None \
+                or template.parent_process_group is not None:
+            raise ValueError('[Error] Replica template {} must not belong to an '
+                             'experiment or a process group'.format(template.name))
+        self.template = template
+        self.count = count
+        self.name_fmt = name_fmt
+        self.args = args
+        self.env = env
+        self.customize = customize
+        self.processes = None  # set once materialized
+
+    def __len__(self):
+        return self.count
+
+    def names(self):
+        """
+        Returns:
+            names of the replicas, without creating them
+        """
+        return [self.name_fmt.format(i=i) for i in range(self.count)]
+
+    def new_replica(self, i):
+        """
+        Returns:
+            new ProcessSpec of replica i, not added to anything
+        """
+        process = self.template._replicate(self.name_fmt.format(i=i))
+        if self.args is not None:
+            process._append_args(list(map(str, _per_index(self.args, i))))
+        if self.env is not None:
+            process.set_envs(_per_index(self.env, i))
+        if self.customize is not None:
+            self.customize(process, i)
+        return process
+
+    def materialize(self):
+        """
+        Returns:
+            list of the concrete replicas, created on the first call
+        """
+        if self.processes is None:
+            self.processes = [self.new_replica(i) for i in range(self.count)]
+        return self.processes
@@ -0,0 +1,146 @@
+"""
+Sharded services: binds({'replay': Shards(8)}) declares the services
+replay-0 ... replay-7. Every process that connects to 'replay' is given one
+shard, picked by consistent hashing with bounded loads of its name, so the
+assignment is the same on every backend, no shard gets much more than its
+share of the connectors and only a fraction of them move when the number of
+shards changes.
+"""
+import bisect
+import functools
+import hashlib
+import math
+
+# points of each shard on the ring, more points spread connectors more evenly
+VIRTUAL_NODES = 128
+# a shard takes at most ceil(connectors / shards * (1 + LOAD_EPSILON)) of them
+LOAD_EPSILON = 0.25
+
+
+class Shards(object):
+    """
+    Port of a sharded service in binds()
+    """
+    __slots__ = ('count', 'index')
+
+    def __init__(self, count, index=None):
+        """
+        Args:
+            count: number of shards of the service
+            index: the only shard the process binds, all of them by default
+        """
+        if not isinstance(count, int) or count < 1:
+            raise ValueError('[Error] Invalid number of shards {}'.format(count))
+        if index is not None and not 0 <= index < count:
+            raise ValueError('[Error] Shard {} out of range [0, {})'.format(index, count))
+        self.count = count
+        self.index = index
+
+    def shard(self, index):
+        """
+        Returns:
+            Shards binding only shard index, e.g. in the customize function
+            of new_replicas
+        """
+        return Shards(self.count, index)
+
+    def indices(self):
+        return range(self.count) if self.index is None else [self.index]
+
+    def dump_dict(self):
+        return {'shards': self.count, 'index': self.index}
+
+    @classmethod
+    def load_dict(cls, di):
+        return cls(di['shards'], di['index'])
+
+    def __eq__(self, other):
+        return isinstance(other, Shards) and \
+            (self.count, self.index) == (other.count, other.index)
+
+    def __hash__(self):
+        return hash((self.count, self.index))
+
+    def __repr__(self):
+        if self.index is None:
+            return 'Shards({})'.format(self.count)
+        return 'Shards({}, index={})'.format(self.count, self.index)
+
+
+def shard_name(service_name, index):
+    return '{}-{}'.format(service_name, index)
+
+
+def expand_shards(services):
+    """
+    Args:
+        services: {service name: port}, ports may be Shards
+
+    Returns:
+        {service name: port} with every bound shard as its own service
+    """
+    if not any(isinstance(port, Shards) for port in services.values()):
+        return services
+    expanded = {}
+    for name, port in services.items():
+        if isinstance(port, Shards):
+            for index in port.indices():
+                expanded[shard_name(name, index)] = None
+        else:
+            expanded[name] = port
+    return expanded
+
+
+def dump_services(services):
+    """
+    Returns:
+        JSON-able copy of {service name: port}
+    """
+    return {name: port.dump_dict() if isinstance(port, Shards) else port
+            for name, port in services.items()}
+
+
+def load_services(services):
+    """
+    Inverse of dump_services
+    """
+    return {name: Shards.load_dict(port) if isinstance(port, dict) else port
+            for name, port in services.items()}
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+@functools.lru_cache(maxsize=64)
+def _ring(service_name, count):
+    """
+    Returns:
+        (sorted points, shard index of each point)
+    """
+    points = sorted((_hash('{}-{}#{}'.format(service_name, index, node)), index)
+                    for index in range(count) for node in range(VIRTUAL_NODES))
+    return [point for point, _ in points], [index for _, index in points]
+
+
+def assign_shards(service_name, count, process_names):
+    """
+    Consistent hashing with bounded loads: in sorted order, every process
+    takes the first shard after its hash on the ring that is not full yet
+
+    Returns:
+        {process name: the shard of service_name it connects to}
+    """
+    names = sorted(process_names)
+    capacity = math.ceil(len(names) / count * (1 + LOAD_EPSILON))
+    points, indices = _ring(service_name, count)
+    loads = [0] * count
+    assignment = {}
+    for name in names:
+        position = bisect.bisect(points, _hash(name))
+        while loads[indices[position % len(points)]] >= capacity:
+            position += 1
+        index = indices[position % len(points)]
+        loads[index] += 1
+        assignment[name] = index
+    return assignment
@@ -4,6 +4,11 @@ import shlex
 from .experiment import SubprocExperimentSpec
 from .manager import SubprocManager
 from symphony.engine import Cluster
+from symphony.engine.events import EventTracker
+from symphony.spec.diff import get_process, process_keys
+from symphony.spec.dependencies import launch_waves
+from symphony.nameservice import NAME_SERVICE
+from symphony.utils.ipc import remove_runtime_dir
 from symphony.errors import *
 
 
@@ -14,6 +19,19 @@ def _logger(verbose):
     return _log
 
 
+def _is_stale_subproc_lease(owner):
+    if not owner.startswith('subproc:'):
+        return False
+    pid = int(owner.split(':')[1])
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:  # alive, another user's
+        pass
+    return False
+
+
 class SubprocCluster(Cluster):
     def __init__(self,
                  stdout_mode='print',
@@ -33,6 +51,8 @@ class SubprocCluster(Cluster):
             stderr_mode=stderr_mode,
             log_dir=log_dir
         )
+        self._experiment_name = None
+        self._spec = None  # spec of the running experiment, for update()
 
     # =================== Private helpers ====================
     def _launch_process(self, name, p, dry_run):
@@ -41,30 +61,145 @@ class SubprocCluster(Cluster):
         else:
             self._manager.launch(name, p.cmd, p.env)
 
+    def _process_name(self, key):
+        group_name, process_name = key
+        if group_name is None:
+            return process_name
+        return group_name + ':' + process_name
+
     def _join(self):
-        self._manager.join(kill_on_error=True)
+        daemons = ()
+        if self._spec is not None and self._spec.name_service:
+            daemons = [NAME_SERVICE]
+        self._manager.join(kill_on_error=True, daemons=daemons)
 
     # ===================== Launch API =======================
     def new_experiment(self, *args, **kwargs):
         return SubprocExperimentSpec(*args, **kwargs)
 
-    def launch(self, spec, dry_run=False, verbose=True):
-        _log = _logger(verbose)
+    def launch(self, spec, dry_run=False, verbose=True, wait_ready=False,
+               ready_timeout=60):
+        """
+        See Cluster.launch, readiness is a TCP connection to the ports the
+        processes of a wave bind. Blocks until all processes exit.
+        """
         assert isinstance(spec, SubprocExperimentSpec)
 
+        if not dry_run:
+            self._lease_ports(spec)
+        try:
+            self._launch(spec, dry_run, verbose, wait_ready, ready_timeout)
+        finally:
+            if not dry_run:
+                self._port_allocator().release(self._lease_owner(spec.name))
+                remove_runtime_dir(spec.name)
+
+    def _launch(self, spec, dry_run, verbose, wait_ready, ready_timeout):
+        _log = _logger(verbose)
         spec.compile()
 
         _log('Creating new Experiment "{}"'.format(spec.name))
+        self._experiment_name = spec.name
+        if not dry_run:
+            self._save_running_spec(spec)
+            self._create_runtime_dir(spec, fresh=True)
 
-        for pg in spec.list_process_groups():
-            _log(' --> Creating process group', pg.name)
-            for p in pg.list_processes():
-                name = pg.name + ':' + p.name
-                self._launch_process(name, p, dry_run=dry_run)
-                _log(' --> --> Created process', name)
-
-        for p in spec.list_processes():
-            self._launch_process(p.name, p, dry_run=dry_run)
-            _log(' --> Created process', p.name)
+        if wait_ready:
+            waves = launch_waves(spec)
+        else:
+            waves = [process_keys(spec)]
+        for i, wave in enumerate(waves):
+            if wait_ready:
+                _log(' --> Launching wave {}/{}'.format(i + 1, len(waves)))
+            for key in wave:
+                name = self._process_name(key)
+                self._launch_process(name, get_process(spec, key), dry_run=dry_run)
+                _log(' --> Created process', name)
+            if wait_ready and not dry_run:
+                try:
+                    self._wait_ready(spec, wave, ready_timeout)
+                except ReadinessTimeoutError:
+                    self._manager.kill_all(verbose=verbose)
+                    raise
 
         self._join()
+
+    def update(self, experiment_spec, old_spec=None, dry_run=False):
+        if dry_run:
+            return super().update(experiment_spec, old_spec=old_spec, dry_run=True)
+        # the update leases under the owner of the launch, the running
+        # processes keep their ports if it fails
+        owner = self._lease_owner(experiment_spec.name)
+        leased = self._port_allocator().leases().get(owner, {})
+        self._lease_ports(experiment_spec)
+        try:
+            return super().update(experiment_spec, old_spec=old_spec)
+        except Exception:
+            added = [name for name in self._port_allocator().leases().get(owner, {})
+                     if name not in leased]
+            self._port_allocator().release(owner, services=added)
+            raise
+
+    def _lease_owner(self, experiment_name):
+        return 'subproc:{}:{}'.format(os.getpid(), experiment_name)
+
+    def _lease_ports(self, spec):
+        """
+        Services get ports leased host-wide until launch() returns. The
+        leases of subproc launches whose python process is gone are released.
+        """
+        allocator = self._port_allocator(spec.port_range)
+        allocator.prune(_is_stale_subproc_lease)
+        spec.use_port_allocator(allocator, owner=self._lease_owner(spec.name))
+
+    def _running_spec(self, experiment_spec):
+        if self._spec is not None and self._spec.name == experiment_spec.name:
+            return self._spec
+        return super()._running_spec(experiment_spec)
+
+    def _save_running_spec(self, experiment_spec):
+        self._spec = experiment_spec
+        super()._save_running_spec(experiment_spec)
+
+    def _apply_changes(self, spec, changes):
+        """
+        Stops removed and restarted processes, then launches restarted and
+        added ones. launch() blocks, so update() is meant to be called from
+        another thread.
+        """
+        if spec.name != self._experiment_name:
+            raise ValueError('Experiment "{}" is not launched by this cluster'
+                             .format(spec.name))
+        self._create_runtime_dir(spec)
+        for key in changes.removed + changes.restarted():
+            name = self._process_name(key)
+            if name in self._manager.processes:
+                self._manager.remove(name)
+        for key in changes.restarted() + changes.added:
+            self._launch_process(self._process_name(key),
+                                 get_process(spec, key), dry_run=False)
+
+    # ===================== Query API ========================
+    def watch_experiment(self, experiment_name, timeout=None):
+        """
+        Reports process exits as they happen, launch() blocks so this is
+        meant to be called from another thread.
+        See Cluster.watch_experiment
+        """
+        if experiment_name != self._experiment_name:
+            raise ValueError('Experiment "{}" is not launched by this cluster'
+                             .format(experiment_name))
+        tracker = EventTracker()
+        for name, retcode in self._manager.watch(timeout=timeout):
+            if ':' in name:
+                process_group_name, process_name = name.split(':', 1)
+            else:
+                process_group_name, process_name = None, name
+            if retcode is None:
+                events = tracker.update(process_group_name, process_name,
+                                        state='running')
+            else:
+                events = tracker.update(process_group_name, process_name,
+                                        state='exited', exit_code=retcode)
+            for event in events:
+                yield event
@@ -1,9 +1,14 @@
 import os
-import copy
+import shlex
+import sys
 from symphony.spec import ExperimentSpec
+from symphony.spec.process import IPC
+from symphony.spec.shards import expand_shards
 from symphony.utils.common import compact_range_dumps, compact_range_loads
 from symphony.utils.common import print_err
 from symphony.engine import AddressBook
+from symphony.nameservice import NAME_SERVICE, server_command
+from symphony.utils.ipc import socket_path
 from .process import SubprocProcessSpec
 from .process_group import SubprocProcessGroupSpec
 
@@ -25,14 +30,27 @@ class SubprocExperimentSpec(ExperimentSpec):
         self.exposed_services = {}
         self.binded_services = {}
 
-    def compile(self):
+    def _name_service_process(self):
+        # the python running symphony, it has the package
+        cmd = ' '.join(shlex.quote(arg) for arg in server_command(sys.executable))
+        return SubprocProcessSpec(NAME_SERVICE, cmd)
+
+    def compile(self, full=False):
         """
-        Compile necessary information before launch
+        Compile necessary information before launch. After the first
+        compile, only the processes changed since the last one are updated,
+        unless services changed or full=True
         """
-        self.address_book = AddressBook()
-
-        self.declare_services()
-        self.assign_addresses()
+        self._expand_replicas()
+        if full or self._services_dirty:
+            self.address_book = AddressBook()
+            self.declare_services()
+            self.assign_addresses()
+        else:
+            processes = list(self._dirty_processes)
+            self.validate_connect(processes)
+            self.set_address_envs(processes)
+        self._clear_dirty()
 
     def assign_addresses(self):
         for exposed_service_name in self.exposed_services:
@@ -40,10 +58,13 @@ class SubprocExperimentSpec(ExperimentSpec):
             self.address_book.add_entry(exposed_service_name, '127.0.0.1', port)
         for binded_service_name in self.binded_services:
             port = self.binded_services[binded_service_name]
-            self.address_book.add_entry(binded_service_name, '127.0.0.1', port)
-        env_dict = self.address_book.dump()
-        for process in self.list_all_processes():
-            process.set_envs(env_dict)
+            if port == IPC:
+                self.address_book.add_ipc_entry(
+                    binded_service_name, socket_path(self.name, binded_service_name))
+            else:
+                self.address_book.add_entry(binded_service_name, '127.0.0.1', port)
+        self._add_shard_entries()
+        self.set_address_envs(self.list_all_processes(), report=True)
 
     def declare_services(self):
         """
@@ -51,46 +72,41 @@ class SubprocExperimentSpec(ExperimentSpec):
         """
         exposed = {}
         binded = {}
-        port_range = copy.deepcopy(self.port_range)
         for process in self.list_all_processes():
-            for exposed_service_name in process.exposed_services:
-                port = process.exposed_services[exposed_service_name]
-                exposed[exposed_service_name] = port
-                if port in self.port_range:
-                    port_range.remove(port)
-
-            for binded_service_name in process.binded_services:
-                port = process.binded_services[binded_service_name]
-                binded[binded_service_name] = port
-                if port in self.port_range:
-                    port_range.remove(port)
-
-        for exposed_service_name, port in exposed.items():
-            if port is None:
-                port = self.get_port(port_range)
-            self.exposed_services[exposed_service_name] = port
+            exposed.update(process.exposed_services)
+            binded.update(expand_shards(process.binded_services))
+        self._declare_shards()
+        services = dict(exposed)
+        services.update((name, port) for name, port in binded.items() if port != IPC)
+        ports = self._allocate_ports(services)
+        for exposed_service_name in exposed:
+            self.exposed_services[exposed_service_name] = ports[exposed_service_name]
         for binded_service_name, port in binded.items():
-            if port is None:
-                port = self.get_port(port_range)
-            self.binded_services[binded_service_name] = port
+            # unix domain sockets have no port, see assign_addresses()
+            self.binded_services[binded_service_name] = \
+                IPC if port == IPC else ports[binded_service_name]
         self.validate_connect()
 
-    def validate_connect(self):
+    def _colocated(self, binder, connector):
+        # all processes run on this host
+        return True
+
+    def validate_connect(self, processes=None):
         """
         Check if all connected services are correctly provided
+
+        Args:
+            processes: processes to check, all by default
         """
-        for process in self.list_all_processes():
+        if processes is None:
+            processes = self.list_all_processes()
+        for process in processes:
             for connected_service_name in process.connected_services:
-                if connected_service_name not in self.binded_services:
+                if connected_service_name not in self.binded_services \
+                        and connected_service_name not in self.sharded_services:
                     raise ValueError('Service {} is connected by process {} but not binded' \
                                      .format(connected_service_name, process.name))
 
-    def get_port(self, port_range):
-        if len(port_range) == 0:
-            raise ValueError('[Error] Experiment {} ran out of ports on Tmux.' \
-                             .format(self.name))
-        return port_range.pop(0)
-
     # def _load_dict(self, di):
     #     super()._load_dict(di)
     #     self.port_range = compact_range_loads(di['port_range'])
@@ -2,7 +2,9 @@
 Manages subprocesses launching and polling
 """
 import os
+import queue
 import subprocess
+import threading
 import time
 import signal
 import sys
@@ -25,6 +27,8 @@ class SubprocManager:
         assert self.stdout_mode in ['print', 'file', 'none']
         assert self.stderr_mode in ['print', 'file', 'none', 'stdout']
         self.processes = {}  # {"name": Popen}
+        self._listeners = []  # queues that receive (name, retcode) on exit
+        self._lock = threading.Lock()
         if stdout_mode == 'file' or stderr_mode == 'file':
             assert log_dir is not None
             self.log_dir = os.path.expanduser(log_dir)
@@ -60,10 +64,8 @@ class SubprocManager:
             stderr = subprocess.DEVNULL
 
         # environment will inherit from parent process
-        assert isinstance(env, dict)
-        for key, value in env.items():
-            if not isinstance(value, str):
-                env[key] = str(value)
+        # env may be a spec's own mapping, never modify it
+        env = {key: str(value) for key, value in env.items()}
         env.update(os.environ)
 
         proc = subprocess.Popen(
@@ -78,8 +80,79 @@ class SubprocManager:
             preexec_fn=os.setsid # put the subprocess in its own process group
         )
         self.processes[name] = proc
+        self._notify(name, None)
+        threading.Thread(target=lambda: self._notify(name, proc.wait()),
+                         daemon=True).start()
         return proc
 
+    def remove(self, name, timeout=5, verbose=False):
+        """
+        Stops a process and forgets it, so that a process of the same name
+        can be launched again. join() does not report it as an error.
+
+        Args:
+            timeout: seconds to wait after SIGTERM before SIGKILL
+        """
+        with self._lock:
+            proc = self.processes.pop(name)
+        if proc.poll() is None:
+            os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
+            try:
+                proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                if verbose:
+                    print('Sent SIGKILL to', name)
+                os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
+                proc.wait()
+
+    def _notify(self, name, retcode):
+        with self._lock:
+            for listener in self._listeners:
+                listener.put((name, retcode))
+
+    def watch(self, timeout=None):
+        """
+        Yields (name, None) when a process is running and (name, retcode)
+        when it exits. Exits are pushed by one waiter thread per process,
+        nothing is polled.
+
+        Args:
+            timeout: stop after this many seconds, None to stop when all
+                processes have exited. Waits for the first process if none
+                is launched yet
+        """
+        listener = queue.Queue()
+        with self._lock:
+            self._listeners.append(listener)
+            for name, proc in self.processes.items():
+                listener.put((name, proc.poll()))
+        deadline = None if timeout is None else time.time() + timeout
+        running, exited = set(), set()
+        try:
+            while True:
+                if deadline is None and exited and not running \
+                        and listener.empty():
+                    return
+                try:
+                    name, retcode = listener.get(
+                        timeout=None if deadline is None
+                        else max(0, deadline - time.time()))
+                except queue.Empty:
+                    return
+                # a process can be reported both by the snapshot above
+                # and by its waiter thread
+                if name in exited or (retcode is None and name in running):
+                    continue
+                if retcode is None:
+                    running.add(name)
+                else:
+                    running.discard(name)
+                    exited.add(name)
+                yield name, retcode
+        finally:
+            with self._lock:
+                self._listeners.remove(listener)
+
     def poll(self, name):
         """
         Returns:
@@ -129,7 +202,7 @@ class SubprocManager:
         self.kill_all(verbose=True)
         sys.exit(0)
 
-    def join(self, kill_on_error=True, poll_interval=1.0):
+    def join(self, kill_on_error=True, poll_interval=1.0, daemons=()):
         """
         Wait for all processes to finish.
         
@@ -137,17 +210,25 @@ class SubprocManager:
             kill_on_error: True to kill all processes if any of them returns
                 non-zero code.
             poll_interval: seconds between polling
+            daemons: names of processes that serve the others (e.g. the
+                name service), stopped once only they are left
         """
         for sig in self.SIG_DICT:
             signal.signal(sig, self._signal_handler)
+        finished = set()  # Popen, a name can be launched again
+        # processes can be added and removed while joining, see remove()
         remaining_procs = list(self.processes.keys())
         while remaining_procs:
             for name in remaining_procs[:]:
-                proc = self.processes[name]
+                proc = self.processes.get(name)
+                if proc is None:  # removed
+                    remaining_procs.remove(name)
+                    continue
                 retcode = proc.poll()
                 if retcode is None:  # process still running normally
                     continue
                 else:
+                    finished.add(proc)
                     remaining_procs.remove(name)
                     if retcode == 0:
                         print('PROCESS "{}" DONE'.format(name))
@@ -159,4 +240,11 @@ class SubprocManager:
                             self.kill_all(verbose=True)
                             remaining_procs = []
                             break
+            else:
+                remaining_procs = [name for name, proc in list(self.processes.items())
+                                   if proc not in finished]
+                if remaining_procs and set(remaining_procs) <= set(daemons):
+                    for name in remaining_procs:
+                        self.remove(name)
+                    remaining_procs = []
             time.sleep(poll_interval)
@@ -1,8 +1,13 @@
-import os
+import shlex
+import sys
 from symphony.spec import ProcessSpec
+from symphony.spec.base import marks_dirty
+from symphony.spec.process import EMPTY_MAPPING
 
 
 class SubprocProcessSpec(ProcessSpec):
+    __slots__ = ('cmd', 'env')
+
     def __init__(self, name, cmd):
         """
         Args:
@@ -11,21 +16,50 @@ class SubprocProcessSpec(ProcessSpec):
         """
         super().__init__(name)
         self.cmd = cmd
-        self.env = {}
+        self.env = EMPTY_MAPPING
 
+    @marks_dirty
     def set_envs(self, env):
         """
         Set environment variables
         Args:
             env: dict
         """
-        self.env.update(env)
+        if not env:
+            return
+        if self.env is EMPTY_MAPPING:
+            self.env = {}
+        for k, v in env.items():
+            self.env[sys.intern(k)] = v
+
+    @marks_dirty
+    def _append_args(self, args):
+        self.cmd = ' '.join([self.cmd] + [shlex.quote(arg) for arg in args])
+
+    def _drop_envs(self, drop):
+        names = [name for name in self.env if drop(name)]
+        if names:
+            self._mark_dirty()
+        for name in names:
+            del self.env[name]
+
+    def _diff_parts(self):
+        return self.dump_dict(), dict(self.env)
+
+    @classmethod
+    def load_dict(cls, di):
+        instance = cls(di['name'], di['cmd'])
+        instance._load_dict(di)
+        return instance
 
     def _load_dict(self, di):
         super()._load_dict(di)
         self.cmd = di['cmd']
+        self.env = EMPTY_MAPPING
+        self.set_envs(di.get('env', {}))
 
     def dump_dict(self):
         di = super().dump_dict()
         di['cmd'] = self.cmd
+        di['env'] = dict(self.env)
         return di
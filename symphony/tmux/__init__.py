@@ -1,4 +1,5 @@
 from .cluster import TmuxCluster
+from .async_cluster import TmuxAsyncCluster
 from .process import TmuxProcessSpec
 from .process_group import TmuxProcessGroupSpec
 from .experiment import TmuxExperimentSpec
@@ -0,0 +1,87 @@
+import shlex
+from symphony.engine import AsyncCluster
+import symphony.utils.runner as runner
+
+
+class TmuxAsyncCluster(AsyncCluster):
+    """
+    Queries the tmux server with asyncio subprocesses instead of libtmux,
+    which blocks on every call.
+    """
+    def _tmux_cmd(self, *args):
+        return ' '.join(['tmux', '-L', shlex.quote(self.cluster._socket_name)]
+                        + [shlex.quote(arg) for arg in args])
+
+    async def _run_tmux(self, *args):
+        out, err, retcode = await runner.run_async(self._tmux_cmd(*args))
+        return out, retcode
+
+    async def _list_windows(self, session_name):
+        """
+        Returns:
+            list of (window_id, window_name)
+        """
+        out, retcode = await self._run_tmux(
+            'list-windows', '-t', '=' + session_name,
+            '-F', '#{window_id} #{window_name}')
+        if retcode != 0:
+            raise ValueError('Experiment "{}" does not exist'.format(session_name))
+        windows = []
+        for line in out.split('\n'):
+            if line:
+                window_id, window_name = line.split(' ', 1)
+                windows.append((window_id, window_name))
+        return windows
+
+    async def _get_window_id(self, session_name, process_name, group_name=None):
+        window_name = self.cluster._get_window_name(process_name, group_name)
+        for window_id, name in await self._list_windows(session_name):
+            if name == window_name:
+                return window_id
+        raise ValueError('Process "{}" does not exist'.format(window_name))
+
+    # ===================== Query API ========================
+    async def list_experiments(self):
+        out, retcode = await self._run_tmux(
+            'list-sessions', '-F', '#{session_name}')
+        if retcode != 0:  # no server running
+            return []
+        return [name for name in out.split('\n') if name]
+
+    async def describe_experiment(self, experiment_name):
+        if experiment_name is None:
+            experiment_name = await self.current_experiment()
+        windows = await self._list_windows(experiment_name)
+        return self.cluster._parse_window_names([name for _, name in windows])
+
+    async def describe_process_group(self,
+                                     experiment_name,
+                                     process_group_name):
+        return (await self.describe_experiment(experiment_name))[process_group_name]
+
+    async def describe_process(self,
+                               experiment_name,
+                               process_name,
+                               process_group_name=None):
+        if experiment_name is None:
+            experiment_name = await self.current_experiment()
+        await self._get_window_id(experiment_name, process_name,
+                                  group_name=process_group_name)
+        return {
+                'status': 'live',
+        }
+
+    async def get_log(self, experiment_name, process_name, process_group=None,
+                      follow=False, since=None, tail=None, print_logs=False):
+        if experiment_name is None:
+            experiment_name = await self.current_experiment()
+        window_id = await self._get_window_id(experiment_name, process_name,
+                                              group_name=process_group)
+        command = ['capture-pane', '-p', '-t', window_id]
+        if tail:
+            command.extend(['-S', str(-abs(tail))])
+        out, _ = await self._run_tmux(*command)
+        stdout = out.split('\n') if out else []
+        if print_logs:
+            print('\n'.join(stdout))
+        return stdout
@@ -4,12 +4,27 @@ import libtmux
 import shlex
 from libtmux.exc import LibTmuxException
 from symphony.engine import Cluster
+from symphony.engine.events import EventTracker
+import symphony.utils.runner as runner
 from symphony.tmux.experiment import TmuxExperimentSpec
+from symphony.spec.diff import get_process, process_keys
+from symphony.spec.dependencies import launch_waves
+from symphony.utils.ipc import create_runtime_dir, remove_runtime_dir
 from symphony.errors import *
 
 
 _SERVER_NAME = '__symphony__'
 _DEFAULT_WINDOW = '__main__'
+# bytes of tmux commands sent in one call (see _tmux_batch), the commands of
+# a tmux client must fit in a 16KB message
+_BATCH_BYTES = 8192
+# pane option holding the launch state of the shell of a window: 'ready'
+# once it reads its input, 'started' once it runs its launch script
+_STATE_OPTION = '@symphony_launch'
+
+
+def _set_state_cmd(state):
+    return 'tmux set-option -p -t "$TMUX_PANE" {} {}'.format(_STATE_OPTION, state)
 
 
 def _logger(verbose):
@@ -65,74 +80,207 @@ class TmuxCluster(Cluster):
             pass
         return self._tmux.new_session(session_name)
 
-    def _create_process(self, sess, process, preamble_cmds, process_group=None,
-                        timeout=4):
-        if process_group:
-            window_name = ':'.join((process_group.name, process.name))
-        else:
-            window_name = process.name
-        window = sess.new_window(window_name=window_name)
-
-        # Retry loop to make sure we run process commands after
-        # shell starts (heuristically checked by ensuring pane has
-        # some output in the buffer).
-        env_cmds = ['export {}={}'.format(k,shlex.quote(v)) for k,v in process.env.items()]
-        cmds = env_cmds + preamble_cmds + process.cmds
-        if cmds:
-            start_time = time.time()
-            pane = window.attached_pane
-            while time.time() < start_time + timeout:
-                stdout = pane.cmd('capture-pane', '-p').stdout
-                if stdout:
-                    for cmd in cmds:
-                        pane.send_keys(cmd)
-                    break
-                time.sleep(0.2)
-
-    def _send_cmd(self, experiment_name, process, process_group_name=None):
-        window = self._get_window(experiment_name, process.name,
-                                  group_name=process_group_name)
-        pane = window.attached_pane
-        if process.cmds:
-            for cmd in process.cmds:
-                pane.send_keys(cmd)
+    def _tmux_batch(self, cmds):
+        """
+        Runs tmux commands in as few tmux calls as possible, joined with
+        ";" up to _BATCH_BYTES per call
+
+        Args:
+            cmds: list of argument lists
+
+        Returns:
+            stdout lines of all the commands
+        """
+        stdout = []
+        batch, size = [], 0
+        for cmd in cmds + [None]:
+            cmd_size = 0 if cmd is None else sum(len(arg) + 1 for arg in cmd) + 2
+            if batch and (cmd is None or size + cmd_size > _BATCH_BYTES):
+                result = self._tmux.cmd(*batch)
+                if result.stderr:
+                    raise LibTmuxException(result.stderr)
+                stdout.extend(result.stdout)
+                batch, size = [], 0
+            if cmd is not None:
+                batch.extend(([';'] if batch else []) + cmd)
+                size += cmd_size
+        return stdout
+
+    def _launch_script(self, spec, process, window_name):
+        """
+        Writes the env, preamble and commands of a process to a script in
+        the runtime folder of the experiment. The script prints each command
+        before running it, so that the log of the window shows them
+
+        Returns:
+            path of the script, None if there is nothing to run
+        """
+        lines = ['export {}={}'.format(k, shlex.quote(v)) for k, v in process.env.items()]
+        for cmd in self._preamble_cmds(spec, process) + process.cmds:
+            lines += ['printf "%s\\n" {}'.format(shlex.quote(cmd)), cmd]
+        if not lines:
+            return None
+        lines.insert(0, _set_state_cmd('started'))
+        folder = os.path.join(create_runtime_dir(spec.name), 'launch')
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        path = os.path.join(folder, window_name.replace(':', '.') + '.sh')
+        with open(path, 'w') as f:
+            f.write(''.join(line + '\n' for line in lines))
+        return path
+
+    def _pane_states(self, session_name):
+        """
+        Returns:
+            {pane id: launch state} of the session, see _STATE_OPTION, with
+            one tmux call
+        """
+        states = {}
+        for line in self._tmux.cmd('list-panes', '-s', '-t', '=' + session_name, '-F',
+                                   '#{pane_id} #{%s}' % _STATE_OPTION).stdout:
+            pane_id, _, state = line.partition(' ')
+            states[pane_id] = state
+        return states
+
+    def _create_processes(self, sess, spec, keys, timeout=60):
+        """
+        Creates the windows of the processes of keys in one batch of tmux
+        commands. Each shell is sent a command setting its state to 'ready',
+        which it runs once its startup files are read and it waits for
+        input. It is then sent the launch script of its process (see
+        _launch_script), which sets the state to 'started'. Returns when
+        every script started.
+
+        Raises:
+            ReadinessTimeoutError if no shell gets ready or starts its script
+            for timeout seconds, e.g. their startup files hang
+        """
+        session_name = sess.name  # every access is a tmux call
+        window_names = [self._get_window_name(process_name, group_name)
+                        for group_name, process_name in keys]
+        pane_ids = self._tmux_batch([
+            ['new-window', '-t', '={}:'.format(session_name), '-n', window_name,
+             '-P', '-F', '#{pane_id}'] for window_name in window_names])
+        scripts = {}  # {pane id: launch script}
+        for pane_id, key, window_name in zip(pane_ids, keys, window_names):
+            script = self._launch_script(spec, get_process(spec, key), window_name)
+            if script is not None:
+                scripts[pane_id] = script
+        self._tmux_batch([cmd for pane_id in scripts for cmd in [
+            ['send-keys', '-t', pane_id, '-l', _set_state_cmd('ready')],
+            ['send-keys', '-t', pane_id, 'Enter']]])
+
+        unsent = dict(scripts)
+        # shells of many windows start one after the other, only a launch
+        # that stops making progress fails
+        deadline = time.time() + timeout
+        while scripts:
+            states = self._pane_states(session_name)
+            ready = [pane_id for pane_id in unsent if states.get(pane_id) == 'ready']
+            started = [pane_id for pane_id in scripts
+                       if states.get(pane_id) == 'started']
+            if ready or started:
+                deadline = time.time() + timeout
+            elif time.time() > deadline:
+                raise ReadinessTimeoutError(
+                    '[Error] The shells of {} windows of experiment {} did not '
+                    'start in {}s'.format(len(scripts), session_name, timeout))
+            for pane_id in started:
+                del scripts[pane_id]
+            cmds = []
+            for pane_id in ready:
+                cmds.append(['send-keys', '-t', pane_id, '-l',
+                             '. ' + shlex.quote(unsent.pop(pane_id))])
+                cmds.append(['send-keys', '-t', pane_id, 'Enter'])
+            self._tmux_batch(cmds)
+            if scripts:
+                time.sleep(0.05)
 
     # ===================== Launch API =======================
     def new_experiment(self, *args, **kwargs):
         return TmuxExperimentSpec(*args, **kwargs)
 
-    def launch(self, spec, dry_run=False, verbose=True):
+    def launch(self, spec, dry_run=False, verbose=True, wait_ready=False,
+               ready_timeout=60):
+        """
+        See Cluster.launch, readiness is a TCP connection to the ports the
+        processes of a wave bind
+        """
         _log = _logger(verbose)
         assert isinstance(spec, TmuxExperimentSpec)
 
-        spec.compile()
-
-        # Create a new session for the given Experiment.
+        # Create a new session for the given Experiment. It exists before
+        # ports are leased, see _lease_ports()
         if not dry_run:
             sess = self._new_session(spec.name)
             # Change the name of the default window.
             sess.windows[0].rename_window(_DEFAULT_WINDOW)
+            try:
+                self._lease_ports(spec)
+                spec.compile()
+                self._create_runtime_dir(spec, fresh=True)
+            except Exception:
+                self.delete(spec.name)
+                raise
+        else:
+            spec.compile()
         _log('Creating new Experiment "{}"'.format(spec.name))
 
-        # Create a window for each process group and lone process.
-        for pg in spec.list_process_groups():
-            preamble_cmds = spec.preamble_cmds + pg.preamble_cmds
-            _log(' --> Creating process group', pg.name)
-            for p in pg.list_processes():
-                window_name = ':'.join((pg.name, p.name))
-                if not dry_run:
-                    self._create_process(sess, p, preamble_cmds,
-                                         process_group=pg)
-                _log(' --> --> Created process', window_name)
-
-        for p in spec.list_processes():
+        # Create a window for each process, in dependency order if waiting
+        if wait_ready:
+            waves = launch_waves(spec)
+        else:
+            waves = [process_keys(spec)]
+        for i, wave in enumerate(waves):
+            if wait_ready:
+                _log(' --> Launching wave {}/{}'.format(i + 1, len(waves)))
             if not dry_run:
-                self._create_process(sess, p, spec.preamble_cmds)
-            _log(' --> Created process', p.name)
+                self._create_processes(sess, spec, wave)
+            for key in wave:
+                _log(' --> Created process', self._get_window_name(key[1], key[0]))
+            if wait_ready and not dry_run:
+                self._wait_ready(spec, wave, ready_timeout)
+        if not dry_run:
+            self._save_running_spec(spec)
 
-    def launch_batch(self, experiment_specs):
-        for exp in experiment_specs:
-            self.launch(exp)
+    def update(self, experiment_spec, old_spec=None, dry_run=False):
+        if not dry_run:
+            self._lease_ports(experiment_spec)
+        return super().update(experiment_spec, old_spec=old_spec, dry_run=dry_run)
+
+    def _lease_owner(self, experiment_name):
+        return 'tmux:{}:{}'.format(self._socket_name, experiment_name)
+
+    def _lease_ports(self, spec):
+        """
+        Services get ports leased host-wide. The leases of the experiments
+        of this server whose session is gone are released.
+        """
+        allocator = self._port_allocator(spec.port_range)
+        prefix = self._lease_owner('')
+        sessions = set(self.list_experiments())
+        allocator.prune(lambda owner: owner.startswith(prefix)
+                        and owner[len(prefix):] not in sessions)
+        spec.use_port_allocator(allocator, owner=self._lease_owner(spec.name))
+
+    def _preamble_cmds(self, spec, process):
+        preamble_cmds = spec.preamble_cmds
+        process_group = process.parent_process_group
+        if process_group is not None:
+            preamble_cmds = preamble_cmds + process_group.preamble_cmds
+        return preamble_cmds
+
+    def _apply_changes(self, spec, changes):
+        """
+        Kills the windows of removed and restarted processes, then creates
+        windows for restarted and added ones. Other windows are untouched.
+        """
+        sess = self._get_session(spec.name)
+        self._create_runtime_dir(spec)
+        killed = {self._get_window_name(process_name, group_name)
+                  for group_name, process_name in changes.removed + changes.restarted()}
+        self._tmux_batch([['kill-window', '-t', window.id] for window in sess.windows
+                          if window.name in killed])
+        self._create_processes(sess, spec, changes.restarted() + changes.added)
 
     # ===================== Action API =======================
     def delete(self, experiment_name):
@@ -140,10 +288,8 @@ class TmuxCluster(Cluster):
             experiment_name = self.current_experiment()
         sess = self._get_session(experiment_name)
         sess.kill_session()
-
-    def delete_batch(self, experiments):
-        for exp in experiments:
-            self.delete(exp)
+        self._port_allocator().release(self._lease_owner(experiment_name))
+        remove_runtime_dir(experiment_name)
 
     def transfer_file(self, experiment_name, src, dest):
         """
@@ -220,15 +366,17 @@ class TmuxCluster(Cluster):
         if experiment_name is None:
             experiment_name = self.current_experiment()
         sess = self._get_session(experiment_name)
+        return self._parse_window_names([window.name for window in sess.windows])
+
+    def _parse_window_names(self, window_names):
+        """
+        Maps the window names of a session to the describe_experiment format
+        """
         result = dict()
-        for window in sess.windows:
-            if window.name == _DEFAULT_WINDOW:
+        for window_name in window_names:
+            if window_name == _DEFAULT_WINDOW:
                 continue
-            tokens = window.name.split(':')
-            if len(tokens) == 1:
-                group, process = None, tokens[0]
-            else:
-                group, process = tokens[0], tokens[1]
+            group, process = self._split_window_name(window_name)
             result[group] = result.get(group, dict())
             # TODO: Add other attributes available from tmux
             result[group][process] = {
@@ -236,6 +384,67 @@ class TmuxCluster(Cluster):
             }
         return result
 
+    def _split_window_name(self, window_name):
+        """
+        Returns:
+            (group, process), inverse of _get_window_name
+        """
+        tokens = window_name.split(':')
+        if len(tokens) == 1:
+            return None, tokens[0]
+        else:
+            return tokens[0], tokens[1]
+
+    def watch_experiment(self, experiment_name, timeout=None):
+        """
+        Attaches a read-only control mode client (tmux -C) to the session of
+        the experiment, tmux then notifies every window added or closed.
+        Processes run inside a shell, so window closing is the only exit
+        tmux can report: it is yielded as DELETED.
+        See Cluster.watch_experiment
+        """
+        sess = self._get_session(experiment_name)
+        tracker = EventTracker()
+        windows = {}  # {window_id: (group, process)}
+
+        def _add(window_id, window_name):
+            if window_name == _DEFAULT_WINDOW:
+                return []
+            windows[window_id] = self._split_window_name(window_name)
+            return tracker.update(*windows[window_id], state='running')
+
+        def _remove(window_id):
+            if window_id not in windows:
+                return []
+            return tracker.remove(*windows.pop(window_id))
+
+        for window in sess.windows:
+            for event in _add(window.id, window.name):
+                yield event
+
+        cmd = ['tmux', '-L', self._socket_name, '-C',
+               'attach-session', '-r', '-t', '=' + experiment_name]
+        for line in runner.stream_lines(cmd, timeout=timeout):
+            tokens = line.split(' ', 2)
+            if tokens[0] == '%window-add':
+                name = self._tmux.cmd('display-message', '-p', '-t', tokens[1],
+                                      '#{window_name}').stdout
+                events = _add(tokens[1], name[0]) if name else []
+            elif tokens[0] == '%window-renamed' and len(tokens) == 3:
+                events = _remove(tokens[1]) + _add(tokens[1], tokens[2])
+            elif tokens[0] in ('%window-close', '%unlinked-window-close'):
+                events = _remove(tokens[1])
+            elif tokens[0] == '%exit':  # session is killed
+                events = []
+                for window_id in list(windows):
+                    events.extend(_remove(window_id))
+            else:
+                continue
+            for event in events:
+                yield event
+            if tokens[0] == '%exit':
+                return
+
     def describe_process_group(self,
                                experiment_name,
                                process_group_name):
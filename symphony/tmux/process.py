@@ -1,10 +1,16 @@
 import os
+import shlex
+import sys
 from symphony.spec import ProcessSpec
+from symphony.spec.base import marks_dirty
+from symphony.spec.process import EMPTY_MAPPING
 from symphony.utils.common import print_err
 from .common import tmux_name_check
 
 
 class TmuxProcessSpec(ProcessSpec):
+    __slots__ = ('start_dir', 'cmds', 'env')
+
     def __init__(self, name, cmds=None, start_dir=None):
         """
         Args:
@@ -24,24 +30,52 @@ class TmuxProcessSpec(ProcessSpec):
             self.cmds = [cmds]
         else:
             self.cmds = list(cmds)
-        self.env = {}
+        self.env = EMPTY_MAPPING
 
+    @marks_dirty
     def set_envs(self, di):
         """
         Set environment variables
         Args:
             di(env_var_name(str): env_var_val(str))
         """
+        if not di:
+            return
+        if self.env is EMPTY_MAPPING:
+            self.env = {}
         for k, v in di.items():
-            self.env[k] = str(v)
+            self.env[sys.intern(k)] = str(v)
+
+    def _replicate(self, name, shared=()):
+        tmux_name_check(name, 'Process')
+        return super()._replicate(name, shared=shared)
+
+    @marks_dirty
+    def _append_args(self, args):
+        assert self.cmds, 'TmuxProcess {} has no command to append args to'.format(self.name)
+        self.cmds[-1] = ' '.join([self.cmds[-1]] + [shlex.quote(arg) for arg in args])
+
+    def _drop_envs(self, drop):
+        names = [name for name in self.env if drop(name)]
+        if names:
+            self._mark_dirty()
+        for name in names:
+            del self.env[name]
+
+    def _diff_parts(self):
+        di = self.dump_dict()
+        return di, di.pop('env')
 
     def _load_dict(self, di):
         super()._load_dict(di)
         self.start_dir = di['start_dir']
         self.cmds = di['cmds']
+        self.env = EMPTY_MAPPING
+        self.set_envs(di.get('env', {}))
 
     def dump_dict(self):
         di = super().dump_dict()
         di['start_dir'] = self.start_dir
         di['cmds'] = self.cmds
+        di['env'] = dict(self.env)
         return di
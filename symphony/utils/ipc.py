@@ -0,0 +1,36 @@
+"""
+Runtime directories of experiments on local backends, where services bound
+with binds({'name': 'ipc'}) have their unix domain sockets
+"""
+import getpass
+import os
+import shutil
+import tempfile
+
+# sun_path is 108 bytes on Linux, 104 on macOS
+MAX_SOCKET_PATH = 104
+
+
+def runtime_dir(experiment_name):
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(base, 'symphony-{}'.format(getpass.getuser()),
+                        experiment_name)
+
+
+def socket_path(experiment_name, service_name):
+    path = os.path.join(runtime_dir(experiment_name), service_name + '.sock')
+    if len(path) >= MAX_SOCKET_PATH:
+        raise ValueError('[Error] Socket path {} of service {} is too long for a '
+                         'unix domain socket, use a shorter experiment or '
+                         'service name'.format(path, service_name))
+    return path
+
+
+def create_runtime_dir(experiment_name):
+    path = runtime_dir(experiment_name)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def remove_runtime_dir(experiment_name):
+    shutil.rmtree(runtime_dir(experiment_name), ignore_errors=True)
@@ -0,0 +1,155 @@
+"""
+Incremental index over names for fuzzy matching
+"""
+import bisect
+from symphony.utils.common import deduplicate_with_order
+
+
+_GRAM = 3
+
+
+def _grams(name):
+    return {name[i:i+_GRAM] for i in range(len(name) - _GRAM + 1)}
+
+
+class NameIndex(object):
+    """
+    Indexes a set of (name, tag) entries so that prefix, suffix and
+    substring queries do not rescan all names. Every query returns names
+    sorted alphabetically.
+
+    - prefix: bisect over the sorted names
+    - suffix: bisect over the sorted reversed names
+    - substring: intersection of trigram posting sets, then verification.
+      Queries shorter than a trigram fall back to one pass over the
+      (already sorted) names.
+
+    Tags allow one name to appear several times, e.g. a process name that
+    exists in more than one process group.
+    """
+    def __init__(self, entries=None):
+        """
+        Args:
+            entries: iterable of names or (name, tag) pairs
+        """
+        self._tags = {}  # {name: set(tags)}
+        self._sorted = []
+        self._reversed = []
+        self._grams = {}  # {trigram: set(names)}
+        if entries is not None:
+            self.sync(entries)
+
+    def __len__(self):
+        return len(self._tags)
+
+    def __contains__(self, name):
+        return name in self._tags
+
+    def names(self):
+        return list(self._sorted)
+
+    def tags(self, name):
+        """
+        Returns:
+            tags of name, sorted by their string representation
+        """
+        return sorted(self._tags.get(name, ()), key=str)
+
+    # ====================== updates =========================
+    def add(self, name, tag=None):
+        tags = self._tags.get(name)
+        if tags is not None:
+            tags.add(tag)
+            return
+        self._tags[name] = {tag}
+        bisect.insort(self._sorted, name)
+        bisect.insort(self._reversed, name[::-1])
+        for gram in _grams(name):
+            self._grams.setdefault(gram, set()).add(name)
+
+    def remove(self, name, tag=None):
+        tags = self._tags.get(name)
+        if tags is None:
+            return
+        tags.discard(tag)
+        if tags:
+            return
+        del self._tags[name]
+        del self._sorted[bisect.bisect_left(self._sorted, name)]
+        del self._reversed[bisect.bisect_left(self._reversed, name[::-1])]
+        for gram in _grams(name):
+            posting = self._grams[gram]
+            posting.discard(name)
+            if not posting:
+                del self._grams[gram]
+
+    def sync(self, entries):
+        """
+        Adds and removes entries so that the index holds exactly @entries.
+        Only the difference with the current content is applied.
+
+        Args:
+            entries: iterable of names or (name, tag) pairs
+        """
+        new = set()
+        for entry in entries:
+            if isinstance(entry, tuple):
+                new.add(entry)
+            else:
+                new.add((entry, None))
+        old = {(name, tag) for name, tags in self._tags.items() for tag in tags}
+        for name, tag in old - new:
+            self.remove(name, tag)
+        for name, tag in new - old:
+            self.add(name, tag)
+
+    # ====================== queries =========================
+    def startswith(self, prefix):
+        out = []
+        start = bisect.bisect_left(self._sorted, prefix)
+        for name in self._sorted[start:]:
+            if not name.startswith(prefix):
+                break
+            out.append(name)
+        return out
+
+    def endswith(self, suffix):
+        reversed_suffix = suffix[::-1]
+        out = []
+        start = bisect.bisect_left(self._reversed, reversed_suffix)
+        for reversed_name in self._reversed[start:]:
+            if not reversed_name.startswith(reversed_suffix):
+                break
+            out.append(reversed_name[::-1])
+        return sorted(out)
+
+    def contains(self, substring):
+        if len(substring) < _GRAM:
+            return [name for name in self._sorted if substring in name]
+        postings = []
+        for gram in _grams(substring):
+            posting = self._grams.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+        return sorted(name for name in candidates if substring in name)
+
+    def fuzzy_match(self, *queries):
+        """
+        Precedence-ordered matches: names starting with each of @queries in
+        turn, then names ending with the last query, then names containing
+        it. Duplicates keep their first (highest precedence) position.
+
+        Returns:
+            list of names
+        """
+        matches = []
+        for query in queries:
+            matches += self.startswith(query)
+        matches += self.endswith(queries[-1])
+        matches += self.contains(queries[-1])
+        return deduplicate_with_order(matches)
@@ -0,0 +1,250 @@
+"""
+Port utilities for local backends
+"""
+import fcntl
+import getpass
+import json
+import os
+import socket
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def wait_for_port(host, port, timeout=60., interval=0.1):
+    """
+    Waits until a TCP port accepts connections
+
+    Args:
+        timeout: seconds to wait, None to wait forever
+        interval: seconds between two connection attempts
+
+    Returns:
+        True if the port accepts connections, False on timeout
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=interval or None):
+                return True
+        except OSError:
+            pass
+        if deadline is not None and time.time() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+def wait_for_unix_socket(path, timeout=60., interval=0.1):
+    """
+    Waits until a unix domain socket accepts connections
+
+    Returns:
+        True if the socket accepts connections, False on timeout
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(interval or None)
+            sock.connect(path)
+            return True
+        except OSError:
+            pass
+        finally:
+            sock.close()
+        if deadline is not None and time.time() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+def wait_for_ports(addresses, timeout=60., interval=0.1):
+    """
+    Waits for several ports with a single deadline
+
+    Args:
+        addresses: {name: (host, port) or unix domain socket path}
+
+    Returns:
+        names of the addresses that did not accept connections in time
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    not_ready = []
+    for name, address in addresses.items():
+        remaining = None if deadline is None else max(0., deadline - time.time())
+        if isinstance(address, str):
+            ready = wait_for_unix_socket(address, timeout=remaining, interval=interval)
+        else:
+            host, port = address
+            ready = wait_for_port(host, port, timeout=remaining, interval=interval)
+        if not ready:
+            not_ready.append(name)
+    return not_ready
+
+
+DEFAULT_PORT_RANGE = range(7000, 9000)
+
+
+def default_lease_file():
+    """
+    Returns:
+        lease file shared by all experiments of the user on this host
+    """
+    return os.path.join(tempfile.gettempdir(),
+                        'symphony_port_leases_{}.json'.format(getpass.getuser()))
+
+
+def is_port_free(port, host='127.0.0.1'):
+    """
+    Returns:
+        True if nothing listens on port, checked by binding it
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind((host, port))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class PortAllocator(object):
+    """
+    Leases ports of a range to owners (experiments), one port per service.
+    Taken ports are a bitset, so finding a free port does not scan a list.
+
+    Without a lease file, leases are kept in memory and only this allocator
+    knows them. With a lease file, every lease on the host goes through the
+    file under an exclusive lock, so concurrent experiments never get the
+    same port. Leases are kept until released, see release().
+    """
+    def __init__(self, port_range=DEFAULT_PORT_RANGE, lease_file=None,
+                 check_free=None):
+        """
+        Args:
+            port_range: ports to hand out
+            lease_file: path of the host-wide lease file, None to keep
+                leases in memory
+            check_free: skip ports that something else listens on, by
+                default only with a lease file
+        """
+        ports = sorted(set(port_range))
+        if not ports:
+            raise ValueError('[Error] Empty port range')
+        self._first = ports[0]
+        if ports[-1] - ports[0] + 1 == len(ports):
+            self._range_mask = (1 << len(ports)) - 1
+        else:
+            self._range_mask = 0
+            for port in ports:
+                self._range_mask |= 1 << (port - self._first)
+        self.lease_file = lease_file
+        self.check_free = lease_file is not None if check_free is None else check_free
+        self._leases = {}  # {owner: {service: port}}, without a lease file
+
+    @contextmanager
+    def _locked_leases(self):
+        """
+        Yields {owner: {service: port}}, changes are saved on exit
+        """
+        if self.lease_file is None:
+            yield self._leases
+            return
+        lock_file = self.lease_file + '.lock'
+        with open(lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.lease_file) as f:
+                        leases = json.load(f)
+                except (IOError, ValueError):  # missing or corrupted
+                    leases = {}
+                yield leases
+                tmp_file = '{}.{}.tmp'.format(self.lease_file, os.getpid())
+                with open(tmp_file, 'w') as f:
+                    json.dump(leases, f)
+                os.replace(tmp_file, self.lease_file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _bit(self, port):
+        offset = port - self._first
+        return 1 << offset if 0 <= offset else 0
+
+    def lease(self, owner, services, exclude=()):
+        """
+        Args:
+            owner: e.g. the experiment name
+            services: {service name: port, or None for any free port}. A
+                service the owner already leased keeps its port.
+            exclude: ports not to hand out
+
+        Returns:
+            {service name: port}
+        """
+        with self._locked_leases() as leases:
+            owned = leases.setdefault(owner, {})
+            taken = 0
+            for ports in leases.values():
+                for port in ports.values():
+                    taken |= self._bit(port)
+            for port in exclude:
+                taken |= self._bit(port)
+            for name, port in services.items():
+                if port is not None:
+                    owned[name] = port
+                    taken |= self._bit(port)
+            result = {}
+            for name, port in services.items():
+                if port is None:
+                    port = owned.get(name)
+                if port is None:
+                    port, taken = self._next_free(taken)
+                    owned[name] = port
+                result[name] = port
+            return result
+
+    def _next_free(self, taken):
+        """
+        Returns:
+            (lowest free port, taken with that port)
+        """
+        while True:
+            free = self._range_mask & ~taken
+            if not free:
+                raise ValueError('[Error] Ran out of ports in [{}, {}]'.format(
+                    self._first, self._first + self._range_mask.bit_length() - 1))
+            lowest = free & -free
+            taken |= lowest
+            port = self._first + lowest.bit_length() - 1
+            if not self.check_free or is_port_free(port):
+                return port, taken
+
+    def release(self, owner, services=None):
+        """
+        Releases all the ports of owner, or only the ones of services
+        """
+        with self._locked_leases() as leases:
+            if services is None:
+                leases.pop(owner, None)
+                return
+            owned = leases.get(owner, {})
+            for name in services:
+                owned.pop(name, None)
+
+    def prune(self, is_stale):
+        """
+        Releases the ports of the owners for which is_stale(owner) is True,
+        e.g. experiments that ended without releasing theirs
+        """
+        with self._locked_leases() as leases:
+            for owner in [owner for owner in leases if is_stale(owner)]:
+                del leases[owner]
+
+    def leases(self):
+        """
+        Returns:
+            {owner: {service name: port}}
+        """
+        with self._locked_leases() as leases:
+            return {owner: dict(ports) for owner, ports in leases.items()}
@@ -1,5 +1,9 @@
+import codecs
+import json
 import subprocess as pc
 import os
+import selectors
+import time
 from symphony.utils.common import print_err
 
 
@@ -11,12 +15,20 @@ def run_process(cmd, stdin=''):
     return out.decode('utf-8'), err.decode('utf-8'), proc.returncode
 
 
-def run(cmd, dry_run=False, stdin=''):
+def run(cmd, dry_run=False, stdin='', throttle=None):
+    """
+    Args:
+        throttle: symphony.utils.throttle.Throttle that rate limits the
+            command and retries it on transient failures
+    """
     if dry_run:
         print(cmd)
         return '', '', 0
     else:
-        out, err, retcode = run_process(cmd, stdin)
+        if throttle is None:
+            out, err, retcode = run_process(cmd, stdin)
+        else:
+            out, err, retcode = throttle.run_command(run_process, cmd, stdin)
         if 'could not find default credentials' in err:
             print("Please try `gcloud container clusters get-credentials mycluster` "
                   "to fix credential error")
@@ -47,8 +59,157 @@ def _print_err_return(out, err, retcode):
     print_err('*' * 46)
 
 
-def run_verbose(cmd, print_out=True, raise_on_error=False, dry_run=False, stdin=''):
-    out, err, retcode = run(cmd, dry_run=dry_run, stdin=stdin)
+def run_verbose(cmd, print_out=True, raise_on_error=False, dry_run=False, stdin='',
+                throttle=None):
+    out, err, retcode = run(cmd, dry_run=dry_run, stdin=stdin, throttle=throttle)
+    if retcode != 0:
+        _print_err_return(out, err, retcode)
+        msg = 'Command `{}` fails'.format(cmd)
+        if raise_on_error:
+            raise RuntimeError(msg)
+        else:
+            print_err(msg)
+    elif out and print_out:
+        print(out)
+    return out, err, retcode
+
+
+# ========================================================
+# ================== streaming commands ==================
+# ========================================================
+
+def stream_process(cmd, timeout=None):
+    """
+    Yields stdout of a long running command (e.g. `kubectl get -w`) chunk by
+    chunk as bytes. The command is terminated when the generator is closed,
+    when it stops writing, or after `timeout` seconds.
+
+    Args:
+        cmd(list): argv, no shell involved
+        timeout: seconds, None to stream until the command exits
+    """
+    # stdin is kept open: some commands (tmux -C) exit on EOF
+    proc = pc.Popen(cmd, stdin=pc.PIPE, stdout=pc.PIPE, stderr=pc.DEVNULL)
+    deadline = None if timeout is None else time.time() + timeout
+    selector = selectors.DefaultSelector()
+    selector.register(proc.stdout, selectors.EVENT_READ)
+    try:
+        while True:
+            if deadline is None:
+                remaining = None
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return
+            if not selector.select(remaining):
+                return
+            chunk = os.read(proc.stdout.fileno(), 65536)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        selector.close()
+        if proc.poll() is None:
+            proc.terminate()
+        proc.wait()
+        proc.stdin.close()
+        proc.stdout.close()
+
+
+def stream_lines(cmd, timeout=None):
+    """
+    Yields stdout of stream_process() line by line, without trailing newline
+    """
+    buffer = b''
+    for chunk in stream_process(cmd, timeout=timeout):
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line.decode('utf-8', errors='replace').rstrip('\r')
+    if buffer:
+        yield buffer.decode('utf-8', errors='replace')
+
+
+class JSONStreamDecoder:
+    """
+    Incrementally decodes concatenated JSON documents, as printed by
+    `kubectl get -w -o json`
+    """
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+
+    def feed(self, text):
+        """
+        Returns:
+            list of documents completed by `text`
+        """
+        self._buffer += text
+        docs = []
+        while True:
+            self._buffer = self._buffer.lstrip()
+            if not self._buffer:
+                break
+            try:
+                doc, end = self._decoder.raw_decode(self._buffer)
+            except ValueError:  # incomplete document
+                break
+            docs.append(doc)
+            self._buffer = self._buffer[end:]
+        return docs
+
+
+def stream_json(cmd, timeout=None):
+    """
+    Yields each JSON document printed by a long running command
+    """
+    decoder = JSONStreamDecoder()
+    # chunks may split multi-byte characters
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    for chunk in stream_process(cmd, timeout=timeout):
+        for doc in decoder.feed(utf8.decode(chunk)):
+            yield doc
+
+
+# ========================================================
+# ================= asyncio counterparts =================
+# ========================================================
+
+async def run_process_async(cmd, stdin=''):
+    """
+    Non-blocking version of run_process(), runs on the current event loop
+    """
+    import asyncio  # keeps asyncio out of `import symphony`
+    proc = await asyncio.create_subprocess_shell(
+        cmd,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    out, err = await proc.communicate(stdin.encode())
+    return out.decode('utf-8'), err.decode('utf-8'), proc.returncode
+
+
+async def run_async(cmd, dry_run=False, stdin='', throttle=None):
+    if dry_run:
+        print(cmd)
+        return '', '', 0
+    else:
+        if throttle is None:
+            out, err, retcode = await run_process_async(cmd, stdin)
+        else:
+            out, err, retcode = await throttle.run_command_async(
+                run_process_async, cmd, stdin)
+        if 'could not find default credentials' in err:
+            print("Please try `gcloud container clusters get-credentials mycluster` "
+                  "to fix credential error")
+        return out.strip(), err.strip(), retcode
+
+
+async def run_verbose_async(cmd, print_out=True, raise_on_error=False,
+                            dry_run=False, stdin='', throttle=None):
+    out, err, retcode = await run_async(cmd, dry_run=dry_run, stdin=stdin,
+                                        throttle=throttle)
     if retcode != 0:
         _print_err_return(out, err, retcode)
         msg = 'Command `{}` fails'.format(cmd)
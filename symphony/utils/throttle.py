@@ -0,0 +1,254 @@
+"""
+Client-side rate limiting and retries for control-plane calls
+(kubectl, docker), so that a big sweep slows down instead of failing
+half way when the API server throttles us.
+"""
+import random
+import re
+import threading
+import time
+
+
+# stderr / exception messages of failures that are worth retrying. Only
+# calls that are safe to repeat should be retried, a timeout does not tell
+# whether the call was applied
+DEFAULT_TRANSIENT_PATTERNS = [
+    r'TooManyRequests',
+    r'[Tt]oo [Mm]any [Rr]equests',
+    r'status code:? 429\b',
+    r'status code:? 50[234]\b',
+    r'\b50[234] (?:Bad Gateway|Service Unavailable|Gateway Time-?out)\b',
+    r'ServiceUnavailable',
+    r'the server is currently unable to handle the request',
+    r'the server has received too many requests',
+    r'[Ii]nternal error occurred',
+    r'etcdserver: request timed out',
+    r'connection refused',
+    r'connection reset by peer',
+    r'i/o timeout',
+    r'TLS handshake timeout',
+    r'unexpected EOF',
+    r'net/http: request canceled',
+]
+
+
+class TransientError(RuntimeError):
+    """
+    Raise inside a call wrapped by Throttle.call() to force a retry
+    """
+    pass
+
+
+class TokenBucket(object):
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        """
+        Thread-safe token bucket
+
+        Args:
+            rate: tokens added per second, None for no limit
+            burst: bucket capacity, defaults to max(1, rate)
+        """
+        if burst is None:
+            burst = 1. if rate is None else max(1., rate)
+        self.rate = rate
+        self.burst = float(burst)
+        self._clock = clock
+        self._tokens = self.burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Takes tokens, possibly going into debt
+
+        Returns:
+            seconds the caller must wait before using them
+        """
+        if self.rate is None:
+            return 0.
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1, sleep=time.sleep):
+        """
+        Blocks until tokens are available
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            sleep(delay)
+
+
+class RetryPolicy(object):
+    def __init__(self,
+                 max_attempts=5,
+                 base_delay=0.5,
+                 max_delay=30.,
+                 jitter=1.,
+                 transient_patterns=None):
+        """
+        Exponential backoff with jitter, only for failures classified as
+        transient
+
+        Args:
+            max_attempts: total number of tries, 1 disables retries
+            base_delay: seconds before the first retry, doubled every time
+            max_delay: cap of the backoff
+            jitter: fraction of the backoff that is randomized, 1 for
+                "full jitter", 0 for none
+            transient_patterns: regexes matched against stderr or the
+                exception message, defaults to DEFAULT_TRANSIENT_PATTERNS
+        """
+        assert max_attempts >= 1
+        assert 0 <= jitter <= 1
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        if transient_patterns is None:
+            transient_patterns = DEFAULT_TRANSIENT_PATTERNS
+        self._transient = re.compile('|'.join(
+            '(?:{})'.format(p) for p in transient_patterns))
+
+    def is_transient(self, error):
+        """
+        Args:
+            error: stderr string or exception
+        """
+        if isinstance(error, TransientError):
+            return True
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        # docker.errors.APIError and requests errors carry a status code
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+        if status in (429, 500, 502, 503, 504):
+            return True
+        return bool(self._transient.search(str(error)))
+
+    def backoff(self, attempt):
+        """
+        Args:
+            attempt: number of failed attempts so far, starting at 1
+
+        Returns:
+            seconds to wait before the next attempt
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+
+class Throttle(object):
+    """
+    Rate limits and retries the calls of one backend. A single instance is
+    shared by all clusters of that backend, see get_throttle()
+    """
+    def __init__(self, bucket=None, retry=None, sleep=time.sleep):
+        """
+        Args:
+            bucket: TokenBucket, None for no rate limit
+            retry: RetryPolicy, None to never retry
+        """
+        self.bucket = bucket
+        self.retry = RetryPolicy(max_attempts=1) if retry is None else retry
+        self._sleep = sleep
+
+    def _acquire(self):
+        if self.bucket is not None:
+            self.bucket.acquire(sleep=self._sleep)
+
+    def run_command(self, func, *args, **kwargs):
+        """
+        Args:
+            func: returns (stdout, stderr, retcode), e.g. runner.run_process
+
+        Returns:
+            result of the last attempt
+        """
+        for attempt in range(1, self.retry.max_attempts + 1):
+            self._acquire()
+            out, err, retcode = func(*args, **kwargs)
+            if retcode == 0 or attempt == self.retry.max_attempts \
+                    or not self.retry.is_transient(err):
+                return out, err, retcode
+            self._sleep(self.retry.backoff(attempt))
+
+    async def run_command_async(self, coro_func, *args, **kwargs):
+        """
+        Same as run_command() for a coroutine function, never blocks the loop
+        """
+        import asyncio
+        for attempt in range(1, self.retry.max_attempts + 1):
+            if self.bucket is not None:
+                await asyncio.sleep(self.bucket.reserve())
+            out, err, retcode = await coro_func(*args, **kwargs)
+            if retcode == 0 or attempt == self.retry.max_attempts \
+                    or not self.retry.is_transient(err):
+                return out, err, retcode
+            await asyncio.sleep(self.retry.backoff(attempt))
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls func, an SDK method that raises on failure, retrying
+        transient exceptions
+        """
+        for attempt in range(1, self.retry.max_attempts + 1):
+            self._acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.retry.max_attempts \
+                        or not self.retry.is_transient(e):
+                    raise
+            self._sleep(self.retry.backoff(attempt))
+
+
+# settings of get_throttle() when SymphonyConfig has no "throttle" entry
+DEFAULT_THROTTLE_SETTINGS = {
+    'rate': 10.,  # calls per second
+    'burst': 20,
+    'max_attempts': 5,
+    'base_delay': 0.5,
+    'max_delay': 30.,
+    'jitter': 1.,
+}
+
+_THROTTLES = {}
+_THROTTLES_LOCK = threading.Lock()
+
+
+def get_throttle(backend):
+    """
+    Returns the Throttle shared by every cluster of a backend, configured by
+    the "throttle" entry of SymphonyConfig, for example in .symphony.yml:
+
+        throttle:
+            kube: {rate: 5, burst: 10, max_attempts: 8}
+            docker: {rate: null}  # no rate limit
+
+    Keys missing from the config take DEFAULT_THROTTLE_SETTINGS
+    """
+    from symphony.engine.application_config import SymphonyConfig
+    settings = dict(DEFAULT_THROTTLE_SETTINGS)
+    settings.update((SymphonyConfig().throttle or {}).get(backend, {}))
+    key = (backend, repr(sorted(settings.items())))
+    with _THROTTLES_LOCK:
+        if key not in _THROTTLES:
+            if settings['rate'] is None:
+                bucket = None
+            else:
+                bucket = TokenBucket(settings['rate'], settings['burst'])
+            retry = RetryPolicy(
+                max_attempts=settings['max_attempts'],
+                base_delay=settings['base_delay'],
+                max_delay=settings['max_delay'],
+                jitter=settings['jitter'],
+                transient_patterns=settings.get('transient_patterns'),
+            )
+            _THROTTLES[key] = Throttle(bucket, retry)
+        return _THROTTLES[key]
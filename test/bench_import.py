@@ -0,0 +1,34 @@
+"""
+Measures the wall time of `import symphony` and of loading each backend,
+every measurement runs in a fresh interpreter.
+
+    python test/bench_import.py [repeat]
+"""
+import subprocess
+import sys
+
+
+_CASES = [
+    ('import symphony', 'import symphony'),
+    ('subproc', 'import symphony; symphony.Cluster.new("subproc")'),
+    ('tmux', 'import symphony.tmux'),
+    ('kube', 'import symphony.kube'),
+    ('docker', 'import symphony.docker'),
+    ('addons', 'import symphony.addons; symphony.addons.DockerBuilder'),
+]
+
+
+def measure(code, repeat):
+    timer = ('import time; _t = time.perf_counter(); {}; '
+             'print(time.perf_counter() - _t)').format(code)
+    times = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', timer])
+        times.append(float(out))
+    return min(times)
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for name, code in _CASES:
+        print('{:<16} {:7.1f} ms'.format(name, measure(code, repeat) * 1000))
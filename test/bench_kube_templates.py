@@ -0,0 +1,51 @@
+"""
+Memory and compile time of kubernetes replicas: derived from the template
+(they store only their overrides) against full copies of the template.
+
+    python test/bench_kube_templates.py [agents]
+"""
+import sys
+import time
+import tracemalloc
+from symphony.kube import KubeExperimentSpec, KubeProcessSpec
+
+
+def build(n_agents):
+    exp = KubeExperimentSpec('exp', secrets=[])
+    exp.new_process('replay', container_image='replay:latest').binds('replay')
+    template = KubeProcessSpec('agent', container_image='agent:latest',
+                               command=['python'], args=['agent.py'])
+    template.resource_request(cpu=1, memory='2G')
+    template.mount_nfs('nfs', '/data', '/data')
+    template.image_pull_policy('Always')
+    template.connects('replay')
+    exp.new_replicas(template, n_agents, args=['--id', '{i}'])
+    return exp
+
+
+def materialize(exp):
+    # reading data gives every container and pod a copy of its own
+    for process in exp.list_processes():
+        process.container_yml.data
+        process.pod_yml.data
+
+
+def main(n_agents):
+    for label, prepare in [('templates', None), ('copies', materialize)]:
+        tracemalloc.start()
+        exp = build(n_agents)
+        exp.list_processes()
+        if prepare is not None:
+            prepare(exp)
+        built, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        start = time.time()
+        exp.compile()
+        compile_time = time.time() - start
+        print('{:<10} {:8.2f} MB  {:8.0f} bytes/agent  compile {:.2f}s'.format(
+            label, built / 2 ** 20, built / n_agents, compile_time))
+        del exp
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,42 @@
+"""
+Control-plane benchmark on SimCluster: wall time of symphony's own
+orchestration code at scale, with the backend simulated in memory.
+
+    python test/bench_sim.py [processes]
+"""
+import sys
+import time
+from symphony.engine import Cluster
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print('{:<28} {:8.1f} ms'.format(label, (time.perf_counter() - start) * 1000))
+    return result
+
+
+def main(n_processes):
+    cluster = Cluster.new('sim', boot_time=5, ready_time=1,
+                          latencies={'describe_experiment': 0.05})
+    per_group = 100
+    exp = cluster.new_experiment('bench')
+
+    def _declare():
+        for g in range(n_processes // per_group):
+            group = exp.new_process_group('g{}'.format(g))
+            for p in range(per_group):
+                group.new_process('g{}p{}'.format(g, p), cmd='python worker.py')
+    timed('declare {} processes'.format(n_processes), _declare)
+    timed('launch', lambda: cluster.launch(exp))
+    timed('describe_experiment', lambda: cluster.describe_experiment('bench'))
+    names = [('g{}'.format(g), 'g{}p0'.format(g))
+             for g in range(n_processes // per_group)]
+    timed('describe_processes', lambda: cluster.describe_processes('bench', names))
+    events = timed('watch until ready',
+                   lambda: list(cluster.watch_experiment('bench')))
+    print('{} events, virtual time {:.2f}s'.format(len(events), cluster.clock.now()))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
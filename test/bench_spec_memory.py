@@ -0,0 +1,50 @@
+"""
+Launcher-side memory of process specs: bytes per process of each backend
+spec class, for processes that bind, connect and set a few env variables.
+
+    python test/bench_spec_memory.py [processes]
+"""
+import sys
+import tracemalloc
+from symphony.subproc import SubprocProcessSpec
+from symphony.tmux import TmuxProcessSpec
+from symphony.docker import DockerProcessSpec
+from symphony.kube import KubeProcessSpec
+
+
+SPECS = [
+    ('SubprocProcessSpec', lambda i: SubprocProcessSpec(
+        'agent{}'.format(i), cmd='python agent.py')),
+    ('TmuxProcessSpec', lambda i: TmuxProcessSpec(
+        'agent{}'.format(i), cmds=['python agent.py'])),
+    ('DockerProcessSpec', lambda i: DockerProcessSpec(
+        'agent{}'.format(i), 'agent:latest')),
+    ('KubeProcessSpec', lambda i: KubeProcessSpec(
+        'agent{}'.format(i), container_image='agent:latest',
+        command=['python'], args=['agent.py'])),
+]
+
+
+def build(factory, n_processes):
+    processes = []
+    for i in range(n_processes):
+        process = factory(i)
+        process.connects(['replay', 'parameter-server'])
+        process.set_envs({'SYMPH_AGENT_ID': str(i)})
+        processes.append(process)
+    return processes
+
+
+def main(n_processes):
+    for label, factory in SPECS:
+        tracemalloc.start()
+        processes = build(factory, n_processes)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('{:<20} {:10.0f} bytes/process  (peak {:.1f} MB)'.format(
+            label, current / n_processes, peak / 2 ** 20))
+        del processes
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
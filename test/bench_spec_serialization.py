@@ -0,0 +1,66 @@
+"""
+Save / load time and size of an experiment spec: YAML vs the binary
+".symph" format, and loading a single process from a SpecArchive.
+
+    python test/bench_spec_serialization.py [processes]
+"""
+import os
+import sys
+import tempfile
+import time
+import yaml
+from benedict.data_format import dump_yaml_str
+from symphony.kube import KubeExperimentSpec, KubeProcessSpec
+from symphony.spec import SpecArchive
+from symphony.spec import binary
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print('{:<32} {:8.1f} ms'.format(label, (time.perf_counter() - start) * 1000))
+    return result
+
+
+def make_experiment(n_processes):
+    exp = KubeExperimentSpec('bench')
+    exp.new_process('replay', container_image='replay:latest').binds('replay')
+    template = KubeProcessSpec('agent', container_image='agent:latest',
+                               command=['python'], args=['agent.py'])
+    template.connects('replay')
+    template.resource_request(cpu=1, memory='2Gi')
+    exp.new_replicas(template, n_processes, env={'AGENT_ID': '{i}'})
+    exp.list_all_processes()
+    return exp
+
+
+def main(n_processes):
+    exp = make_experiment(n_processes)
+    folder = tempfile.mkdtemp()
+    yaml_file = os.path.join(folder, 'experiment.yaml')
+    symph_file = os.path.join(folder, 'experiment.symph')
+
+    def _dump_yaml():
+        with open(yaml_file, 'w') as f:
+            f.write(dump_yaml_str(exp.dump_dict()))
+    timed('yaml dump', _dump_yaml)
+
+    def _load_yaml():
+        # the dump carries python tags of BeneDict, safe_load rejects them
+        with open(yaml_file) as f:
+            return KubeExperimentSpec.load_dict(yaml.unsafe_load(f))
+    timed('yaml load', _load_yaml)
+    for compression in ['zlib', None]:
+        label = 'symph ({})'.format(compression or 'raw')
+        timed(label + ' dump',
+              lambda: binary.dump_file(exp, symph_file, compression=compression))
+        timed(label + ' load', lambda: binary.load_file(symph_file))
+        print('{:<32} {:8.1f} KB'.format(
+            label + ' size', os.path.getsize(symph_file) / 1024))
+    print('{:<32} {:8.1f} KB'.format('yaml size', os.path.getsize(yaml_file) / 1024))
+    archive = timed('symph open archive', lambda: SpecArchive.open(symph_file))
+    timed('symph load one process', lambda: archive.load_process('agent-7'))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
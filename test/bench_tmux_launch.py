@@ -0,0 +1,42 @@
+"""
+Launch time of tmux experiments: from launch() until every process started
+its launch script, for processes that set a few env variables and run one
+command.
+Windows run /bin/sh, so that the rc files of the user do not dominate.
+
+    python test/bench_tmux_launch.py [processes ...]
+"""
+import os
+import sys
+import time
+from symphony.tmux import TmuxCluster
+
+_SERVER = '__symphony_bench__'
+
+
+def build(cluster, n_processes):
+    exp = cluster.new_experiment('bench-{}'.format(n_processes),
+                                 preamble_cmds=['cd /tmp'])
+    for i in range(n_processes):
+        process = exp.new_process('agent{}'.format(i), cmds=['echo agent {}'.format(i)])
+        process.set_envs({'AGENT_ID': i, 'SEED': i * 7})
+    return exp
+
+
+def main(sizes):
+    # the shell of the windows of a new tmux server
+    os.environ['SHELL'] = '/bin/sh'
+    cluster = TmuxCluster(server_name=_SERVER)
+    try:
+        for n_processes in sizes:
+            exp = build(cluster, n_processes)
+            start = time.time()
+            cluster.launch(exp, verbose=False)
+            print('{:>6} processes  {:8.2f}s'.format(n_processes, time.time() - start))
+            cluster.delete(exp.name)
+    finally:
+        cluster._tmux.kill_server()
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [10, 50, 100])
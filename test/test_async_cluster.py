@@ -0,0 +1,68 @@
+import asyncio
+import time
+from symphony.engine import Cluster, AsyncCluster
+from symphony.utils import runner
+
+
+class SleepyCluster(Cluster):
+    """
+    Blocking backend whose queries take a while
+    """
+    def list_experiments(self):
+        time.sleep(0.2)
+        return ['exp-a', 'exp-b', 'other']
+
+    def describe_experiment(self, experiment_name):
+        time.sleep(0.2)
+        return {'group': {'learner': {'status': 'live'}},
+                None: {'agent-0': {'status': 'live'}}}
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_new_async():
+    cluster = Cluster.new('sleepy', async_=True)
+    assert isinstance(cluster, AsyncCluster)
+    assert isinstance(cluster.cluster, SleepyCluster)
+
+
+def test_fallback_runs_concurrently():
+    cluster = Cluster.new('sleepy', async_=True)
+
+    async def describe_all():
+        return await asyncio.gather(
+            *[cluster.describe_experiment('exp-a') for _ in range(8)])
+
+    start = time.time()
+    results = run(describe_all())
+    assert len(results) == 8
+    assert time.time() - start < 0.2 * 4
+
+
+def test_fuzzy_match():
+    cluster = Cluster.new('sleepy', async_=True)
+    matches, is_exact = run(cluster.fuzzy_match_experiment('exp'))
+    assert matches == ['exp-a', 'exp-b']
+    assert not is_exact
+    pairs, is_exact = run(cluster.fuzzy_match_process('learner', 'exp-a'))
+    assert pairs == [('group', 'learner')]
+    assert is_exact
+
+
+def test_run_async():
+    out, err, retcode = run(runner.run_async('echo hello'))
+    assert (out, retcode) == ('hello', 0)
+    out, err, retcode = run(runner.run_async('cat', stdin='piped'))
+    assert out == 'piped'
+
+
+def test_run_async_concurrent():
+    async def sleep_all():
+        return await asyncio.gather(
+            *[runner.run_async('sleep 0.3') for _ in range(20)])
+
+    start = time.time()
+    run(sleep_all())
+    assert time.time() - start < 0.3 * 5
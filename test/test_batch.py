@@ -0,0 +1,54 @@
+import time
+from symphony.engine import Cluster
+
+
+class FlakyCluster(Cluster):
+    def __init__(self):
+        super().__init__()
+        self.deleted = []
+
+    def delete(self, experiment_name):
+        time.sleep(0.2)
+        if experiment_name.startswith('bad'):
+            raise ValueError('cannot delete ' + experiment_name)
+        self.deleted.append(experiment_name)
+
+
+def test_delete_batch_concurrent():
+    cluster = Cluster.new('flaky')
+    names = ['exp-{}'.format(i) for i in range(10)]
+    start = time.time()
+    results = cluster.delete_batch(names, max_workers=10, verbose=False)
+    assert time.time() - start < 0.2 * 5
+    assert [r.name for r in results] == names
+    assert all(r.ok for r in results)
+    assert sorted(cluster.deleted) == sorted(names)
+
+
+def test_delete_batch_partial_failure():
+    cluster = Cluster.new('flaky')
+    names = ['exp-0', 'bad-1', 'exp-2']
+    results = cluster.delete_batch(names, max_workers=1, verbose=False)
+    assert [r.ok for r in results] == [True, False, True]
+    assert isinstance(results[1].error, ValueError)
+    assert results[1].duration > 0
+    assert cluster.deleted == ['exp-0', 'exp-2']
+
+
+def test_kube_batch_reports_failed_kubectl(monkeypatch):
+    import symphony.kube.cluster as kube_cluster
+    from symphony.kube import KubeCluster, KubeExperimentSpec
+
+    def run(cmd, stdin='', throttle=None, **kwargs):
+        if 'bad' in cmd:
+            return '', 'Error from server (NotFound)', 1
+        return '', '', 0
+    monkeypatch.setattr(kube_cluster.runner, 'run', run)
+    monkeypatch.setattr(KubeCluster, 'set_experiment', lambda self, name: None)
+    cluster = KubeCluster()
+    results = cluster.delete_batch(['exp-0', 'bad-1'], verbose=False)
+    assert [r.ok for r in results] == [True, False]
+    assert isinstance(results[1].error, RuntimeError)
+    experiments = [KubeExperimentSpec(name, secrets=[]) for name in ('exp-2', 'bad-3')]
+    results = cluster.launch_batch(experiments, verbose=False)
+    assert [r.ok for r in results] == [True, False]
@@ -0,0 +1,74 @@
+import pytest
+from symphony.engine import SymphonyConfig
+from symphony.addons import LocalFileManager
+from symphony.kube import KubeExperimentSpec
+from symphony.tmux import TmuxExperimentSpec
+from symphony.spec import SpecArchive
+from symphony.spec import binary
+
+
+def make_experiment():
+    exp = KubeExperimentSpec('exp', secrets=[])
+    exp.new_process('learner', container_image='learner').binds('replay')
+    group = exp.new_process_group('group')
+    group.new_process('evaluator', container_image='evaluator').connects('replay')
+    for i in range(3):
+        agent = exp.new_process('agent{}'.format(i), container_image='agent')
+        agent.connects('replay')
+        agent.set_env('SEED', i)
+    return exp
+
+
+@pytest.mark.parametrize('compression', ['zlib', None])
+def test_round_trip(compression):
+    exp = make_experiment()
+    loaded = binary.loads(binary.dumps(exp, compression=compression))
+    assert isinstance(loaded, KubeExperimentSpec)
+    assert loaded.dump_dict() == exp.dump_dict()
+    assert loaded.compile() == exp.compile()
+
+
+def test_archive_loads_one_process():
+    exp = make_experiment()
+    archive = SpecArchive(binary.dumps(exp))
+    assert archive.spec_class is KubeExperimentSpec
+    assert archive.list_processes() == ['learner', 'agent0', 'agent1', 'agent2']
+    assert archive.list_processes('group') == ['evaluator']
+    agent = archive.load_process('agent1')
+    assert agent.dump_dict() == exp.get_process('agent1').dump_dict()
+    evaluator = archive.load_process('evaluator', process_group='group')
+    assert evaluator.connected_services == {'replay': None}
+
+
+def test_dump_file_by_extension(tmpdir):
+    exp = TmuxExperimentSpec('exp')
+    exp.new_process('a', cmds=['echo']).binds('a')
+    path = str(tmpdir.join('exp.symph'))
+    exp.dump_file(path)
+    with open(path, 'rb') as f:
+        assert f.read(6) == binary.MAGIC
+    loaded = TmuxExperimentSpec.load_file(path)
+    assert loaded.get_process('a').binded_services == {'a': None}
+
+
+def test_rejects_other_files_and_newer_versions():
+    with pytest.raises(binary.SpecFormatError):
+        SpecArchive(b'not a spec file at all')
+    data = bytearray(binary.dumps(make_experiment()))
+    data[6:8] = (binary.FORMAT_VERSION + 1).to_bytes(2, 'big')
+    with pytest.raises(binary.SpecFormatError):
+        SpecArchive(bytes(data))
+
+
+def test_local_file_manager_binary_format(tmpdir):
+    SymphonyConfig().set_experiment_folder(str(tmpdir))
+    try:
+        fs = LocalFileManager(experiment_format='symph')
+        exp = make_experiment()
+        path = fs.save_experiment(exp)
+        assert path.endswith('experiment.symph')
+        assert fs.experiment_exists(exp.name)
+        assert fs.load_experiment(exp.name).dump_dict() == exp.dump_dict()
+        assert fs.open_experiment(exp.name).list_processes('group') == ['evaluator']
+    finally:
+        SymphonyConfig.reset()
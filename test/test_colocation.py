@@ -0,0 +1,48 @@
+from symphony.kube import KubeExperimentSpec
+from symphony.tmux import TmuxExperimentSpec
+
+
+def env_of(process):
+    return {e.name: e.value for e in process.container_yml.data.env}
+
+
+def make_kube_experiment():
+    exp = KubeExperimentSpec('exp')
+    group = exp.new_process_group('learner')
+    group.new_process('learner', container_image='learner').binds('replay')
+    group.new_process('evaluator', container_image='evaluator').connects('replay')
+    exp.new_process('agent', container_image='agent').connects('replay')
+    return exp
+
+
+def test_connections_inside_a_pod_use_localhost():
+    exp = make_kube_experiment()
+    exp.compile()
+    port = exp.binded_services['replay'].port
+    evaluator = exp.get_process_group('learner').get_process('evaluator')
+    assert env_of(evaluator)['SYMPH_REPLAY_HOST'] == '127.0.0.1'
+    assert env_of(evaluator)['SYMPH_REPLAY_ADDR'] == '127.0.0.1:{}'.format(port)
+    agent_env = env_of(exp.get_process('agent'))
+    assert agent_env['SYMPH_REPLAY_HOST'] == 'replay'
+    assert exp.short_circuited_edges() == [
+        (('learner', 'evaluator'), 'replay', ('learner', 'learner'))]
+
+
+def test_incremental_compile_resolves_new_local_connections():
+    exp = make_kube_experiment()
+    exp.compile()
+    group = exp.get_process_group('learner')
+    late = group.new_process('late', container_image='late')
+    late.connects('replay')
+    exp.compile()
+    assert env_of(late)['SYMPH_REPLAY_HOST'] == '127.0.0.1'
+    assert len(exp.short_circuited_edges()) == 2
+
+
+def test_single_host_backends_short_circuit_every_edge():
+    exp = TmuxExperimentSpec('exp')
+    exp.new_process('server', cmds=['serve']).binds('server')
+    exp.new_process('client', cmds=['connect']).connects('server')
+    exp.compile()
+    assert exp.short_circuited_edges() == [((None, 'client'), 'server', (None, 'server'))]
+    assert exp.get_process('client').env['SYMPH_SERVER_HOST'] == '127.0.0.1'
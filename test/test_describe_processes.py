@@ -0,0 +1,41 @@
+import asyncio
+from symphony.engine import Cluster
+
+
+class OneQueryCluster(Cluster):
+    def __init__(self):
+        super().__init__()
+        self.queries = 0
+
+    def describe_experiment(self, experiment_name):
+        self.queries += 1
+        return {
+            'group': {'a': {'State': 'running'}, 'b': {'State': 'waiting'}},
+            None: {'lone': {'State': 'running'}},
+        }
+
+
+_PROCESSES = [('group', 'b'), (None, 'lone'), ('group', 'missing'),
+              ('nogroup', 'a')]
+_EXPECTED = {
+    ('group', 'b'): {'State': 'waiting'},
+    (None, 'lone'): {'State': 'running'},
+    ('group', 'missing'): None,
+    ('nogroup', 'a'): None,
+}
+
+
+def test_describe_processes():
+    cluster = Cluster.new('onequery')
+    result = cluster.describe_processes('exp', _PROCESSES)
+    assert list(result) == _PROCESSES
+    assert dict(result) == _EXPECTED
+    assert cluster.queries == 1
+
+
+def test_describe_processes_async():
+    cluster = Cluster.new('onequery', async_=True)
+    result = asyncio.get_event_loop().run_until_complete(
+        cluster.describe_processes('exp', _PROCESSES))
+    assert dict(result) == _EXPECTED
+    assert cluster.cluster.queries == 1
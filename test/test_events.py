@@ -0,0 +1,167 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+from symphony.engine import Cluster, ProcessEvent
+from symphony.engine.events import EventTracker
+from symphony.kube import KubeCluster
+from symphony.subproc import SubprocManager
+from symphony.utils.runner import JSONStreamDecoder
+
+
+class SnapshotCluster(Cluster):
+    def __init__(self, snapshots):
+        super().__init__()
+        self.snapshots = list(snapshots)
+
+    def describe_experiment(self, experiment_name):
+        if len(self.snapshots) > 1:
+            return self.snapshots.pop(0)
+        return self.snapshots[0]
+
+
+def _types(events):
+    return [(e.process_group_name, e.process_name, e.type) for e in events]
+
+
+def test_tracker():
+    tracker = EventTracker()
+    assert _types(tracker.update('g', 'p', state='waiting')) == [
+        ('g', 'p', 'created')]
+    assert _types(tracker.update('g', 'p', state='running', ready=True)) == [
+        ('g', 'p', 'running'), ('g', 'p', 'ready')]
+    assert tracker.update('g', 'p', state='running', ready=True) == []
+    events = tracker.update('g', 'p', state='exited', exit_code=2)
+    assert events == [ProcessEvent('exited', 'p', 'g', exit_code=2)]
+    assert _types(tracker.update('g', 'p', state='running', restarts=1)) == [
+        ('g', 'p', 'restarted'), ('g', 'p', 'running')]
+    assert _types(tracker.remove('g', 'p')) == [('g', 'p', 'deleted')]
+    assert tracker.remove('g', 'p') == []
+
+
+def test_polling_fallback():
+    cluster = Cluster.new('snapshot', snapshots=[
+        {None: {'a': {}}},
+        {None: {'a': {}}, 'g': {'b': {}}},
+        {'g': {'b': {}}},
+    ])
+    events = list(cluster.watch_experiment('exp', timeout=0.05,
+                                           poll_interval=0.01))
+    assert _types(events) == [
+        (None, 'a', 'created'),
+        ('g', 'b', 'created'),
+        (None, 'a', 'deleted'),
+    ]
+
+
+def test_async_watch():
+    cluster = Cluster.new('snapshot', async_=True, snapshots=[
+        {None: {'a': {}}},
+        {},
+    ])
+
+    async def _watch():
+        return [e async for e in cluster.watch_experiment(
+            'exp', timeout=0.05, poll_interval=0.01)]
+
+    events = asyncio.get_event_loop().run_until_complete(_watch())
+    assert _types(events) == [(None, 'a', 'created'), (None, 'a', 'deleted')]
+
+
+def _pod(name, containers, statuses=None):
+    pod = {
+        'metadata': {'name': name},
+        'spec': {'containers': [{'name': c} for c in containers]},
+        'status': {},
+    }
+    if statuses is not None:
+        pod['status']['containerStatuses'] = statuses
+    return pod
+
+
+def test_kube_watch_events():
+    kube = KubeCluster.__new__(KubeCluster)
+    tracker = EventTracker()
+    docs = [
+        {'type': 'ADDED', 'object': _pod('lone', ['lone'])},
+        {'type': 'MODIFIED', 'object': _pod('lone', ['lone'], [
+            {'name': 'lone', 'ready': True, 'restartCount': 0,
+             'state': {'running': {}}}])},
+        {'type': 'MODIFIED', 'object': _pod('lone', ['lone'], [
+            {'name': 'lone', 'ready': False, 'restartCount': 1,
+             'state': {'terminated': {'exitCode': 137}}}])},
+        {'type': 'DELETED', 'object': _pod('lone', ['lone'])},
+    ]
+    events = []
+    for doc in docs:
+        events.extend(kube._parse_watch_event(tracker, doc))
+    assert _types(events) == [
+        (None, 'lone', 'created'),
+        (None, 'lone', 'running'),
+        (None, 'lone', 'ready'),
+        (None, 'lone', 'restarted'),
+        (None, 'lone', 'exited'),
+        (None, 'lone', 'deleted'),
+    ]
+    assert events[4].exit_code == 137
+
+    group = _pod('group', ['p1', 'p2'])
+    assert _types(kube._parse_watch_event(tracker, group)) == [
+        ('group', 'p1', 'created'), ('group', 'p2', 'created')]
+
+
+def test_json_stream_decoder():
+    decoder = JSONStreamDecoder()
+    assert decoder.feed('{"a": 1}\n{"b"') == [{'a': 1}]
+    assert decoder.feed(': [2]}\n\n') == [{'b': [2]}]
+    assert decoder.feed('') == []
+
+
+def test_subproc_manager_watch():
+    manager = SubprocManager(stdout_mode='none', stderr_mode='none')
+    manager.launch('ok', 'sleep 0.1', {})
+    manager.launch('g:fail', 'exit 3', {})
+    events = list(manager.watch())
+    assert sorted(e for e in events if e[1] is not None) == [
+        ('g:fail', 3), ('ok', 0)]
+
+
+def test_subproc_manager_watch_waits_for_launch():
+    manager = SubprocManager(stdout_mode='none', stderr_mode='none')
+    events = []
+    watcher = threading.Thread(target=lambda: events.extend(manager.watch()))
+    watcher.start()
+    time.sleep(0.1)
+    assert watcher.is_alive()
+    manager.launch('ok', 'exit 0', {})
+    watcher.join(5)
+    assert ('ok', 0) in events
+    assert list(manager.watch(timeout=0.1)) == [('ok', 0)]
+    assert list(SubprocManager(stdout_mode='none', stderr_mode='none')
+                .watch(timeout=0.1)) == []
+
+
+# prints a watch event whose pod name is split in the middle of a character
+_SPLIT_WATCH = """
+import sys, time
+doc = {}.encode('utf-8')
+cut = doc.index(b'\\xc3') + 1
+sys.stdout.buffer.write(doc[:cut]); sys.stdout.flush()
+time.sleep(0.2)
+sys.stdout.buffer.write(doc[cut:] + b'\\n'); sys.stdout.flush()
+"""
+
+
+def test_kube_async_watch_decodes_split_characters(monkeypatch):
+    doc = json.dumps({'type': 'ADDED', 'object': _pod('caf\u00e9', ['c'])},
+                     ensure_ascii=False)
+    monkeypatch.setattr(KubeCluster, '_watch_cmd', lambda self, name: [
+        sys.executable, '-c', _SPLIT_WATCH.format(repr(doc))])
+    cluster = Cluster.new('kube', async_=True)
+
+    async def _watch():
+        return [e async for e in cluster.watch_experiment('exp', timeout=5)]
+
+    events = asyncio.get_event_loop().run_until_complete(_watch())
+    assert _types(events) == [('caf\u00e9', 'c', 'created')]
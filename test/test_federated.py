@@ -0,0 +1,110 @@
+from symphony.engine import Cluster
+from symphony.spec import ExperimentSpec
+from symphony.federated import FederatedCluster, RoundRobinPlacement
+
+
+class MemoryExperimentSpec(ExperimentSpec):
+    pass
+
+
+class MemoryCluster(Cluster):
+    def __init__(self, experiments=()):
+        super().__init__()
+        self.experiments = {name: {None: {'p': {}}} for name in experiments}
+
+    def new_experiment(self, *args, **kwargs):
+        return MemoryExperimentSpec(*args, **kwargs)
+
+    def launch(self, spec):
+        self.experiments[spec.name] = {None: {'p': {}}}
+
+    def delete(self, experiment_name):
+        del self.experiments[experiment_name]
+
+    def list_experiments(self):
+        return list(self.experiments)
+
+    def describe_experiment(self, experiment_name):
+        return self.experiments.get(experiment_name, {})
+
+
+class DownCluster(Cluster):
+    def list_experiments(self):
+        raise ConnectionError('unreachable')
+
+
+class UnstableCluster(MemoryCluster):
+    down = False
+
+    def list_experiments(self):
+        if self.down:
+            raise ConnectionError('unreachable')
+        return super().list_experiments()
+
+
+def _federation(**kwargs):
+    members = {
+        'a': MemoryCluster(['a1', 'a2']),
+        'b': MemoryCluster(['b1']),
+        'c': MemoryCluster(['c1', 'c2', 'c3']),
+    }
+    return Cluster.new('federated', members=members, **kwargs), members
+
+
+def test_least_loaded_placement():
+    fed, members = _federation()
+    placed = []
+    for i in range(4):
+        spec = fed.new_experiment('exp{}'.format(i))
+        placed.append(fed.locate(spec.name))
+    # pending experiments count as load
+    assert placed == ['b', 'a', 'b', 'a']
+    fed.launch(spec)
+    assert 'exp3' in members['a'].experiments
+
+
+def test_round_robin():
+    fed, _ = _federation(placement=RoundRobinPlacement())
+    placed = [fed.locate(fed.new_experiment(str(i)).name) for i in range(4)]
+    assert placed == ['a', 'b', 'c', 'a']
+
+
+def test_routing_and_listing():
+    fed, members = _federation()
+    assert sorted(fed.list_experiments()) == ['a1', 'a2', 'b1', 'c1', 'c2', 'c3']
+    assert fed.describe_experiment('c2') == {None: {'p': {}}}
+    fed.delete('c2')
+    assert 'c2' not in members['c'].experiments
+    assert fed.find_process('b1', 'p') == [None]
+
+
+def test_launch_spec_from_member_backend():
+    fed, members = _federation()
+    spec = MemoryExperimentSpec('direct')
+    fed.launch(spec)
+    assert fed.locate('direct') == 'b'
+
+
+def test_unreachable_member():
+    fed = FederatedCluster([MemoryCluster(['x']), DownCluster()], verbose=False)
+    assert fed.list_experiments() == ['x']
+    assert fed.locate('x') == 'memory0'
+
+
+def test_member_keeps_experiments_while_unreachable():
+    unstable = UnstableCluster(['y'])
+    fed = FederatedCluster([MemoryCluster(['x']), unstable], verbose=False)
+    assert fed.locate('y') == 'unstable1'
+    unstable.down = True
+    assert fed.list_experiments() == ['x']
+    assert fed.locate('y') == 'unstable1'
+
+
+def test_unlaunched_experiments_expire():
+    fed, _ = _federation(pending_timeout=0)
+    fed.new_experiment('never')
+    fed.new_experiment('next')
+    # the first one no longer counts as load of b
+    assert fed.locate('next') == 'b'
+    fed.launch(MemoryExperimentSpec('never'))
+    assert fed.locate('never') == 'b'
@@ -0,0 +1,92 @@
+from symphony.kube import KubeExperimentSpec
+from symphony.kube.builder import KubePodYML
+from symphony.tmux import TmuxExperimentSpec
+
+
+def make_kube_experiment(n_agents=5):
+    exp = KubeExperimentSpec('exp')
+    learner = exp.new_process('learner', container_image='learner')
+    learner.binds('replay')
+    group = exp.new_process_group('group')
+    group.new_process('evaluator', container_image='evaluator').connects('replay')
+    for i in range(n_agents):
+        exp.new_process('agent{}'.format(i), container_image='agent').connects('replay')
+    return exp
+
+
+def count_pod_ymls(monkeypatch):
+    calls = []
+    yml = KubePodYML.yml
+
+    def counted(self):
+        calls.append(self.data.metadata.name)
+        return yml(self)
+    monkeypatch.setattr(KubePodYML, 'yml', counted)
+    return calls
+
+
+def test_recompile_without_changes_serializes_nothing(monkeypatch):
+    exp = make_kube_experiment()
+    first = exp.compile()
+    calls = count_pod_ymls(monkeypatch)
+    assert exp.compile() == first
+    assert calls == []
+
+
+def test_recompile_emits_only_changed_components(monkeypatch):
+    exp = make_kube_experiment()
+    exp.compile()
+    calls = count_pod_ymls(monkeypatch)
+    exp.get_process('agent3').set_env('LR', '0.1')
+    exp.get_process_group('group').get_process('evaluator').resource_request(cpu=2)
+    incremental = exp.compile()
+    assert sorted(calls) == ['agent3', 'group']
+    assert incremental == exp.compile(full=True)
+    assert 'LR' in incremental
+
+
+def test_recompile_sees_direct_yml_changes(monkeypatch):
+    exp = make_kube_experiment()
+    exp.compile()
+    calls = count_pod_ymls(monkeypatch)
+    exp.get_process('agent1').container_yml.set_env('LR', '0.1')
+    exp.get_process('agent2').pod_yml.add_label('team', 'rl')
+    exp.get_process_group('group').pod_yml.restart_policy('Never')
+    incremental = exp.compile()
+    assert sorted(calls) == ['agent1', 'agent2', 'group']
+    assert incremental == exp.compile(full=True)
+    assert 'team: rl' in incremental
+
+
+def test_new_process_gets_existing_addresses(monkeypatch):
+    exp = make_kube_experiment()
+    exp.compile()
+    calls = count_pod_ymls(monkeypatch)
+    late = exp.new_process('late', container_image='agent')
+    late.connects('replay')
+    exp.compile()
+    assert calls == ['late']
+    env = {e.name: e.value for e in late.container_yml.data.env}
+    assert env['SYMPH_REPLAY_HOST'] == 'replay'
+
+
+def test_service_change_recompiles_everything(monkeypatch):
+    exp = make_kube_experiment(2)
+    exp.compile()
+    calls = count_pod_ymls(monkeypatch)
+    exp.get_process('agent0').binds('metrics')
+    exp.compile()
+    assert sorted(calls) == ['agent0', 'agent1', 'group', 'learner']
+    env = {e.name for e in exp.get_process('agent1').container_yml.data.env}
+    assert 'SYMPH_METRICS_PORT' in env
+
+
+def test_tmux_recompile_updates_dirty_processes():
+    exp = TmuxExperimentSpec('exp')
+    exp.new_process('server', cmds=['serve']).binds('server')
+    exp.compile()
+    client = exp.new_process('client', cmds=['connect'])
+    client.connects('server')
+    assert not exp._services_dirty
+    exp.compile()
+    assert client.env['SYMPH_SERVER_PORT'] == exp.get_process('server').env['SYMPH_SERVER_PORT']
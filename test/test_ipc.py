@@ -0,0 +1,43 @@
+import os
+import pytest
+from symphony.kube import KubeExperimentSpec
+from symphony.subproc import SubprocCluster
+from symphony.subproc.experiment import SubprocExperimentSpec
+from symphony.tmux import TmuxExperimentSpec
+from symphony.utils.ipc import runtime_dir
+
+
+def test_ipc_services_get_a_socket_path():
+    exp = TmuxExperimentSpec('exp')
+    exp.new_process('replay', cmds=['replay']).binds({'replay': 'ipc'})
+    exp.new_process('ps', cmds=['ps']).binds('ps')
+    exp.new_process('agent', cmds=['agent']).connects(['replay', 'ps'])
+    exp.compile()
+    env = exp.get_process('agent').env
+    assert env['SYMPH_REPLAY_IPC'] == os.path.join(runtime_dir('exp'), 'replay.sock')
+    assert 'SYMPH_REPLAY_PORT' not in env
+    assert exp.address_book.entries['ps']['port'] == 7000
+
+
+def test_ipc_is_only_for_local_backends():
+    exp = KubeExperimentSpec('exp')
+    exp.new_process('replay', container_image='replay').binds({'replay': 'ipc'})
+    with pytest.raises(ValueError):
+        exp.compile()
+    with pytest.raises(ValueError):
+        exp.new_process('tb', container_image='tb').exposes({'tb': 'ipc'})
+
+
+SERVE_ONCE = ('python -c "import os, socket; s = socket.socket(socket.AF_UNIX); '
+              's.bind(os.environ[\'SYMPH_DB_IPC\']); s.listen(1); s.accept()"')
+CONNECT = ('python -c "import os, socket; s = socket.socket(socket.AF_UNIX); '
+           's.connect(os.environ[\'SYMPH_DB_IPC\'])" || true')
+
+
+def test_subproc_runtime_dir_lives_with_the_launch():
+    exp = SubprocExperimentSpec('ipc-test')
+    exp.new_process('db', cmd=SERVE_ONCE).binds({'db': 'ipc'})
+    exp.new_process('client', cmd=CONNECT).connects('db')
+    SubprocCluster(stdout_mode='none', stderr_mode='none').launch(
+        exp, wait_ready=True, verbose=False)
+    assert not os.path.exists(runtime_dir('ipc-test'))
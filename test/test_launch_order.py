@@ -0,0 +1,246 @@
+import socket
+import pytest
+from symphony.engine import Cluster
+from symphony.errors import ReadinessTimeoutError
+from symphony.kube import KubeCluster, KubeExperimentSpec
+from symphony.spec.dependencies import dependency_graph, launch_waves
+from symphony.subproc import SubprocCluster
+from symphony.subproc.experiment import SubprocExperimentSpec
+from symphony.utils.ports import wait_for_port
+
+
+def make_experiment():
+    exp = SubprocExperimentSpec('exp')
+    group = exp.new_process_group('agents')
+    for i in range(2):
+        group.new_process('agent{}'.format(i), cmd='agent').connects('ps')
+    learner = exp.new_process('learner', cmd='learn')
+    learner.connects('replay')
+    learner.binds('ps')
+    exp.new_process('replay', cmd='replay').binds('replay')
+    exp.new_process('logger', cmd='log')
+    return exp
+
+
+def test_waves_follow_service_dependencies():
+    exp = make_experiment()
+    assert dependency_graph(exp)[('agents', 'agent0')] == [(None, 'learner')]
+    assert launch_waves(exp) == [
+        [(None, 'replay'), (None, 'logger')],
+        [(None, 'learner')],
+        [('agents', 'agent0'), ('agents', 'agent1')],
+    ]
+    assert launch_waves(exp, by_process_group=True)[2] == [('agents', None)]
+
+
+def test_cycles_share_a_wave():
+    exp = SubprocExperimentSpec('exp')
+    exp.new_process('a', cmd='a').binds('x')
+    exp.get_process('a').connects('y')
+    exp.new_process('b', cmd='b').binds('y')
+    exp.get_process('b').connects('x')
+    exp.new_process('c', cmd='c').connects('x')
+    assert launch_waves(exp) == [[(None, 'a'), (None, 'b')], [(None, 'c')]]
+
+
+def test_long_chains_do_not_recurse():
+    exp = SubprocExperimentSpec('exp')
+    n = 5000
+    for i in range(n):
+        process = exp.new_process('p{}'.format(i), cmd='run')
+        process.binds('s{}'.format(i))
+        if i:
+            process.connects('s{}'.format(i - 1))
+    waves = launch_waves(exp)
+    assert len(waves) == n and waves[-1] == [(None, 'p{}'.format(n - 1))]
+
+
+def test_wait_for_port():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    assert not wait_for_port('127.0.0.1', port, timeout=0.2, interval=0.05)
+    server.listen(1)
+    try:
+        assert wait_for_port('127.0.0.1', port, timeout=1)
+    finally:
+        server.close()
+
+
+SERVE_ONCE = ('python -c "import os, socket; s = socket.socket(); '
+              's.bind((\'127.0.0.1\', int(os.environ[\'SYMPH_DB_PORT\']))); '
+              's.listen(1); s.accept()"')
+
+
+def test_subproc_launch_waits_for_bound_ports(capsys):
+    exp = SubprocExperimentSpec('exp', port_range=range(23000, 23100))
+    exp.new_process('client', cmd='echo connected').connects('db')
+    exp.new_process('db', cmd=SERVE_ONCE).binds('db')
+    SubprocCluster(stdout_mode='none').launch(exp, wait_ready=True)
+    out = capsys.readouterr().out
+    assert out.index('Created process db') < out.index('Created process client')
+
+
+def test_subproc_readiness_timeout():
+    exp = SubprocExperimentSpec('exp', port_range=range(23100, 23200))
+    exp.new_process('db', cmd='sleep 10').binds('db')
+    exp.new_process('client', cmd='echo connected').connects('db')
+    cluster = SubprocCluster(stdout_mode='none')
+    with pytest.raises(ReadinessTimeoutError):
+        cluster.launch(exp, wait_ready=True, ready_timeout=0.3, verbose=False)
+    assert 'client' not in cluster._manager.processes
+
+
+def test_kube_readiness_probes_and_waves():
+    exp = KubeExperimentSpec('exp')
+    exp.new_process('replay', container_image='replay').binds('replay')
+    learner = exp.new_process('learner', container_image='learner')
+    learner.connects('replay')
+    learner.binds('ps')
+    learner.readiness_probe(9000)
+    exp.new_process('tb', container_image='tb').connects('ps')
+    exp.compile()
+    port = exp.binded_services['replay'].port
+    probe = exp.get_process('replay').container_yml.data.readinessProbe
+    assert probe.tcpSocket.port == port
+    assert learner.container_yml.data.readinessProbe.tcpSocket.port == 9000
+    assert 'readinessProbe' not in exp.get_process('tb').container_yml.data
+    cmds = [cmd for cmd, _ in KubeCluster()._wave_cmds(exp, 30)]
+    assert cmds[0] == 'kubectl create -f - --namespace exp'  # services
+    assert cmds[2::2] == [
+        'kubectl wait --for=condition=Ready pod/replay --namespace exp --timeout=30s',
+        'kubectl wait --for=condition=Ready pod/learner --namespace exp --timeout=30s',
+        'kubectl wait --for=condition=Ready pod/tb --namespace exp --timeout=30s',
+    ]
+
+
+def test_sim_launch_returns_when_ready():
+    cluster = Cluster.new('sim', boot_time=1, ready_time=2)
+    exp = make_experiment()
+    cluster.launch(exp, wait_ready=True)
+    assert cluster.clock.now() == 9  # three waves of 3 seconds
+    status = cluster.describe_experiment('exp')
+    assert all(process['Ready'] == '1'
+               for group in status.values() for process in group.values())
+    with pytest.raises(ReadinessTimeoutError):
+        cluster.launch(make_experiment(), force=True, wait_ready=True,
+                       ready_timeout=2)
+
+
+def _kube_runner(monkeypatch, fails):
+    """
+    Replaces kubectl, commands starting with fails return 1
+
+    Returns:
+        list of (command, throttle) that ran
+    """
+    import symphony.kube.cluster as kube_cluster
+    calls = []
+
+    def run_verbose(cmd, stdin='', throttle=None, **kwargs):
+        calls.append((cmd, throttle))
+        if cmd.startswith(fails):
+            return '', 'error: timed out waiting for the condition', 1
+        return '', '', 0
+    monkeypatch.setattr(kube_cluster.runner, 'run_verbose', run_verbose)
+    monkeypatch.setattr(KubeCluster, 'set_experiment', lambda self, name: None)
+    return calls
+
+
+def make_kube_experiment():
+    exp = KubeExperimentSpec('exp', secrets=[])
+    exp.new_process('replay', container_image='replay').binds('replay')
+    exp.new_process('learner', container_image='learner').connects('replay')
+    return exp
+
+
+def test_kube_wait_is_not_retried(monkeypatch):
+    calls = _kube_runner(monkeypatch, 'kubectl wait')
+    with pytest.raises(ReadinessTimeoutError):
+        KubeCluster().launch(make_kube_experiment(), wait_ready=True)
+    cmd, throttle = calls[-1]
+    assert cmd.startswith('kubectl wait')
+    assert throttle.retry.max_attempts == 1
+
+
+def test_kube_failed_wave_stops_the_launch(monkeypatch):
+    calls = _kube_runner(monkeypatch, 'kubectl create -f')
+    with pytest.raises(RuntimeError):
+        KubeCluster().launch(make_kube_experiment(), wait_ready=True)
+    assert not any(cmd.startswith('kubectl wait') for cmd, _ in calls)
+
+
+def test_kube_only_retries_repeatable_calls(monkeypatch):
+    calls = _kube_runner(monkeypatch, 'kubectl create -f')
+    cluster = KubeCluster()
+    with pytest.raises(RuntimeError):
+        cluster.launch(make_kube_experiment())
+    assert [(cmd, throttle.retry.max_attempts) for cmd, throttle in calls] == [
+        ('kubectl create namespace exp', 1),
+        ('kubectl create -f - --namespace exp', 1),
+    ]
+    assert cluster._throttle_for('kubectl get pod --namespace exp') is cluster.throttle
+    assert cluster._throttle_for(
+        'kubectl delete pod a --namespace exp --ignore-not-found') is cluster.throttle
+    assert cluster._throttle_for('kubectl delete namespace exp') is not cluster.throttle
+    assert cluster._throttle_for('kubectl exec -i nameservice --namespace exp -- '
+                                 'python -m symphony.nameservice publish') \
+        is not cluster.throttle
+
+
+class FakeContainer:
+    def __init__(self, name, states):
+        self.name = name
+        self.states = list(states)  # State returned by successive reloads
+
+    def reload(self):
+        self.attrs = {'State': self.states.pop(0) if len(self.states) > 1
+                      else self.states[0]}
+
+
+def _docker_cluster(monkeypatch, compose_version, retcode=0):
+    import docker
+    import symphony.docker.cluster as docker_cluster
+    from symphony.docker import DockerCluster
+    containers = [
+        FakeContainer('exp_replay', [{'Status': 'created'},
+                                     {'Status': 'running'}]),
+        FakeContainer('exp_learner', [{'Status': 'running',
+                                       'Health': {'Status': 'healthy'}}]),
+    ]
+    client = type('Client', (), {})()
+    client.containers = type('Containers', (), {})()
+    client.containers.list = lambda filters=None: containers
+    monkeypatch.setattr(docker, 'from_env', lambda: client)
+    monkeypatch.setattr(docker_cluster.runner, 'run',
+                        lambda cmd, **kwargs: (compose_version, '', 0))
+    calls = []
+
+    def run_verbose(cmd, **kwargs):
+        calls.append(cmd)
+        return '', 'error', retcode
+    monkeypatch.setattr(docker_cluster.runner, 'run_verbose', run_verbose)
+    return DockerCluster(), calls
+
+
+def make_docker_experiment():
+    from symphony.docker import DockerExperimentSpec
+    exp = DockerExperimentSpec('exp')
+    exp.new_process('replay', container_image='replay')
+    exp.new_process('learner', container_image='learner')
+    return exp
+
+
+def test_docker_waits_without_compose_wait(monkeypatch):
+    cluster, calls = _docker_cluster(monkeypatch, '1.29.2')
+    cluster.launch(make_docker_experiment(), wait_ready=True, ready_timeout=5)
+    assert calls == ['docker-compose -p exp -f - up -d']
+    cluster, calls = _docker_cluster(monkeypatch, 'v2.20.2')
+    cluster.launch(make_docker_experiment(), wait_ready=True, ready_timeout=5)
+    assert calls == ['docker-compose -p exp -f - up -d --wait --wait-timeout 5']
+
+
+def test_docker_failed_launch_raises(monkeypatch):
+    cluster, _ = _docker_cluster(monkeypatch, 'v2.20.2', retcode=1)
+    with pytest.raises(RuntimeError):
+        cluster.launch(make_docker_experiment())
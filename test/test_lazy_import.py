@@ -0,0 +1,51 @@
+import subprocess
+import sys
+import symphony.engine.cluster as cluster_module
+from symphony.engine import Cluster
+
+
+_HEAVY_MODULES = ['docker', 'libtmux', 'nanolog', 'asyncio',
+                  'symphony.kube', 'symphony.tmux', 'symphony.docker',
+                  'symphony.addons', 'symphony.commandline']
+
+
+def _loaded_after(code):
+    """
+    Returns heavy modules imported by running code in a fresh interpreter
+    """
+    check = code + '\nimport sys\nprint(" ".join(sys.modules))'
+    out = subprocess.check_output([sys.executable, '-c', check])
+    modules = out.decode().split()
+    return sorted(m for m in _HEAVY_MODULES if m in modules)
+
+
+def test_import_symphony_is_light():
+    assert _loaded_after('import symphony') == []
+
+
+def test_new_backend_only_imports_itself():
+    loaded = _loaded_after('import symphony; symphony.Cluster.new("subproc")')
+    assert loaded == []
+
+
+def test_lazy_attribute():
+    loaded = _loaded_after('import symphony; symphony.TmuxCluster')
+    assert 'symphony.tmux' in loaded
+    assert 'docker' not in loaded
+
+
+class _EntryPoint:
+    name = 'plugin'
+
+    def load(self):
+        class ThirdPartyCluster(Cluster):
+            pass
+        return ThirdPartyCluster
+
+
+def test_entry_point_backend(monkeypatch):
+    monkeypatch.setattr(cluster_module, '_backend_entry_points',
+                        lambda: {'plugin': _EntryPoint()})
+    assert 'plugin' in cluster_module.available_backends()
+    cluster = Cluster.new('plugin')
+    assert type(cluster).__name__ == 'ThirdPartyCluster'
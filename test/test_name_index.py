@@ -0,0 +1,68 @@
+import random
+from symphony.utils.common import deduplicate_with_order
+from symphony.utils.name_index import NameIndex
+from symphony.engine import Cluster
+
+
+def linear_fuzzy_match(all_names, name):
+    matches = []
+    matches += sorted([n for n in all_names if n.startswith(name)])
+    matches += sorted([n for n in all_names if n.endswith(name)])
+    matches += sorted([n for n in all_names if name in n])
+    return deduplicate_with_order(matches)
+
+
+def random_names(rng, count):
+    syllables = ['ag', 'ent', 'learn', 'er', 'rep', 'lay', '-', '0', '1', 'x']
+    return {''.join(rng.choice(syllables) for _ in range(rng.randint(1, 6)))
+            for _ in range(count)}
+
+
+def test_same_order_as_linear_scan():
+    rng = random.Random(0)
+    names = random_names(rng, 500)
+    index = NameIndex(names)
+    for query in ['a', 'ag', 'agent', 'er', '-0', 'learner', 'lay1', 'zzz', '']:
+        assert index.fuzzy_match(query) == linear_fuzzy_match(names, query)
+
+
+def test_incremental_sync():
+    rng = random.Random(1)
+    names = random_names(rng, 300)
+    index = NameIndex(names)
+    names = set(list(names)[:200]) | random_names(rng, 50)
+    index.sync(names)
+    assert index.names() == sorted(names)
+    for query in ['ent', 'x', 'rep-']:
+        assert index.fuzzy_match(query) == linear_fuzzy_match(names, query)
+
+
+def test_tags():
+    index = NameIndex([('agent', 'group'), ('agent', None), ('learner', 'group')])
+    assert index.tags('agent') == [None, 'group']
+    index.remove('agent', None)
+    assert 'agent' in index
+    index.remove('agent', 'group')
+    assert 'agent' not in index
+
+
+class NamesCluster(Cluster):
+    def list_experiments(self):
+        return ['foo-run', 'run-1', 'run-2', 'big-run-3']
+
+    def describe_experiment(self, experiment_name):
+        return {'pg1': {'agent-1': {}, 'learner': {}},
+                'pg2': {'agent-1': {}},
+                None: {'agent-0': {}, 'eval-agent': {}}}
+
+
+def test_cluster_fuzzy_match():
+    cluster = Cluster.new('names')
+    assert cluster.fuzzy_match_experiment('run-1') == (['run-1'], True)
+    assert cluster.fuzzy_match_experiment('run') == \
+        (['run-1', 'run-2', 'foo-run', 'big-run-3'], False)
+    assert cluster.fuzzy_match_process('learner', 'run-1') == \
+        ([('pg1', 'learner')], True)
+    assert cluster.fuzzy_match_process('agent', 'run-1') == \
+        ([(None, 'agent-0'), ('pg1', 'agent-1'), ('pg2', 'agent-1'),
+          (None, 'eval-agent')], False)
@@ -0,0 +1,174 @@
+import json
+import socket
+import sys
+import threading
+import time
+import pytest
+from symphony.kube import KubeCluster, KubeExperimentSpec
+from symphony.nameservice import (
+    BOOK_ENV, LISTEN_ENV, NameServer, NameServiceClient, NameServiceError)
+from symphony.spec.diff import diff_specs
+from symphony.subproc import SubprocCluster
+from symphony.subproc.experiment import SubprocExperimentSpec
+from symphony.tmux import TmuxExperimentSpec
+
+
+@pytest.fixture
+def server():
+    server = NameServer({'replay': {'host': '10.0.0.1', 'port': 7000}}).start()
+    yield server
+    server.stop()
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_lookup_is_cached(server):
+    client = NameServiceClient(server.address)
+    assert client.address('replay') == ('10.0.0.1', 7000)
+    NameServiceClient(server.address).register('replay', '10.0.0.2', 7001)
+    assert client.address('replay') == ('10.0.0.1', 7000)
+    assert client.address('replay', refresh=True) == ('10.0.0.2', 7001)
+    assert client.lookup('unknown') is None
+    with pytest.raises(KeyError):
+        client.address('unknown')
+    with pytest.raises(NameServiceError):
+        client._request(op='frobnicate')
+    client.close()
+
+
+def test_watchers_are_notified(server):
+    watcher = NameServiceClient(server.address)
+    events = []
+    watcher.watch(lambda name, entry: events.append((name, entry)))
+    assert watcher.lookup('replay') == {'host': '10.0.0.1', 'port': 7000}
+    client = NameServiceClient(server.address)
+    client.register('ps', '10.0.0.3', 7002)
+    client.publish({'replay': {'host': '10.0.0.1', 'port': 7000},  # unchanged
+                    'tb': {'host': '10.0.0.4', 'port': 6006}}, removed=['ps'])
+    assert _wait_for(lambda: len(events) == 3)
+    assert events == [('ps', {'host': '10.0.0.3', 'port': 7002}),
+                      ('tb', {'host': '10.0.0.4', 'port': 6006}),
+                      ('ps', None)]
+    assert watcher.address('tb') == ('10.0.0.4', 6006)
+    assert server.version == 3
+    watcher.close()
+    client.close()
+
+
+def test_watch_follows_after_the_connection_drops(server):
+    watcher = NameServiceClient(server.address)
+    events = []
+    watcher.watch(lambda name, entry: events.append((name, entry)))
+    dropped = watcher._watch_connection
+    dropped[0].shutdown(socket.SHUT_RDWR)
+    client = NameServiceClient(server.address)
+    client.register('ps', '10.0.0.3', 7002)
+    assert _wait_for(lambda: events == [('ps', {'host': '10.0.0.3', 'port': 7002})])
+    assert _wait_for(lambda: watcher._watch_connection is not dropped)
+    client.unregister('replay')
+    assert _wait_for(lambda: len(events) == 2)
+    assert events[1] == ('replay', None)
+    assert watcher.lookup('replay') is None
+    client.close()
+    watcher.close()
+
+
+def test_processes_are_given_the_name_service():
+    exp = TmuxExperimentSpec('exp')
+    exp.scope_addresses()
+    exp.use_name_service()
+    exp.new_process('replay', cmds=['replay']).binds('replay')
+    exp.new_process('agent', cmds=['agent'])
+    exp.compile()
+    env = exp.get_process('agent').env
+    assert env['SYMPH_NAMESERVICE_ADDR'] == '127.0.0.1:7000'
+    assert 'SYMPH_REPLAY_ADDR' not in env
+    book = json.loads(exp.get_process('nameservice').env[BOOK_ENV])
+    assert book['replay'] == {'host': '127.0.0.1', 'port': 7001}
+    assert exp.get_process('nameservice').env[LISTEN_ENV] == '127.0.0.1'
+    loaded = TmuxExperimentSpec.load_dict(exp.dump_dict())
+    assert loaded.name_service
+
+
+def test_update_publishes_instead_of_restarting():
+    def make(n_agents):
+        exp = KubeExperimentSpec('exp')
+        exp.use_name_service(container_image='symphony')
+        for i in range(n_agents):
+            exp.new_process('agent{}'.format(i), container_image='agent').binds(
+                'agent{}'.format(i))
+        exp.compile()
+        return exp
+    old, new = make(1), make(1)
+    env = {e['name']: e['value'] for e in
+           old.get_process('nameservice').container_yml.data['env']}
+    assert env[LISTEN_ENV] == '0.0.0.0'
+    new.new_process('tb', container_image='tb').binds('tb')
+    new.pin_addresses(old.address_book)
+    new.compile()
+    changes = diff_specs(old, new)
+    assert changes.added == [(None, 'tb')] and not changes.restarted()
+    cmd, stdin = KubeCluster()._publish_cmd(new, changes)
+    assert cmd == ('kubectl exec -i nameservice --namespace exp -- '
+                   'python -m symphony.nameservice publish')
+    assert json.loads(stdin)['entries']['tb']['port'] == \
+        new.address_book.entries['tb']['port']
+
+
+REGISTER = ('{} -c "from symphony.nameservice import NameServiceClient; '
+            'c = NameServiceClient(); c.register(\'worker\', \'h\', 1); '
+            'assert c.address(\'worker\', refresh=True) == (\'h\', 1)"'
+            .format(sys.executable))
+
+
+def test_subproc_name_service_stops_with_the_experiment():
+    exp = SubprocExperimentSpec('nameservice-test')
+    exp.use_name_service()
+    exp.new_process('worker', cmd='sleep 1')
+    # launched once the name service accepts connections
+    exp.new_process('client', cmd=REGISTER).connects('nameservice')
+    cluster = SubprocCluster(stdout_mode='none', stderr_mode='none')
+    start = time.time()
+    cluster.launch(exp, wait_ready=True, verbose=False)
+    assert cluster._manager.processes['client'].returncode == 0
+    assert 'nameservice' not in cluster._manager.processes
+    assert time.time() - start < 30
+
+
+class _SlowWatcher(object):
+    # e.g. a watcher whose socket buffer is full
+    def __init__(self):
+        self.unblocked = threading.Event()
+
+    def write(self, data):
+        self.unblocked.wait()
+
+    def flush(self):
+        pass
+
+
+def test_slow_watcher_does_not_block_requests(server):
+    assert server.address[0] == '127.0.0.1'
+    watcher = NameServiceClient(server.address)
+    events = []
+    watcher.watch(lambda name, entry: events.append(name))
+    slow = _SlowWatcher()
+    server._watchers.insert(0, (slow, threading.Lock()))
+    thread = threading.Thread(target=NameServiceClient(server.address).register,
+                              args=('ps', '10.0.0.3', 7002))
+    thread.start()
+    client = NameServiceClient(server.address)
+    assert _wait_for(lambda: server.version == 1)
+    assert client.lookup('ps') == {'host': '10.0.0.3', 'port': 7002}
+    client.register('tb', '10.0.0.4', 6006)
+    assert not events
+    slow.unblocked.set()
+    thread.join()
+    assert _wait_for(lambda: events == ['ps', 'tb'])
+    client.close()
+    watcher.close()
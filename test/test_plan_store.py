@@ -0,0 +1,74 @@
+import pytest
+from symphony.engine import SymphonyConfig
+from symphony.addons import LocalFileManager
+from symphony.addons.local_file_manager import plan_digest
+from symphony.kube import KubeCluster, KubeExperimentSpec
+
+
+def make_experiment(name, lr='0.1'):
+    exp = KubeExperimentSpec(name, secrets=[])
+    exp.new_process('replay', container_image='replay:latest').binds('replay')
+    learner = exp.new_process('learner', container_image='learner:latest',
+                              env={'LR': lr})
+    learner.connects('replay')
+    exp.compile()
+    return exp
+
+
+@pytest.fixture
+def folder(tmpdir):
+    SymphonyConfig().set_experiment_folder(str(tmpdir))
+    yield tmpdir
+    SymphonyConfig.reset()
+
+
+def test_plan_digest_is_normalized():
+    components = {'a': 'x: 1\n', 'b': 'y: 2\n'}
+    plan_hash, hashes = plan_digest(components)
+    assert plan_digest({'b': 'y: 2\r\n', 'a': 'x: 1\n'})[0] == plan_hash
+    assert plan_digest({'a': 'x: 1\n', 'b': 'y: 3\n'})[0] != plan_hash
+    assert hashes['a'] != hashes['b']
+
+
+def test_sweep_plans_are_deduplicated(folder):
+    fs = LocalFileManager()
+    runs = [make_experiment('run0'), make_experiment('run1'),
+            make_experiment('run2', lr='0.2')]
+    hashes = [fs.save_plan(exp.name, exp._components) for exp in runs]
+    assert hashes[0] == hashes[1] != hashes[2]
+    assert fs.plan_experiments() == {hashes[0]: ['run0', 'run1'],
+                                     hashes[2]: ['run2']}
+    # only the learner differs between the two plans
+    objects = list((fs.plan_root / 'objects').iterdir())
+    assert len(objects) == len(runs[0]._components) + 1
+    assert fs.load_plan(hashes[2]) == runs[2]._components
+    assert list(fs.load_plan(hashes[2])) == list(runs[2]._components)
+    assert fs.experiment_plan('run1') == hashes[0]
+    assert fs.experiment_plan('missing') is None
+
+
+def test_relaunching_the_same_plan_uploads_nothing(folder):
+    cluster = KubeCluster()
+    cluster.list_experiments = lambda: ['exp']
+    exp = make_experiment('exp')
+    cmds = cluster._launch_cmds(exp, exp.compile())
+    assert [cmd for cmd, _ in cmds] == [
+        'kubectl create namespace exp',
+        'kubectl create -f - --namespace exp',
+    ]
+    assert cluster._launch_cmds(exp, exp.compile()) == []
+    changed = make_experiment('exp', lr='0.2')
+    with pytest.raises(ValueError):
+        cluster._launch_cmds(changed, changed.compile())
+    assert len(cluster._launch_cmds(changed, changed.compile(), force=True)) == 2
+    assert LocalFileManager().experiment_plan('exp') == \
+        plan_digest(changed._components)[0]
+
+
+def test_same_plan_is_not_skipped_when_not_running(folder):
+    cluster = KubeCluster()
+    cluster.list_experiments = lambda: []
+    exp = make_experiment('exp')
+    cluster._launch_cmds(exp, exp.compile())
+    with pytest.raises(ValueError):
+        cluster._launch_cmds(exp, exp.compile())
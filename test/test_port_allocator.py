@@ -0,0 +1,113 @@
+import socket
+import threading
+import pytest
+from symphony.engine import SymphonyConfig
+from symphony.subproc import SubprocCluster
+from symphony.subproc.experiment import SubprocExperimentSpec
+from symphony.utils.ports import PortAllocator
+
+
+@pytest.fixture
+def lease_file(tmpdir):
+    return str(tmpdir.join('leases.json'))
+
+
+def test_leases_are_host_wide(lease_file):
+    first = PortAllocator(range(24000, 24100), lease_file=lease_file)
+    second = PortAllocator(range(24000, 24100), lease_file=lease_file)
+    a = first.lease('a', {'replay': None, 'ps': None})
+    b = second.lease('b', {'replay': None, 'tb': 24002})
+    assert set(a.values()).isdisjoint(b.values())
+    assert b['tb'] == 24002
+    # leasing again keeps the ports
+    assert first.lease('a', {'ps': None, 'replay': None}) == a
+    first.release('a')
+    assert list(second.leases()) == ['b']
+
+
+def test_ports_in_use_are_skipped(lease_file):
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    try:
+        allocator = PortAllocator([port, port + 1], lease_file=lease_file)
+        assert allocator.lease('a', {'s': None}) == {'s': port + 1}
+        with pytest.raises(ValueError):
+            allocator.lease('b', {'s': None})
+    finally:
+        server.close()
+
+
+def test_in_memory_allocation():
+    allocator = PortAllocator([7005, 7001, 7003])
+    assert allocator.lease('exp', {'a': None, 'b': 7001}, exclude=[7003]) == \
+        {'a': 7005, 'b': 7001}
+    with pytest.raises(ValueError):
+        allocator.lease('exp', {'c': None}, exclude=[7003])
+    assert allocator.lease('other', {'c': None}) == {'c': 7003}
+
+
+def test_concurrent_leases(lease_file):
+    results = []
+
+    def lease(i):
+        allocator = PortAllocator(range(24200, 24400), lease_file=lease_file,
+                                  check_free=False)
+        results.append(allocator.lease(
+            'exp{}'.format(i), {'s{}'.format(j): None for j in range(10)}))
+    threads = [threading.Thread(target=lease, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ports = [port for result in results for port in result.values()]
+    assert len(set(ports)) == len(ports) == 80
+
+
+def test_experiments_sharing_a_host_get_different_ports(lease_file):
+    allocator = PortAllocator(lease_file=lease_file)
+    ports = []
+    for name in ['a', 'b']:
+        exp = SubprocExperimentSpec(name)
+        exp.new_process('server', cmd='serve').binds('server')
+        exp.use_port_allocator(allocator)
+        exp.compile()
+        ports.append(exp.address_book.entries['server']['port'])
+    assert ports[0] != ports[1]
+
+
+def test_subproc_releases_leases_and_prunes_dead_owners(lease_file):
+    SymphonyConfig().set_port_lease_file(lease_file)
+    try:
+        PortAllocator(lease_file=lease_file).lease(
+            'subproc:999999999:gone', {'s': None})
+        exp = SubprocExperimentSpec('exp', port_range=range(24400, 24500))
+        exp.new_process('server', cmd='echo done').binds('server')
+        SubprocCluster(stdout_mode='none').launch(exp, verbose=False)
+        assert PortAllocator(lease_file=lease_file).leases() == {}
+    finally:
+        SymphonyConfig.reset()
+
+
+def test_failed_subproc_update_keeps_only_running_leases(lease_file):
+    SymphonyConfig().set_port_lease_file(lease_file)
+    try:
+        cluster = SubprocCluster(stdout_mode='none')
+        owner = cluster._lease_owner('exp')
+        specs = []
+        for services in (['server'], ['server', 'tb']):
+            exp = SubprocExperimentSpec('exp', port_range=range(24500, 24600))
+            for name in services:
+                exp.new_process(name, cmd='serve').binds(name)
+            specs.append(exp)
+        old, new = specs
+        # leased as by the launch of old
+        old.use_port_allocator(PortAllocator(lease_file=lease_file), owner=owner)
+        old.compile()
+        running = PortAllocator(lease_file=lease_file).leases()
+        assert list(running[owner]) == ['server']
+        with pytest.raises(ValueError):  # not launched by this cluster
+            cluster.update(new, old_spec=old)
+        assert PortAllocator(lease_file=lease_file).leases() == running
+    finally:
+        SymphonyConfig.reset()
@@ -0,0 +1,85 @@
+from symphony.engine import Cluster, QueryCache
+
+
+class CountingCluster(Cluster):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.experiments = ['exp-a', 'exp-b']
+
+    def list_experiments(self):
+        self.calls += 1
+        return list(self.experiments)
+
+    def describe_experiment(self, experiment_name):
+        self.calls += 1
+        return {None: {'proc': {'status': 'live'}}}
+
+    def delete(self, experiment_name):
+        self.experiments.remove(experiment_name)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+def test_hits_and_misses():
+    cluster = Cluster.new('counting')
+    cache = cluster.enable_query_cache(ttl=10)
+    cluster.list_experiments()
+    cluster.fuzzy_match_experiment('exp')
+    cluster.describe_experiment('exp-a')
+    cluster.fuzzy_match_process('proc', 'exp-a')
+    assert cluster.calls == 2
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+
+
+def test_ttl():
+    clock = FakeClock()
+    cluster = Cluster.new('counting')
+    cluster.enable_query_cache(cache=QueryCache(
+        ttl=10, ttls={'describe_experiment': 0}, clock=clock))
+    cluster.list_experiments()
+    cluster.list_experiments()
+    assert cluster.calls == 1
+    clock.now = 11
+    cluster.list_experiments()
+    assert cluster.calls == 2
+    cluster.describe_experiment('exp-a')
+    cluster.describe_experiment('exp-a')
+    assert cluster.calls == 4
+
+
+def test_invalidate_on_delete():
+    cluster = Cluster.new('counting')
+    cache = cluster.enable_query_cache(ttl=10)
+    assert cluster.list_experiments() == ['exp-a', 'exp-b']
+    cluster.delete('exp-a')
+    assert cluster.list_experiments() == ['exp-b']
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_disable():
+    cluster = Cluster.new('counting')
+    cluster.enable_query_cache(ttl=10)
+    cluster.disable_query_cache()
+    cluster.list_experiments()
+    cluster.list_experiments()
+    assert cluster.calls == 2
+
+
+def test_keyword_queries_are_invalidated():
+    cluster = Cluster.new('counting')
+    cluster.enable_query_cache(ttl=10)
+    cluster.describe_experiment(experiment_name='exp-a')
+    cluster.describe_experiment('exp-a')
+    assert cluster.calls == 1
+    cluster.delete(experiment_name='exp-a')
+    cluster.describe_experiment(experiment_name='exp-a')
+    assert cluster.calls == 2
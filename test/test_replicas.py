@@ -0,0 +1,131 @@
+import pytest
+from symphony.spec import ReplicaSpec
+from symphony.subproc import SubprocProcessSpec
+from symphony.subproc.experiment import SubprocExperimentSpec
+from symphony.tmux import TmuxExperimentSpec, TmuxProcessSpec
+from symphony.kube import KubeExperimentSpec, KubeProcessSpec
+
+
+def test_declaring_replicas_creates_no_process():
+    exp = SubprocExperimentSpec('exp')
+    template = SubprocProcessSpec('agent', cmd='python agent.py')
+    replicas = exp.new_replicas(template, 100000)
+    assert len(replicas) == 100000
+    assert replicas.processes is None
+    assert not exp.all_processes
+
+
+def test_replicas_materialize_on_iteration():
+    exp = SubprocExperimentSpec('exp')
+    exp.new_process('replay', cmd='python replay.py').binds('replay')
+    template = SubprocProcessSpec('agent', cmd='python agent.py')
+    template.connects('replay')
+    exp.new_replicas(template, 3, args=['--seed', '{i}'],
+                     env={'AGENT_ID': '{i}'})
+    names = [p.name for p in exp.list_processes()]
+    assert names == ['replay', 'agent-0', 'agent-1', 'agent-2']
+    agent = exp.get_process('agent-2')
+    assert agent.cmd == 'python agent.py --seed 2'
+    assert agent.env['AGENT_ID'] == '2'
+    assert agent.connected_services == {'replay': None}
+    assert agent.parent_experiment is exp
+    assert template.parent_experiment is None and not template.env
+    exp.compile()
+    assert 'SYMPH_REPLAY_PORT' in agent.env
+
+
+def test_replicas_in_process_group():
+    exp = TmuxExperimentSpec('exp')
+    group = exp.new_process_group('agents')
+    template = TmuxProcessSpec('agent', cmds=['cd /tmp', 'python agent.py'])
+    group.new_replicas(template, 2, name_fmt='worker{i}',
+                       args=lambda i: ['--rank', i],
+                       customize=lambda p, i: p.exposes('tb{}'.format(i)))
+    assert [p.name for p in exp.list_all_processes()] == ['worker0', 'worker1']
+    worker = group.get_process('worker1')
+    assert worker.cmds == ['cd /tmp', 'python agent.py --rank 1']
+    assert worker.exposed_services == {'tb1': None}
+    assert worker.parent_process_group is group
+
+
+def test_kube_replicas_are_renamed():
+    exp = KubeExperimentSpec('exp')
+    template = KubeProcessSpec('agent', container_image='agent:latest',
+                               command=['python'], args=['agent.py'])
+    exp.new_replicas(template, 2)
+    agent = exp.get_process('agent-1')
+    assert agent.container_yml.data.name == 'agent-1'
+    assert agent.container_yml.data.args == ['agent.py']
+    assert agent.pod_yml.data.metadata.name == 'agent-1'
+    assert agent.pod_yml.container_ymls[0] is agent.container_yml
+    assert exp.get_process('agent-0').pod_yml is not agent.pod_yml
+
+
+def _kube_agents(n):
+    exp = KubeExperimentSpec('exp', secrets=[])
+    template = KubeProcessSpec('agent', container_image='agent:latest',
+                               command=['python'], args=['agent.py'])
+    template.resource_request(cpu=1, memory='2G')
+    template.mount_nfs('nfs', '/data', '/data')
+    exp.new_replicas(template, n, args=['--id', '{i}'])
+    return exp
+
+
+def test_kube_replicas_share_the_template():
+    exp = _kube_agents(3)
+    exp.compile()
+    agent0, agent1 = exp.get_process('agent-0'), exp.get_process('agent-1')
+    assert agent0.container_yml.template is agent1.container_yml.template
+    assert agent0.pod_yml.template is agent1.pod_yml.template
+    assert set(agent1.container_yml._overrides) == {'name', 'args'}
+    assert agent1.container_yml.get('args') == ['agent.py', '--id', '1']
+    assert agent1.container_yml.get('resources') is \
+        agent0.container_yml.get('resources')
+    assert 'name: agent-1' in agent1.yml()
+    assert 'symphony_pg: agent-1' in agent1.yml()
+    assert 'value: agent-1' in agent1.yml()
+
+
+def test_kube_replica_changes_are_copied_on_write():
+    exp = _kube_agents(2)
+    agent0, agent1 = exp.get_process('agent-0'), exp.get_process('agent-1')
+    expected = agent1.yml()
+    agent0.resource_limit(gpu=1)
+    agent0.add_toleration(key='gpu', operator='Exists')
+    assert agent0.container_yml.template is None
+    assert agent0.pod_yml.template is None
+    assert 'nvidia.com/gpu' in agent0.yml()
+    assert agent1.yml() == expected
+    assert agent1.container_yml.template is not None
+
+
+def test_kube_replicas_compile_like_copies():
+    exp = _kube_agents(3)
+    exp.get_process('agent-2').set_env('DEBUG', 1)
+    derived = exp.compile()
+    for process in exp.list_processes():
+        process.container_yml.data
+        process.pod_yml.data
+    assert exp.compile(full=True) == derived
+    assert KubeExperimentSpec.load_dict(exp.dump_dict()).compile() == derived
+
+
+def test_replicate_keeps_shared_objects():
+    template = TmuxProcessSpec('agent', cmds=['python agent.py'])
+    replica = template._replicate('agent-0', shared=[template.cmds])
+    assert replica.cmds is template.cmds
+
+
+def test_duplicate_replica_names_fail_on_expansion():
+    exp = SubprocExperimentSpec('exp')
+    exp.new_process('agent-0', cmd='echo')
+    exp.new_replicas(SubprocProcessSpec('agent', cmd='echo'), 2)
+    with pytest.raises(ValueError):
+        exp.list_all_processes()
+
+
+def test_template_must_be_free():
+    exp = SubprocExperimentSpec('exp')
+    process = exp.new_process('p', cmd='echo')
+    with pytest.raises(ValueError):
+        ReplicaSpec(process, 2)
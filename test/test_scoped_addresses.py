@@ -0,0 +1,79 @@
+from symphony.kube import KubeExperimentSpec
+from symphony.tmux import TmuxExperimentSpec
+
+
+def make_kube_experiment(scoped, n_services=10, n_agents=20):
+    exp = KubeExperimentSpec('exp')
+    if scoped:
+        exp.scope_addresses()
+    for i in range(n_services):
+        exp.new_process('server{}'.format(i), container_image='server') \
+            .binds('service{}'.format(i))
+    for i in range(n_agents):
+        exp.new_process('agent{}'.format(i), container_image='agent') \
+            .connects('service{}'.format(i % n_services))
+    return exp
+
+
+def address_vars(env):
+    return sorted(name for name in env if name.startswith('SYMPH_'))
+
+
+def test_scoped_processes_only_see_their_services(capsys):
+    exp = make_kube_experiment(scoped=True)
+    scoped_plan = exp.compile()
+    env = {e.name for e in exp.get_process('agent13').container_yml.data.env}
+    assert address_vars(env) == ['SYMPH_SERVICE3_ADDR', 'SYMPH_SERVICE3_HOST',
+                                 'SYMPH_SERVICE3_PORT']
+    # 30 processes with 1 service each instead of 10
+    assert 'sets 2640 bytes of environment variables instead of 26400 ' \
+        '(90.0% fewer)' in capsys.readouterr().out
+    full_plan = make_kube_experiment(scoped=False).compile()
+    assert len(scoped_plan) < len(full_plan) / 2
+
+
+def test_full_address_book_escape_hatch():
+    exp = TmuxExperimentSpec('exp')
+    exp.scope_addresses()
+    exp.new_process('replay', cmds=['replay']).binds('replay')
+    exp.new_process('ps', cmds=['ps']).binds('ps')
+    monitor = exp.new_process('monitor', cmds=['monitor'])
+    monitor.uses_full_address_book()
+    exp.compile()
+    assert address_vars(exp.get_process('replay').env) == [
+        'SYMPH_REPLAY_ADDR', 'SYMPH_REPLAY_HOST', 'SYMPH_REPLAY_PORT']
+    assert len(address_vars(monitor.env)) == 6
+    late = exp.new_process('late', cmds=['late'])
+    late.connects('ps')
+    exp.compile()
+    assert address_vars(late.env) == ['SYMPH_PS_ADDR', 'SYMPH_PS_HOST',
+                                      'SYMPH_PS_PORT']
+
+
+def test_scope_is_saved():
+    exp = make_kube_experiment(scoped=True, n_services=1, n_agents=1)
+    exp.get_process('agent0').uses_full_address_book()
+    exp.compile()
+    loaded = KubeExperimentSpec.load_dict(exp.dump_dict())
+    assert loaded.scoped_addresses
+    assert loaded.get_process('agent0').full_address_book
+    assert not loaded.get_process('server0').full_address_book
+
+
+def test_scoping_drops_the_full_address_book():
+    tmux = TmuxExperimentSpec('exp')
+    tmux.new_process('replay', cmds=['replay']).binds('replay')
+    tmux.new_process('ps', cmds=['ps']).binds('ps')
+    agent = tmux.new_process('agent', cmds=['agent'])
+    agent.connects('ps')
+    agent.set_envs({'SYMPH_DEBUG': '1'})
+    kube = make_kube_experiment(scoped=False, n_services=2, n_agents=1)
+    for exp in tmux, kube:
+        exp.compile()
+        exp.scope_addresses()
+        exp.compile()
+    assert address_vars(agent.env) == [
+        'SYMPH_DEBUG', 'SYMPH_PS_ADDR', 'SYMPH_PS_HOST', 'SYMPH_PS_PORT']
+    env = {e.name for e in kube.get_process('agent0').container_yml.data.env}
+    assert address_vars(env) == ['SYMPH_SERVICE0_ADDR', 'SYMPH_SERVICE0_HOST',
+                                 'SYMPH_SERVICE0_PORT']
@@ -0,0 +1,102 @@
+import bisect
+from collections import Counter
+import pytest
+from symphony.kube import KubeExperimentSpec
+from symphony.spec import Shards
+from symphony.spec.dependencies import launch_waves
+from symphony.spec.shards import LOAD_EPSILON, _ring, _hash, assign_shards
+from symphony.tmux import TmuxExperimentSpec
+
+
+def make_experiment(cls, n_shards=4, n_agents=3, **kwargs):
+    exp = cls('exp')
+    exp.new_replicas(cls._ProcessClass('replay', **kwargs), n_shards,
+                     name_fmt='replay-{i}',
+                     customize=lambda p, i: p.binds({'replay': Shards(n_shards).shard(i)}))
+    for i in range(n_agents):
+        exp.new_process('agent{}'.format(i), **kwargs).connects('replay')
+    exp.compile()
+    return exp
+
+
+def test_consistent_hashing_is_balanced_and_stable():
+    names = ['agent-{}'.format(i) for i in range(1000)]
+    eight = assign_shards('replay', 8, names)
+    counts = Counter(eight.values())
+    assert len(counts) == 8 and max(counts.values()) <= 1000 / 8 * (1 + LOAD_EPSILON) + 1
+    nine = assign_shards('replay', 9, names)
+    moved = sum(eight[name] != nine[name] for name in names)
+    assert moved < 2 * 1000 / 9
+
+
+def test_small_experiments_are_balanced():
+    names = ['agent-{}'.format(i) for i in range(16)]
+    points, indices = _ring('replay', 8)
+    unbounded = Counter(indices[bisect.bisect(points, _hash(name)) % len(points)]
+                        for name in names)
+    assert max(unbounded.values()) > 3
+    assignment = assign_shards('replay', 8, names)
+    assert max(Counter(assignment.values()).values()) <= 3
+    assert assign_shards('replay', 8, reversed(names)) == assignment
+
+
+def test_connectors_get_their_shard():
+    exp = make_experiment(TmuxExperimentSpec, cmds=['run'])
+    env = exp.get_process('agent0').env
+    assert env['SYMPH_REPLAY_ADDRS'] == ','.join(
+        '127.0.0.1:{}'.format(port) for port in range(7000, 7004))
+    shard = assign_shards('replay', 4, ['agent0', 'agent1', 'agent2'])['agent0']
+    assert env['SYMPH_REPLAY_SHARD'] == str(shard)
+    assert env['SYMPH_REPLAY_PORT'] == str(7000 + shard)
+    assert 'SYMPH_REPLAY_0_PORT' not in env
+    assert exp.get_process('replay-2').env['SYMPH_REPLAY_PORT'] == '7002'
+    assert launch_waves(exp) == [[(None, 'replay-{}'.format(i)) for i in range(4)],
+                                 [(None, 'agent{}'.format(i)) for i in range(3)]]
+
+
+def test_assignment_is_the_same_on_every_backend():
+    tmux = make_experiment(TmuxExperimentSpec, cmds=['run'])
+    kube = make_experiment(KubeExperimentSpec, container_image='run')
+    for i in range(3):
+        kube_env = {e['name']: e['value'] for e in
+                    kube.get_process('agent{}'.format(i)).container_yml.data['env']}
+        assert kube_env['SYMPH_REPLAY_SHARD'] == \
+            tmux.get_process('agent{}'.format(i)).env['SYMPH_REPLAY_SHARD']
+    assert 'service-replay-1: bind' in kube.compile()
+
+
+def test_every_shard_is_bound_once():
+    exp = TmuxExperimentSpec('exp')
+    exp.new_process('replay', cmds=['run']).binds({'replay': Shards(4).shard(0)})
+    with pytest.raises(ValueError):
+        exp.compile()
+    exp.new_process('replay-all', cmds=['run']).binds({'replay': Shards(4)})
+    with pytest.raises(ValueError):
+        exp.compile()
+
+
+def test_shards_survive_dump_and_load():
+    exp = make_experiment(TmuxExperimentSpec, cmds=['run'])
+    loaded = TmuxExperimentSpec.load_dict(exp.dump_dict())
+    assert loaded.get_process('replay-1').binded_services == {'replay': Shards(4, 1)}
+    loaded.get_process('agent0').set_envs({'X': '1'})
+    loaded.compile()
+    assert loaded.get_process('agent0').env['SYMPH_REPLAY_SHARD'] == \
+        exp.get_process('agent0').env['SYMPH_REPLAY_SHARD']
+
+
+def test_new_connector_updates_the_shards_it_moves():
+    exp = make_experiment(TmuxExperimentSpec, n_agents=13, cmds=['run'])
+    for i in range(9, 13):
+        exp.get_process('agent{}'.format(i)).connected_services.clear()
+    exp.compile(full=True)
+    shards = set()
+    for i in range(9, 13):
+        # only marks the new connector dirty
+        exp.get_process('agent{}'.format(i)).connects('replay')
+        exp.compile()
+        expected = assign_shards('replay', 4, ['agent{}'.format(j) for j in range(i + 1)])
+        assert {name: int(exp.get_process(name).env['SYMPH_REPLAY_SHARD'])
+                for name in expected} == expected
+        shards.add(expected['agent8'])
+    assert len(shards) > 1
@@ -0,0 +1,71 @@
+import pytest
+from symphony.engine import Cluster
+from symphony.sim import SimCluster, SimulatedError
+
+
+def _experiment(cluster, name='exp', groups=2, per_group=3, lone=1):
+    exp = cluster.new_experiment(name)
+    for g in range(groups):
+        group = exp.new_process_group('g{}'.format(g))
+        for p in range(per_group):
+            group.new_process('g{}p{}'.format(g, p), cmd='echo')
+    for p in range(lone):
+        exp.new_process('lone{}'.format(p), cmd='echo')
+    return exp
+
+
+def test_lifecycle_in_virtual_time():
+    cluster = Cluster.new('sim', boot_time=5, ready_time=2,
+                          latencies={'launch': 1})
+    cluster.launch(_experiment(cluster))
+    assert cluster.clock.now() == 1
+    assert cluster.list_experiments() == ['exp']
+    assert cluster.describe_process('exp', 'g1p0', 'g1')['State'].startswith('waiting')
+    cluster.clock.advance(5)
+    status = cluster.describe_process('exp', 'lone0')
+    assert (status['State'], status['Ready']) == ('running', '0')
+    cluster.clock.advance(2)
+    exp = cluster.describe_experiment('exp')
+    assert sorted(exp, key=str) == [None, 'g0', 'g1']
+    assert all(s['Ready'] == '1' for g in exp.values() for s in g.values())
+    cluster.delete('exp')
+    assert cluster.list_experiments() == []
+
+
+def test_watch_fast_forwards():
+    cluster = SimCluster(boot_time=60, ready_time=30)
+    cluster.launch(_experiment(cluster, groups=1, per_group=1, lone=0))
+    events = [(e.type, cluster.clock.now()) for e in cluster.watch_experiment('exp')]
+    assert events == [('created', 0), ('running', 60), ('ready', 90)]
+
+
+def test_crash_and_restart_events():
+    cluster = SimCluster(boot_time=1, crash_probability=1., seed=0)
+    cluster.launch(_experiment(cluster, groups=0, lone=1))
+    types = [e.type for e in cluster.watch_experiment('exp')]
+    assert types == ['created', 'running', 'ready', 'exited']
+    cluster.kill_process('exp', 'lone0', restart=True)
+    assert cluster.describe_process('exp', 'lone0')['Restarts'] == '1'
+
+
+def test_failure_injection():
+    cluster = SimCluster(failures={'describe_experiment': 1.})
+    cluster.launch(_experiment(cluster))
+    with pytest.raises(SimulatedError):
+        cluster.describe_experiment('exp')
+    cluster.inject_failure('delete')
+    results = cluster.delete_batch(['exp'], verbose=False)
+    assert not results[0].ok
+    cluster.delete('exp')
+    assert cluster.calls['delete'] == 2
+
+
+def test_scale():
+    cluster = SimCluster()
+    cluster.launch(_experiment(cluster, groups=100, per_group=100, lone=0))
+    cluster.enable_query_cache(clock=cluster.clock)
+    assert len(cluster.describe_experiment('exp')) == 100
+    cluster.describe_experiment('exp')
+    assert cluster.calls['describe_experiment'] == 1
+    processes = [('g{}'.format(g), 'g{}p0'.format(g)) for g in range(100)]
+    assert len(cluster.describe_processes('exp', processes)) == 100
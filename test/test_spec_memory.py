@@ -0,0 +1,50 @@
+import json
+import pytest
+from symphony.spec.process import EMPTY_MAPPING
+from symphony.subproc import SubprocProcessSpec
+from symphony.tmux import TmuxExperimentSpec, TmuxProcessSpec
+from symphony.kube import KubeProcessSpec
+
+
+@pytest.mark.parametrize('process', [
+    SubprocProcessSpec('p', cmd='echo'),
+    TmuxProcessSpec('p', cmds=['echo']),
+    KubeProcessSpec('p', container_image='busybox'),
+])
+def test_process_specs_have_no_dict(process):
+    assert not hasattr(process, '__dict__')
+    with pytest.raises(AttributeError):
+        process.typo = 1
+
+
+def test_empty_defaults_are_shared_and_never_written():
+    a = SubprocProcessSpec('a', cmd='echo')
+    b = SubprocProcessSpec('b', cmd='echo')
+    assert a.binded_services is EMPTY_MAPPING
+    assert a.env is b.env is EMPTY_MAPPING
+    a.binds('server')
+    a.set_envs({'X': '1'})
+    assert a.binded_services == {'server': None}
+    assert a.env == {'X': '1'}
+    assert b.binded_services is EMPTY_MAPPING and b.env is EMPTY_MAPPING
+    assert len(EMPTY_MAPPING) == 0
+
+
+def test_service_names_are_interned():
+    a = SubprocProcessSpec('a', cmd='echo')
+    b = SubprocProcessSpec('b', cmd='echo')
+    a.binds(''.join(['ser', 'ver']))
+    b.connects(''.join(['serv', 'er']))
+    assert next(iter(a.binded_services)) is next(iter(b.connected_services))
+
+
+def test_round_trip():
+    exp = TmuxExperimentSpec('exp')
+    server = exp.new_process('server', cmds=['serve'])
+    server.binds({'server': 7000})
+    exp.new_process('client', cmds=['connect']).connects('server')
+    data = json.loads(json.dumps(exp.dump_dict()))
+    loaded = TmuxExperimentSpec.load_dict(data)
+    assert loaded.get_process('server').binded_services == {'server': 7000}
+    assert loaded.get_process('client').connected_services == {'server': None}
+    assert loaded.get_process('client').exposed_services is EMPTY_MAPPING
@@ -0,0 +1,125 @@
+from symphony.engine import SymphonyConfig
+from symphony.utils import runner
+from symphony.utils.throttle import (
+    TokenBucket, RetryPolicy, Throttle, TransientError, get_throttle)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1.
+    clock.now += 10
+    assert bucket.reserve() == 0
+
+
+def test_unlimited_bucket():
+    bucket = TokenBucket(rate=None)
+    assert all(bucket.reserve() == 0 for _ in range(100))
+
+
+def test_classification():
+    retry = RetryPolicy()
+    assert retry.is_transient('Error from server (TooManyRequests): ...')
+    assert retry.is_transient('Unable to connect to the server: net/http: '
+                              'TLS handshake timeout')
+    assert retry.is_transient(ConnectionError())
+    assert retry.is_transient(TransientError())
+    assert not retry.is_transient('Error from server (AlreadyExists): '
+                                  'namespaces "foo" already exists')
+    assert not retry.is_transient(ValueError('bad spec'))
+    assert retry.is_transient('the server responded with status code 503')
+    assert retry.is_transient('502 Bad Gateway')
+    assert not retry.is_transient('Error from server (NotFound): pods "web-503" '
+                                  'not found')
+    # may have been applied, only safe calls are retried on a timeout
+    assert not retry.is_transient('error: timed out waiting for the condition')
+
+
+def test_backoff():
+    retry = RetryPolicy(base_delay=1, max_delay=5, jitter=0)
+    assert [retry.backoff(i) for i in range(1, 6)] == [1, 2, 4, 5, 5]
+    retry = RetryPolicy(base_delay=1, jitter=1)
+    assert all(0 <= retry.backoff(3) <= 4 for _ in range(100))
+
+
+def _flaky(results):
+    calls = []
+
+    def _run():
+        calls.append(1)
+        return results[len(calls) - 1]
+    return _run, calls
+
+
+def test_retries_transient_failures():
+    clock = FakeClock()
+    throttle = Throttle(retry=RetryPolicy(max_attempts=4, jitter=0),
+                        sleep=clock.sleep)
+    run, calls = _flaky([('', 'TooManyRequests', 1),
+                         ('', 'i/o timeout', 1),
+                         ('ok', '', 0)])
+    assert throttle.run_command(run) == ('ok', '', 0)
+    assert len(calls) == 3
+    assert clock.sleeps == [0.5, 1.]
+
+
+def test_does_not_retry_permanent_failures():
+    throttle = Throttle(retry=RetryPolicy(max_attempts=4), sleep=lambda s: None)
+    run, calls = _flaky([('', 'NotFound', 1)] * 4)
+    assert throttle.run_command(run)[2] == 1
+    assert len(calls) == 1
+
+
+def test_call_gives_up():
+    throttle = Throttle(retry=RetryPolicy(max_attempts=3), sleep=lambda s: None)
+    calls = []
+
+    def _fail():
+        calls.append(1)
+        raise ConnectionError('connection reset by peer')
+    try:
+        throttle.call(_fail)
+        assert False, 'should raise'
+    except ConnectionError:
+        pass
+    assert len(calls) == 3
+
+
+def test_rate_limited_commands():
+    clock = FakeClock()
+    throttle = Throttle(bucket=TokenBucket(rate=10, burst=1, clock=clock),
+                        sleep=clock.sleep)
+    for _ in range(5):
+        throttle.run_command(lambda: ('', '', 0))
+    assert abs(sum(clock.sleeps) - 0.4) < 1e-9
+
+
+def test_config():
+    SymphonyConfig().set_throttle('sometestbackend', rate=None, max_attempts=2)
+    throttle = get_throttle('sometestbackend')
+    assert throttle.bucket is None
+    assert throttle.retry.max_attempts == 2
+    assert get_throttle('sometestbackend') is throttle
+    assert get_throttle('othertestbackend').bucket.rate == 10
+    SymphonyConfig.reset()
+
+
+def test_runner():
+    throttle = Throttle(retry=RetryPolicy(max_attempts=3), sleep=lambda s: None)
+    out, err, retcode = runner.run('echo hi', throttle=throttle)
+    assert (out, retcode) == ('hi', 0)
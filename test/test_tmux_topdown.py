@@ -1,3 +1,4 @@
+import os
 import time
 import unittest
 from unittest import mock
@@ -7,6 +8,7 @@ import libtmux
 from symphony.engine import *
 from symphony import errors
 from symphony import tmux
+from symphony.utils.ipc import runtime_dir
 
 
 _TEST_SERVER = '__symphony_test__'
@@ -22,6 +24,8 @@ _TEST_DUMP = {
                     'exposed_services': {},
                     'start_dir': '.',
                     'cmds': ['echo Hello World!'],
+                    'env': {},
+                    'full_address_book': False,
                 }
             ],
             'name': 'group',
@@ -37,6 +41,8 @@ _TEST_DUMP = {
             'exposed_services': {},
             'start_dir': '.',
             'cmds': ['echo I am alone'],
+            'env': {},
+            'full_address_book': False,
         }
     ],
     'name': 'exp',
@@ -44,6 +50,9 @@ _TEST_DUMP = {
     'port_range': '7000-8999',
     'start_dir': '.',
     'preamble_cmds': [],
+    'scoped_addresses': False,
+    'sharded_services': {},
+    'name_service': False,
 }
 
 
@@ -291,6 +300,46 @@ class TestTmuxCluster(unittest.TestCase):
         self.assertIn('exp preamble', l)
         self.assertNotIn('group preamble', l)
 
+    def test_launch_script(self):
+        cluster = Cluster.new('tmux', server_name=_TEST_SERVER)
+        exp = cluster.new_experiment('exp', preamble_cmds=['cd /tmp'])
+        group = exp.new_process_group('group', preamble_cmds=['echo group'])
+        proc = group.new_process('hello', cmds=['echo $GREETING'])
+        proc.set_envs({'GREETING': 'hello world'})
+        cluster.launch(exp)
+
+        path = os.path.join(runtime_dir('exp'), 'launch', 'group.hello.sh')
+        with open(path) as f:
+            self.assertEqual(f.read().split('\n'), [
+                'tmux set-option -p -t "$TMUX_PANE" @symphony_launch started',
+                "export GREETING='hello world'",
+                'printf "%s\\n" \'cd /tmp\'',
+                'cd /tmp',
+                'printf "%s\\n" \'echo group\'',
+                'echo group',
+                'printf "%s\\n" \'echo $GREETING\'',
+                'echo $GREETING',
+                '',
+            ])
+        for _ in range(100):
+            l = cluster.get_log('exp', 'hello', process_group='group')
+            if 'hello world' in l:
+                break
+            time.sleep(0.1)
+        self.assertIn('hello world', l)
+
+    def test_launch_in_several_batches(self):
+        cluster = Cluster.new('tmux', server_name=_TEST_SERVER)
+        exp = cluster.new_experiment('exp')
+        for i in range(20):
+            exp.new_process('agent{}'.format(i), cmds=['echo {}'.format(i)])
+        with mock.patch.object(tmux.cluster, '_BATCH_BYTES', new=200):
+            cluster.launch(exp)
+        sess = self.server.sessions[0]
+        self.assertCountEqual(
+                [tmux.cluster._DEFAULT_WINDOW] + ['agent{}'.format(i) for i in range(20)],
+                [w.name for w in sess.windows])
+
     #################### Action API tests ####################
 
     def test_delete(self):
@@ -0,0 +1,130 @@
+import pytest
+from symphony.engine import Cluster, SymphonyConfig
+from symphony.addons import LocalFileManager
+from symphony.kube import KubeCluster, KubeExperimentSpec
+from symphony.tmux import TmuxExperimentSpec
+from symphony.spec.diff import diff_specs
+
+
+def make_kube_experiment(lr='0.1', n_agents=3, agent_args=('agent.py',)):
+    exp = KubeExperimentSpec('exp')
+    learner = exp.new_process('learner', container_image='learner',
+                              env={'LR': lr})
+    learner.binds('replay')
+    group = exp.new_process_group('eval')
+    group.new_process('evaluator', container_image='evaluator').connects('replay')
+    group.new_process('logger', container_image='logger')
+    for i in range(n_agents):
+        exp.new_process('agent{}'.format(i), container_image='agent',
+                        args=list(agent_args)).connects('replay')
+    exp.compile()
+    return exp
+
+
+def test_diff_of_identical_specs_is_empty():
+    changes = diff_specs(make_kube_experiment(), make_kube_experiment())
+    assert not changes
+    assert str(changes) == 'no changes'
+
+
+def test_diff_finds_minimal_changes():
+    old = make_kube_experiment()
+    new = make_kube_experiment(lr='0.2', n_agents=4)
+    new.get_process('agent0').set_args(['agent.py', '--fast'])
+    new.get_process_group('eval').get_process('logger').set_env('LEVEL', 'debug')
+    new.new_process('tb', container_image='tb').exposes('tensorboard')
+    new.compile()
+    changes = diff_specs(old, new)
+    assert changes.added == [(None, 'agent3'), (None, 'tb')]
+    assert changes.removed == []
+    assert changes.replaced == [(None, 'agent0')]
+    assert changes.env_updated == {(None, 'learner'): {'LR': '0.2'},
+                                   ('eval', 'logger'): {'LEVEL': 'debug'}}
+    assert changes.added_services == ['tensorboard']
+    assert changes.changed_process_groups() == ['eval']
+
+
+def test_new_services_keep_existing_ports():
+    old = TmuxExperimentSpec('exp')
+    old.new_process('server', cmds=['serve']).binds('server')
+    old.compile()
+    new = TmuxExperimentSpec('exp')
+    # binds first, so it would take the port of "server" without pinning
+    new.new_process('metrics', cmds=['collect']).binds('metrics')
+    new.new_process('server', cmds=['serve']).binds('server')
+    new.pin_addresses(old.address_book)
+    new.compile()
+    assert new.address_book.entries['server'] == old.address_book.entries['server']
+    assert new.address_book.entries['metrics']['port'] != \
+        old.address_book.entries['server']['port']
+    changes = diff_specs(old, new)
+    assert changes.added == [(None, 'metrics')] and not changes.restarted()
+
+
+def test_kube_update_commands():
+    old = make_kube_experiment()
+    new = make_kube_experiment(n_agents=2)
+    new.get_process('agent0').set_args(['agent.py', '--fast'])
+    new.get_process_group('eval').get_process('logger').set_env('LEVEL', 'debug')
+    new.new_process('tb', container_image='tb').exposes('tensorboard')
+    new.pin_addresses(old.address_book)
+    new.compile()
+    cmds = KubeCluster()._update_cmds(new, diff_specs(old, new))
+    assert [cmd for cmd, _ in cmds] == [
+        'kubectl delete pod agent2 --namespace exp --ignore-not-found',
+        'kubectl replace --force -f - --namespace exp',
+        'kubectl create -f - --namespace exp',
+    ]
+    replaced, created = cmds[1][1], cmds[2][1]
+    assert replaced.count('kind: Pod') == 2  # eval group and agent0
+    assert 'name: tensorboard' in created and 'name: tb' in created
+
+
+def test_update_from_saved_spec(tmpdir):
+    SymphonyConfig().set_experiment_folder(str(tmpdir))
+    try:
+        old = make_kube_experiment()
+        LocalFileManager().save_experiment(old)
+        new = make_kube_experiment(lr='0.3')
+        changes = KubeCluster().update(new, dry_run=True)
+        assert changes.env_updated == {(None, 'learner'): {'LR': '0.3'}}
+    finally:
+        SymphonyConfig.reset()
+
+
+def test_failed_kube_update_is_not_saved(tmpdir, monkeypatch):
+    import symphony.kube.cluster as kube_cluster
+    monkeypatch.setattr(kube_cluster.runner, 'run_verbose', lambda cmd, **kwargs:
+                        ('', 'error: pods "agent0" is forbidden', 1))
+    SymphonyConfig().set_experiment_folder(str(tmpdir))
+    try:
+        old = make_kube_experiment()
+        LocalFileManager().save_experiment(old)
+        with pytest.raises(RuntimeError):
+            KubeCluster().update(make_kube_experiment(lr='0.3'))
+        saved = LocalFileManager().load_experiment('exp', KubeExperimentSpec)
+        assert diff_specs(old, saved).env_updated == {}
+    finally:
+        SymphonyConfig.reset()
+
+
+def test_sim_update_restarts_only_changed_processes():
+    cluster = Cluster.new('sim', boot_time=1)
+    exp = cluster.new_experiment('exp')
+    exp.new_process('server', cmd='serve').binds('server')
+    exp.new_process('client', cmd='connect').connects('server')
+    cluster.launch(exp)
+    list(cluster.watch_experiment('exp'))
+
+    new = cluster.new_experiment('exp')
+    new.new_process('server', cmd='serve').binds('server')
+    new.new_process('client', cmd='connect --retry').connects('server')
+    new.new_process('monitor', cmd='monitor')
+    changes = cluster.update(new)
+    assert changes.replaced == [(None, 'client')]
+    assert changes.added == [(None, 'monitor')]
+    status = cluster.describe_experiment('exp')[None]
+    assert status['server']['State'] == 'running'
+    assert status['client']['Restarts'] == '1'
+    assert status['monitor']['State'].startswith('waiting')
+    assert not cluster.update(new)